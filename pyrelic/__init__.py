@@ -0,0 +1,5 @@
+"""
+Python interface to the RELIC cryptographic library. The library is loaded
+and initialized on first use; see relic.init and relic.after_fork.
+"""
+from relic import after_fork, init
@@ -0,0 +1,118 @@
+"""
+C declarations of the RELIC functions that pyrelic calls, for the cffi
+backend (see relic.py). They follow the prototypes in RELIC's headers
+(relic_bn.h, relic_ep.h, relic_pc.h, ...) and the *_abi entry points of the
+pyrelic fork, except that pointer arguments are declared as integer types
+(uintptr_t has the same calling convention as a pointer) so that the
+addresses of ctypes structures can be passed without conversion.
+"""
+
+PROTOTYPES = """
+typedef uintptr_t bn_ptr;
+typedef uintptr_t fp_ptr;
+typedef uintptr_t fp12_ptr;
+typedef uintptr_t ep_ptr;
+typedef uintptr_t ep2_ptr;
+typedef uintptr_t g1_ptr;
+typedef uintptr_t g2_ptr;
+typedef uintptr_t gt_ptr;
+typedef uintptr_t bytes_ptr;
+
+/* relic_core.h, relic_err.h, relic_rand.h */
+int core_init(void);
+int core_clean(void);
+uintptr_t core_get(void);
+int err_get_code(void);
+void rand_seed(char *buf, int size);
+
+/* relic_bn.h */
+void bn_add(bn_ptr c, bn_ptr a, bn_ptr b);
+int bn_cmp(bn_ptr a, bn_ptr b);
+void bn_gcd_ext_lehme(bn_ptr c, bn_ptr d, bn_ptr e, bn_ptr a, bn_ptr b);
+void bn_mod_abi(bn_ptr c, bn_ptr a, bn_ptr m);
+void bn_mul_basic(bn_ptr c, bn_ptr a, bn_ptr b);
+void bn_rand_abi(bn_ptr a, int sign, int bits);
+void bn_rand_mod(bn_ptr a, bn_ptr b);
+void bn_sub(bn_ptr c, bn_ptr a, bn_ptr b);
+
+/* relic_fp.h, relic_fpx.h */
+void fp_exp_slide(fp_ptr c, fp_ptr a, bn_ptr b);
+void fp_inv_lower(fp_ptr c, fp_ptr a);
+uintptr_t fp_prime_get(void);
+void fp_read_bin(fp_ptr a, bytes_ptr bin, int len);
+void fp_write_bin(bytes_ptr bin, int len, fp_ptr a);
+void fp12_conv_cyc(fp12_ptr c, fp12_ptr a);
+void fp12_frb(fp12_ptr c, fp12_ptr a, int i);
+void fp12_rand(fp12_ptr a);
+
+/* relic_ec.h */
+void ec_add_abi(ep_ptr r, ep_ptr p, ep_ptr q);
+int ec_cmp_abi(ep_ptr p, ep_ptr q);
+void ec_curve_get_gen_abi(ep_ptr g);
+void ec_curve_get_ord_abi(bn_ptr n);
+int ec_is_infty_abi(ep_ptr p);
+void ec_mul_abi(ep_ptr r, ep_ptr p, bn_ptr k);
+void ec_norm_abi(ep_ptr r, ep_ptr p);
+void ec_rand_abi(ep_ptr p);
+void ec_read_bin_abi(ep_ptr a, bytes_ptr bin, int len, int pack);
+int ec_size_bin_abi(ep_ptr a, int pack);
+void ec_write_bin_abi(bytes_ptr bin, int len, ep_ptr a, int pack);
+
+/* relic_ep.h, relic_epx.h */
+void ep_mul_sim_gen(ep_ptr r, bn_ptr k, ep_ptr q, bn_ptr l);
+void ep_mul_sim_inter(ep_ptr r, ep_ptr p, bn_ptr k, ep_ptr q, bn_ptr l);
+void ep2_mul_cof_bn(ep2_ptr r, ep2_ptr p);
+void ep2_mul_fix_lwnaf(ep2_ptr r, ep2_ptr t, bn_ptr k);
+void ep2_mul_pre_lwnaf(ep2_ptr t, ep2_ptr p);
+
+/* relic_pc.h */
+int pc_param_set_any_abi(void);
+void pc_map_abi(gt_ptr r, g1_ptr p, g2_ptr q);
+
+void g1_add_abi(g1_ptr r, g1_ptr p, g1_ptr q);
+int g1_cmp_abi(g1_ptr p, g1_ptr q);
+void g1_get_gen_abi(g1_ptr g);
+void g1_get_ord_abi(bn_ptr n);
+int g1_is_infty_abi(g1_ptr p);
+int g1_is_valid_abi(g1_ptr p);
+void g1_map_abi(g1_ptr p, bytes_ptr msg, int len);
+void g1_mul_abi(g1_ptr r, g1_ptr p, bn_ptr k);
+void g1_mul_gen_abi(g1_ptr r, bn_ptr k);
+void g1_neg_abi(g1_ptr r, g1_ptr p);
+void g1_norm_abi(g1_ptr r, g1_ptr p);
+void g1_rand_abi(g1_ptr p);
+void g1_read_bin_abi(g1_ptr a, bytes_ptr bin, int len, int pack);
+int g1_size_bin_abi(g1_ptr a, int pack);
+void g1_write_bin_abi(bytes_ptr bin, int len, g1_ptr a, int pack);
+
+void g2_add_abi(g2_ptr r, g2_ptr p, g2_ptr q);
+int g2_cmp_abi(g2_ptr p, g2_ptr q);
+void g2_get_gen_abi(g2_ptr g);
+void g2_get_ord_abi(bn_ptr n);
+int g2_is_infty_abi(g2_ptr p);
+int g2_is_valid_abi(g2_ptr p);
+void g2_map_abi(g2_ptr p, bytes_ptr msg, int len);
+void g2_mul_abi(g2_ptr r, g2_ptr p, bn_ptr k);
+void g2_mul_gen_abi(g2_ptr r, bn_ptr k);
+void g2_neg_abi(g2_ptr r, g2_ptr p);
+void g2_norm_abi(g2_ptr r, g2_ptr p);
+void g2_rand_abi(g2_ptr p);
+void g2_read_bin_abi(g2_ptr a, bytes_ptr bin, int len, int pack);
+int g2_size_bin_abi(g2_ptr a, int pack);
+void g2_write_bin_abi(bytes_ptr bin, int len, g2_ptr a, int pack);
+
+int gt_cmp_abi(gt_ptr a, gt_ptr b);
+void gt_copy_abi(gt_ptr c, gt_ptr a);
+void gt_exp_abi(gt_ptr c, gt_ptr a, bn_ptr b);
+void gt_get_gen(gt_ptr g);
+void gt_get_ord_abi(bn_ptr n);
+void gt_inv_abi(gt_ptr c, gt_ptr a);
+int gt_is_unity_abi(gt_ptr a);
+void gt_mul_abi(gt_ptr c, gt_ptr a, gt_ptr b);
+void gt_rand(gt_ptr a);
+void gt_read_bin_abi(gt_ptr a, bytes_ptr bin, int len, int pack);
+void gt_set_unity_abi(gt_ptr a);
+int gt_size_bin_abi(gt_ptr a, int pack);
+void gt_sqr_abi(gt_ptr c, gt_ptr a);
+void gt_write_bin_abi(bytes_ptr bin, int len, gt_ptr a, int pack);
+"""
@@ -0,0 +1,233 @@
+"""
+Micro-benchmarks that compare alternative implementations of pyrelic
+operations. Run all benchmarks, or only those named on the command line:
+  python benchmark.py [hash verify ...]
+"""
+from pbc import *
+from relic import librelic
+from timeit import default_timer
+import os, sys
+
+# Default number of iterations for each timed operation.
+iterations = 200
+
+
+def timeit(func, n=None):
+    """
+    Calls @func(i) for i in range(@n) and returns the average time per call
+    in microseconds. Passing a counter lets operations vary their inputs.
+    """
+    n = n or iterations
+    start = default_timer()
+    for i in xrange(n):
+        func(i)
+    return (default_timer() - start)*1e6/n
+
+
+def report(label, usec, baseline=None):
+    """
+    Prints the time for one operation, and its speedup over @baseline.
+    """
+    if baseline:
+        print "  {:<40} {:>10.1f} us  {:>5.2f}x".format(label, usec,
+            baseline/usec)
+    else:
+        print "  {:<40} {:>10.1f} us".format(label, usec)
+
+
+def benchHash():
+    """
+    Compares the hash-to-curve algorithms for G1 and G2, and the methods for
+    clearing the cofactor of points on the G2 twist.
+    """
+    for name, hashfunc in [("G1", hashG1), ("G2", hashG2)]:
+        print "hash{}".format(name)
+        baseline = None
+        for alg in hashAlgorithms():
+            # Vary the input: RELIC's map takes a variable amount of time.
+            usec = timeit(lambda i: hashfunc("tweak", i, algorithm=alg))
+            baseline = baseline or usec
+            report(alg, usec, baseline)
+
+    # Cofactor of the twist: #E'(Fp2) = n(2p - n)
+    import pbc
+    n = long(orderG2())
+    cofactor = BigInt(2*pbc._fieldPrime() - n)
+
+    print "G2 cofactor clearing"
+    P, R = randomG2(), G2Element()
+    P.normalize()
+    usec = timeit(lambda i: librelic.g2_mul_abi(byref(R), byref(P),
+        byref(cofactor)))
+    report("scalar multiplication", usec)
+    report("ep2_mul_cof_bn", timeit(lambda i: librelic.ep2_mul_cof_bn(
+        byref(R), byref(P))), usec)
+
+
+def benchVerify():
+    """
+    Compares proof verification and its group operations with and without
+    the variable-time algorithms for public data.
+    """
+    import public, vprf, vpop
+
+    x, y = randomGt(), randomGt()
+    P, Q = randomG1(), randomG1()
+    a, b = randomZ(orderGt()), randomZ(orderGt())
+
+    _, xPop = vpop.blind("message")
+    yPop, kw, tTilde = vpop.eval("w", "t", xPop, "msk", "s")
+    piPop = vpop.prove(xPop, tTilde, kw, yPop)
+    yPrf, kw, beta = vprf.eval("w", "t", "message", "msk", "s")
+    piPrf = vprf.prove("message", beta, kw, yPrf)
+
+    operations = [
+        ("P*a + Q*b", lambda i: public.mulSimG1(P, a, Q, b)),
+        ("generator*a + Q*b", lambda i: public.mulSimG1(generatorG1(), a,
+            Q, b)),
+        ("x**a * y**b", lambda i: public.expSimGt(x, a, y, b)),
+        ("vprf.verify", lambda i: vprf.verify("message", "t", yPrf, piPrf)),
+        ("vpop.verify", lambda i: vpop.verify(xPop, "t", yPop, piPop)),
+    ]
+
+    print "public-data fast path"
+    for label, func in operations:
+        public.setFastPath(False)
+        baseline = timeit(func, iterations//4)
+        public.setFastPath(True)
+        report(label, timeit(func, iterations//4), baseline)
+
+
+def benchServer():
+    """
+    Compares pipelined vpop requests to a local PrfServer with and without
+    micro-batching, against calling evalAndProve directly.
+    """
+    import server, vpop
+    xs = [vpop.blind(str(i))[1] for i in range(iterations)]
+
+    print "vpop server (pipelined, localhost)"
+    baseline = timeit(lambda i: vpop.evalAndProve("w", "t", xs[i], "msk",
+        "s"))
+    report("evalAndProve", baseline)
+    for label, maxBatch in [("server, no batching", 1),
+            ("server, batches of 32", 32)]:
+        with server.PrfServer(("127.0.0.1", 0), "msk", "s",
+                maxBatch) as s:
+            with server.PrfClient(s.address) as client:
+                start = default_timer()
+                client.queryMany("vpop", "w", "t", xs)
+                usec = (default_timer() - start)*1e6/len(xs)
+        report(label, usec, baseline)
+
+
+def benchFfi():
+    """
+    Compares the per-call overhead of the ctypes and cffi backends (see
+    relic.BACKEND) on cheap operations. The backend is selected at import,
+    so each one is timed in a child process.
+    """
+    import json, subprocess
+    results = {}
+    for backend in ["ctypes", "cffi"]:
+        env = dict(os.environ, PYRELIC_BACKEND=backend)
+        results[backend] = json.loads(subprocess.check_output([sys.executable,
+            os.path.abspath(__file__), "_ffi"], env=env))
+
+    print "per-call time, ctypes vs cffi backend"
+    for label, _ in _ffiOperations():
+        report(label + " (ctypes)", results["ctypes"][label])
+        report(label + " (cffi)", results["cffi"][label],
+            results["ctypes"][label])
+
+
+def _ffiOperations():
+    """
+    @returns a list of (label, func) for benchFfi
+    """
+    from relic import byref
+    P, Q, R = randomG1(), randomG1(), G1Element()
+    a, b = BigInt(2**100 + 1), BigInt(2**90 + 3)
+    return [
+        ("g1_is_infty_abi (raw call)",
+            lambda i: librelic.g1_is_infty_abi(byref(P))),
+        ("g1_add_abi (raw call)",
+            lambda i: librelic.g1_add_abi(byref(R), byref(P), byref(Q))),
+        ("G1 add", lambda i: P + Q),
+        ("G1 compare", lambda i: P == Q),
+        ("BigInt add", lambda i: a + b),
+        ("BigInt compare", lambda i: a < b),
+    ]
+
+
+def _benchFfiChild():
+    import json
+    print json.dumps(dict((label, timeit(func, 20*iterations))
+        for label, func in _ffiOperations()))
+
+
+def benchImport():
+    """
+    Measures the start-up time of short-lived processes that import vpop,
+    with and without initializing RELIC.
+    """
+    import subprocess
+    directory = os.path.dirname(os.path.abspath(__file__))
+    print "process start-up (python -c ...)"
+    baseline = None
+    for label, code in [
+            ("import vpop, relic; relic.init()",
+                "import vpop, relic; relic.init()"),
+            ("import vpop", "import vpop"),
+            ("pass (interpreter only)", "pass")]:
+        usec = timeit(lambda i: subprocess.check_call([sys.executable, "-c",
+            code], cwd=directory), 20)
+        baseline = baseline or usec
+        report(label, usec, baseline)
+
+
+def benchScheduler():
+    """
+    Compares evaluating interleaved requests from 16 ensembles and tweaks in
+    arrival order and in the scheduler's order, with key and tweak caches
+    that hold 4 entries each.
+    """
+    import prf, scheduler, vpop
+    prf.enableKeyCache(4, shards=1)
+    vpop.enableTweakCache(4, shards=1)
+    requests = [("w{}".format(i % 16), "t{}".format(i % 16),
+        vpop.blind(str(i))[1]) for i in range(iterations)]
+    order = scheduler.Scheduler(lambda r: r[:2]).order(requests,
+        [0]*len(requests), 0)
+    scheduled = [requests[i] for _,_,indices in order for i in indices]
+
+    print "vpop.evalAndProve, 16 interleaved ensembles"
+    for label, batch in [("arrival order", requests),
+            ("scheduled", scheduled)]:
+        usec = timeit(lambda i: vpop.evalAndProve(batch[i][0], batch[i][1],
+            batch[i][2], "msk", "s"))
+        if batch is requests:
+            baseline = usec
+        report(label, usec, baseline)
+    prf.disableKeyCache()
+    vpop.disableTweakCache()
+
+
+# Benchmarks by name
+benchmarks = {
+    "ffi": benchFfi,
+    "hash": benchHash,
+    "import": benchImport,
+    "scheduler": benchScheduler,
+    "server": benchServer,
+    "verify": benchVerify,
+}
+
+# Run by benchFfi in child processes.
+_hidden = {"_ffi": _benchFfiChild}
+
+
+# Run!
+if __name__ == "__main__":
+    for name in sys.argv[1:] or sorted(benchmarks):
+        benchmarks.get(name, _hidden.get(name))()
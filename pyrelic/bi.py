@@ -1,9 +1,10 @@
 """
 Access to the RELIC multiple precision integer type bn_t detailed in relic_bn.h
 """
-from relic import librelic
+from relic import byref, librelic, randLock, NULL
 from common import *
-from ctypes import Structure, byref, sizeof, c_int, c_ulonglong
+from ctypes import Structure, sizeof, c_int, c_ulonglong
+import binascii, struct
 
 class BigInt(Structure):
     """
@@ -108,6 +109,15 @@ class BigInt(Structure):
         return not self.__eq__(other)
 
 
+    def __reduce__(self):
+        """
+        Pickles this BigInt as a Python long (including its sign).
+        """
+        value = long(self)
+        return (BigInt, (-value if self.sign == BigInt.NEGATIVE_FLAG.value 
+            else value,))
+
+
     def __str__(self):
         """
         Retrieves a hexadecimal representation of this BigInt. 
@@ -221,6 +231,15 @@ def hashZ(*args):
     return BigInt(longFromString(b))
 
 
+def deserializeZ(x):
+    """
+    Deserializes a big-endian array of bytes, @x, into a non-negative BigInt.
+    """
+    if len(x) == 0:
+        return BigInt(0)
+    return BigInt(longFromString(bytes(x)))
+
+
 def inverse(x, p, errorOnFail=False):
     """
     Find the inverse of BigInt @x in a field of (prime) order @p.
@@ -237,7 +256,7 @@ def inverse(x, p, errorOnFail=False):
 
     # bn_gcd_ext(c, d, e, a, b) computes: c = a*d + b*e
     # We take x=a. b=p, and expect: c = 1 = gcd(x,p), d = 1/x, and e is unused.
-    librelic.bn_gcd_ext_lehme(byref(gcd), byref(inv), None, byref(x), byref(p))
+    librelic.bn_gcd_ext_lehme(byref(gcd), byref(inv), NULL, byref(x), byref(p))
 
     # Check that GCD == 1 
     if gcd != 1:
@@ -261,10 +280,38 @@ def randomZ(maximum=None, bits=256):
     # Select a random number smaller than the maximum.
     if maximum:
         maximum = coerceBigInt(maximum)
-        librelic.bn_rand_mod(byref(result), byref(maximum))
+        with randLock:
+            librelic.bn_rand_mod(byref(result), byref(maximum))
 
     # Otherwise, select a random BigInt of the appropriate size in bits.
     else:
-        librelic.bn_rand_abi(byref(result), BigInt.POSITIVE_FLAG, c_int(bits))
+        with randLock:
+            librelic.bn_rand_abi(byref(result), BigInt.POSITIVE_FLAG.value, 
+                bits)
     
     return result
+
+
+def serializeZ(x, size=None):
+    """
+    Converts the magnitude of integer type @x into a big-endian string of 
+    bytes with no leading zeros. If @size is specified, the result is 
+    left-padded with zeros to exactly @size bytes.
+    """
+    # Python integers are converted directly. BigInt digits are packed
+    # because RELIC's bn_write_bin mishandles zero.
+    if isinstance(x, BigInt):
+        b = struct.pack(">{}Q".format(x.used), *reversed(x.digits[:x.used]))
+        b = b.lstrip("\0")
+    else:
+        assertScalarType(x)
+        h = format(abs(x), "x") if x else ""
+        b = binascii.unhexlify(("0" if len(h) % 2 else "") + h)
+
+    if size is None:
+        return b
+
+    if len(b) > size:
+        raise ValueError("Integer requires {} bytes but only {} are allowed".
+            format(len(b), size))
+    return b.rjust(size, "\0")
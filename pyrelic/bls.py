@@ -14,7 +14,7 @@ def eval(w,t,x,msk,s):
     @t: tweak (any string, e.g. user ID)
     @x: message (any string)
     @msk: Pythia server's master secret key
-    @s: state value from Pythia server's key table
+    @s: state value from Pythia server's key table (or the keytable.KeyTable)
     @returns: (y, kw, dummy=None)
      where: y: intermediate result
             kw: secret key bound to w (needed for proof)
@@ -26,7 +26,7 @@ def eval(w,t,x,msk,s):
     assertType(x, (str, int, long))
 
     # Construct the key
-    kw = genKw(w,msk,s)
+    kw = getKw(w,msk,s)
 
     # Compute y
     y = hashG1(t, x)*kw
@@ -41,14 +41,32 @@ def prove(x,t,kw,y):
     """
     # Verify the key type and compute the pubkey
     assertScalarType(kw)
-    p = generatorG2() * kw
+    p = pubkeyG2(kw)
     return (p,None,None)
 
 
-def verify(x, t, y, pi, errorOnFail=True):
+def evalAndProve(w,t,x,msk,s):
+    """
+    Computes eval() and prove() together. Parameters are the same as eval().
+    @returns: (y, pi)
+    """
+    y,kw,_ = eval(w,t,x,msk,s)
+    return y, prove(x,t,kw,y)
+
+
+def prepareVerify(x, t):
+    """
+    Computes beta, the part of verification that doesn't depend on the
+    server's response. Can run while the request is in flight.
+    """
+    return hashG1(t, x)
+
+
+def verify(x, t, y, pi, errorOnFail=True, beta=None):
     """
     Verifies a zero-knowledge proof.
     @errorOnFail: Raise an exception if the proof does not hold.
+    @beta: result of prepareVerify(@x, @t), if already computed.
     """
     # Unpack the proof
     p,_,_ = pi
@@ -59,8 +77,9 @@ def verify(x, t, y, pi, errorOnFail=True):
     assertType(y, G1Element)
     assertType(p, G2Element)
 
-    # TODO: beta can be pre-computed while waiting for a server response.
-    beta = hashG1(t, x)
+    # beta may have been computed while waiting for the server's response.
+    if beta is None:
+        beta = prepareVerify(x, t)
 
     # Compute q = e( H(t,m), P)**kw two ways
     q1 = pair(beta, p)
@@ -0,0 +1,228 @@
+"""
+Bounded, thread-safe caches for values that are expensive to recompute (e.g.
+hashes onto G2). Entries are spread across independently locked shards so
+concurrent lookups of different keys rarely contend for the same lock.
+"""
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LruCache(object):
+    """
+    A size-bounded mapping that evicts the least recently used entry. Each
+    shard keeps its own LRU order, so eviction is approximate across the
+    cache as a whole. Entries can optionally expire after a fixed lifetime.
+    """
+    def __init__(self, maxsize=1024, shards=8, ttl=None, onEvict=None):
+        """
+        Creates a cache holding at most @maxsize entries, split evenly
+        across @shards locks. Entries expire @ttl seconds after they are
+        stored (never if @ttl is None). @onEvict(key, value) is called,
+        without holding a lock, whenever an entry leaves the cache: by
+        eviction, expiry, invalidation, or clear().
+        """
+        if maxsize < 1 or shards < 1:
+            raise ValueError("maxsize and shards must be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+
+        shards = min(shards, maxsize)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._onEvict = onEvict
+        self._shardSize = (maxsize + shards - 1) // shards
+        self._shards = [_Shard() for _ in range(shards)]
+
+
+    def __contains__(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            return entry is not None and not self._expired(entry)
+
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+    def clear(self):
+        """
+        Removes all entries. Metrics are not reset.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                removed = shard.entries.items()
+                shard.entries.clear()
+            self._evicted([(k, value) for k,(value,_) in removed])
+
+
+    def expire(self):
+        """
+        Removes all expired entries. Expired entries are otherwise removed
+        only when they are looked up or reach the end of the LRU order.
+        @returns the number of entries removed.
+        """
+        count = 0
+        for shard in self._shards:
+            with shard.lock:
+                removed = [(k, entry) for k,entry in shard.entries.iteritems()
+                    if self._expired(entry)]
+                for k,_ in removed:
+                    del shard.entries[k]
+                shard.expirations += len(removed)
+            self._evicted([(k, value) for k,(value,_) in removed])
+            count += len(removed)
+        return count
+
+
+    def get(self, key, default=None):
+        """
+        Retrieves the value for @key and marks it as recently used, or
+        returns @default if @key is not present.
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            if entry is not None and not self._expired(entry):
+                shard.entries[key] = entry
+                shard.hits += 1
+                return entry[0]
+
+            shard.misses += 1
+            if entry is not None:
+                shard.expirations += 1
+
+        if entry is not None:
+            self._evicted([(key, entry[0])])
+        return default
+
+
+    def getOrCompute(self, key, func):
+        """
+        Retrieves the value for @key, or calls @func() to compute and store
+        it. @func runs without holding a lock: concurrent misses on the same
+        key may compute the value more than once, in which case every caller
+        receives the value that was stored first.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.putIfAbsent(key, func())
+        return value
+
+
+    def invalidate(self, key):
+        """
+        Removes @key from the cache.
+        @returns True if the key was present.
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            if entry is not None:
+                shard.invalidations += 1
+
+        if entry is None:
+            return False
+        self._evicted([(key, entry[0])])
+        return True
+
+
+    def put(self, key, value):
+        """
+        Stores @value for @key, evicting the least recently used entry in the
+        shard if it is full.
+        """
+        self._store(key, value, True)
+
+
+    def putIfAbsent(self, key, value):
+        """
+        Stores @value for @key unless the cache already holds an unexpired
+        value for it. A @value that is not stored is dropped without calling
+        the eviction callback.
+        @returns the value stored for @key
+        """
+        return self._store(key, value, False)
+
+
+    def stats(self):
+        """
+        Retrieves usage metrics summed over all shards.
+        @returns a dict with keys: hits, misses, evictions, expirations,
+            invalidations, size, maxsize, hitRate
+        """
+        result = dict(hits=0, misses=0, evictions=0, expirations=0,
+            invalidations=0)
+        for shard in self._shards:
+            with shard.lock:
+                for name in result:
+                    result[name] += getattr(shard, name)
+
+        lookups = result["hits"] + result["misses"]
+        result["hitRate"] = float(result["hits"])/lookups if lookups else 0.0
+        result["size"] = len(self)
+        result["maxsize"] = self.maxsize
+        return result
+
+
+    def _evicted(self, items):
+        """
+        Passes entries that left the cache to the eviction callback.
+        """
+        if self._onEvict:
+            for key, value in items:
+                self._onEvict(key, value)
+
+
+    def _expired(self, entry):
+        return entry[1] is not None and entry[1] <= time.time()
+
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+
+    def _store(self, key, value, replace):
+        """
+        Stores @value for @key. An existing unexpired value is replaced only
+        if @replace is set.
+        @returns the value stored for @key
+        """
+        expires = time.time() + self.ttl if self.ttl else None
+        removed = []
+        shard = self._shard(key)
+        with shard.lock:
+            old = shard.entries.pop(key, None)
+            if old is not None and not replace and not self._expired(old):
+                shard.entries[key] = old
+                return old[0]
+
+            if old is not None and old[0] is not value:
+                removed.append((key, old[0]))
+            shard.entries[key] = (value, expires)
+            if len(shard.entries) > self._shardSize:
+                k,(v,_) = shard.entries.popitem(last=False)
+                removed.append((k, v))
+                shard.evictions += 1
+
+        self._evicted(removed)
+        return value
+
+
+class _Shard(object):
+    """
+    One lock-protected partition of an LruCache.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+
+# Marks a missing entry (None is a valid cached value).
+_missing = object()
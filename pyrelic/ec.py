@@ -1,9 +1,9 @@
 """
 Interface to the elliptic curve types and functions in the RELIC library.
 """
-from relic import librelic
+from relic import byref, librelic, randLock
 from bi import *
-from ctypes import Structure, byref, sizeof, c_int, c_ubyte, c_ulonglong
+from ctypes import Structure, sizeof, c_int, c_ubyte, c_ulonglong
 from common import *
 
 class ecElementBase(Structure):
@@ -201,7 +201,7 @@ def _deserialize(x, elementType, compress, relicReadBinFunc):
     b = (c_ubyte*len(x))(*bytearray(x))
 
     # The compression flag is an integer.
-    flag = c_int(compress)
+    flag = int(compress)
 
     # Deserialize using the read function.
     result = elementType()
@@ -235,10 +235,13 @@ def _getCachedValue(obj, relicFunc, resultType):
 
     This is a common implementation for orderG1/G2/Gt and generatotG1/G2/Gt
     """
-    # If the value has not been previously cached, fetch 
+    # If the value has not been previously cached, fetch. The value is
+    # complete before it is stored, so other threads never see it partly
+    # written.
     if not obj.cached:
-        obj.cached = resultType()
-        relicFunc(byref(obj.cached))
+        value = resultType()
+        relicFunc(byref(value))
+        obj.cached = value
     return obj.cached
 
 
@@ -249,7 +252,7 @@ def _serialize(element, compress, relicSizeBinFunc, relicWriteBinFunc):
     @relicSizeBinFunc is used to determine the size of the serialized output.
     This is underlying implementation for serialize G1, G2, and Gt.
     """
-    cFlag = c_int(compress)
+    cFlag = int(compress)
     size = relicSizeBinFunc(byref(element), cFlag)
 
     # Make an array of the correct size. 
@@ -299,7 +302,8 @@ def randomEcPoint():
     """
     Generates a random element from the ECGroup.
     """
-    return relicResult(librelic.ec_rand_abi, ec1Element)
+    with randLock:
+        return relicResult(librelic.ec_rand_abi, ec1Element)
 
 
 def serializeEc(P, compress=True):
@@ -0,0 +1,312 @@
+"""
+A process-pool engine for CPU-bound batches (key rotation, bulk
+verification, enrollment). Inputs and outputs travel between processes as
+fixed-width serialized records in a shared memory-mapped file rather than as
+pickled Python objects: each task message carries only the name of the
+file, a range of records, and the operation's shared parameters.
+
+Worker processes are forked once and pre-initialized: per-process state is
+reset (see relic.after_fork), generator and order values are computed (or loaded from a shared
+snapshot; see snapshot.py), and the tweak cache is enabled, so the first
+task of each worker doesn't pay for them.
+"""
+from pbc import *
+from relic import after_fork
+from snapshot import loadSnapshot
+from multiprocessing import Pool, cpu_count
+import mmap, os, struct, tempfile, vpop
+
+# Width of serialized scalars. Negative scalars are stored as their residue
+# modulo the group order; others are stored as they are (proof challenges
+# are full 256 bit hashes, so they must not be reduced).
+SCALAR_SIZE = 32
+
+# Size of the tweak cache in each worker.
+TWEAK_CACHE_SIZE = 1024
+
+# Segments are created in RAM-backed storage where available.
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Each field is stored as a 2 byte length followed by the serialized value,
+# padded to the field's width (points at infinity serialize to 1 byte).
+_length = struct.Struct(">H")
+
+
+class _Field(object):
+    """
+    Serializes values of one type into fixed-width fields.
+    """
+    def __init__(self, size, serialize, deserialize):
+        self.size = size
+        self.width = _length.size + size
+        self.serialize = serialize
+        self.deserialize = deserialize
+
+
+    def read(self, buf, offset):
+        n, = _length.unpack_from(buf, offset)
+        start = offset + _length.size
+        return self.deserialize(buf[start:start+n])
+
+
+    def write(self, buf, offset, value):
+        b = str(self.serialize(value))
+        if len(b) > self.size:
+            raise ValueError("Serialized value requires {} bytes but only {}"\
+                " are allowed".format(len(b), self.size))
+        buf[offset:offset+self.width] = _length.pack(len(b)) + \
+            b.ljust(self.size, "\0")
+
+
+def _serializeScalar(x):
+    # long() of a BigInt is its magnitude, so the sign is tested separately.
+    if x < 0:
+        x = -abs(long(x)) % long(orderGt())
+    return serializeZ(x)
+
+
+# Elements are stored uncompressed (deserializing a compressed point needs a
+# square root). They were validated when they were created or deserialized
+# by the caller, so they are not validated again. Sizes are those of
+# uncompressed BN-254 elements, so importing this module doesn't initialize
+# RELIC: a point is a format byte and its affine coordinates, and an element
+# of Gt has 12 coordinates in Fp.
+def _elementField(size, serialize, deserialize):
+    return _Field(size,
+        lambda x: serialize(x, False),
+        lambda b: deserialize(b, False, VALIDATE_OFF))
+
+G1 = _elementField(1 + 2*FP_BYTES, serializeG1, deserializeG1)
+G2 = _elementField(1 + 4*FP_BYTES, serializeG2, deserializeG2)
+GT = _elementField(12*FP_BYTES, serializeGt, deserializeGt)
+Z = _Field(SCALAR_SIZE, _serializeScalar, deserializeZ)
+BOOL = _Field(1, lambda x: "\1" if x else "\0", lambda b: b == "\1")
+
+
+class _Operation(object):
+    """
+    A function applied to each record of a batch. @func(*inputs + params)
+    returns a tuple of outputs.
+    """
+    def __init__(self, inputs, outputs, func):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.func = func
+        self.inputWidth = sum(f.width for f in inputs)
+        self.outputWidth = sum(f.width for f in outputs)
+
+
+def _evalAndProve(x, w, t, msk, s):
+    y, (p, c, u) = vpop.evalAndProve(w, t, x, msk, s)
+    return y, p, c, u
+
+
+# Operations by name. The vpop PRF is the one whose inputs and outputs are
+# all group elements and scalars.
+_operations = {
+    "pair": _Operation([G1, G2], [GT], lambda P, Q: (pair(P, Q),)),
+    "update": _Operation([GT], [GT], lambda z, delta: (z**delta,)),
+    "eval": _Operation([G1], [GT],
+        lambda x, w, t, msk, s: (vpop.eval(w, t, x, msk, s)[0],)),
+    "evalAndProve": _Operation([G1], [GT, G1, Z, Z], _evalAndProve),
+    "verify": _Operation([G1, GT, G1, Z, Z], [BOOL],
+        lambda x, y, p, c, u, t: (vpop.verify(x, t, y, (p, c, u), False),)),
+    "mulG1": _Operation([G1, Z], [G1], lambda P, a: (P*a,)),
+    "mulG2": _Operation([G2, Z], [G2], lambda P, a: (P*a,)),
+    "expGt": _Operation([GT, Z], [GT], lambda x, a: (x**a,)),
+}
+
+
+class BatchOperations(object):
+    """
+    Typed batch methods for executors that implement map(operation,
+    records, params) over the operations above.
+    """
+    def exp(self, items):
+        """
+        Computes x**a for each (x, a) in @items, x \in Gt.
+        """
+        return [x for x, in self.map("expGt", items)]
+
+
+    def mul(self, items):
+        """
+        Computes P*a for each (P, a) in @items. Every P must be in the same
+        group: G1 or G2.
+        """
+        items = list(items)
+        operation = "mulG2" if items and isinstance(items[0][0], G2Element) \
+            else "mulG1"
+        return [P for P, in self.map(operation, items)]
+
+
+    def pair(self, pairs):
+        """
+        Computes the pairing of each (P, Q) in @pairs.
+        """
+        return [z for z, in self.map("pair", pairs)]
+
+
+    def update(self, zs, delta):
+        """
+        Applies the update token @delta to each PRF output in @zs.
+        """
+        return [z for z, in self.map("update", [(z,) for z in zs], (delta,))]
+
+
+    def verify(self, t, responses):
+        """
+        Verifies each (x, y, pi) in @responses for tweak @t.
+        @returns a list of bools
+        """
+        return [ok for ok, in self.map("verify",
+            [(x, y, p, c, u) for x, y, (p, c, u) in responses], (t,))]
+
+
+class ProcessEngine(BatchOperations):
+    """
+    Applies vpop and pairing operations to batches of inputs on a pool of
+    worker processes. Typical use:
+        with ProcessEngine() as engine:
+            ys = engine.eval(w, t, xs, msk, s)
+    """
+    def __init__(self, processes=None, chunksPerProcess=4, snapshot=None):
+        """
+        Starts @processes workers (the number of CPUs by default). Batches
+        are split into @chunksPerProcess tasks per worker. If @snapshot is
+        the path of a snapshot file, each worker loads its precomputed
+        values.
+        """
+        self.processes = processes or cpu_count()
+        self.chunksPerProcess = chunksPerProcess
+        self._pool = Pool(self.processes, initializer=_initWorker,
+            initargs=(snapshot,))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
+
+
+    def eval(self, w, t, xs, msk, s):
+        """
+        Computes vpop.eval for each blinded message in @xs.
+        @s: the state value for @w (not a KeyTable)
+        @returns a list of results y
+        """
+        return [y for y, in self.map("eval", [(x,) for x in xs],
+            (w, t, msk, s))]
+
+
+    def evalAndProve(self, w, t, xs, msk, s):
+        """
+        Computes vpop.evalAndProve for each blinded message in @xs.
+        @s: the state value for @w (not a KeyTable)
+        @returns a list of (y, pi)
+        """
+        return [(y, (p, c, u)) for y,p,c,u in self.map("evalAndProve",
+            [(x,) for x in xs], (w, t, msk, s))]
+
+
+    def map(self, operation, records, params=()):
+        """
+        Applies the @operation (by name) to each tuple of inputs in @records
+        along with the shared @params.
+        @returns a list of output tuples
+        """
+        op = _operations[operation]
+        records = list(records)
+        if not records:
+            return []
+
+        segment = _Segment(len(records)*(op.inputWidth + op.outputWidth))
+        try:
+            outputStart = len(records)*op.inputWidth
+            for i, record in enumerate(records):
+                _writeRecord(segment.map, i*op.inputWidth, op.inputs, record)
+
+            chunk = max(1, -(-len(records) //
+                (self.processes*self.chunksPerProcess)))
+            tasks = [(operation, segment.path, start,
+                    min(start + chunk, len(records)), outputStart, params)
+                for start in range(0, len(records), chunk)]
+            self._pool.map(_work, tasks, 1)
+
+            return [_readRecord(segment.map, outputStart + i*op.outputWidth,
+                    op.outputs) for i in range(len(records))]
+        finally:
+            segment.close()
+
+
+class _Segment(object):
+    """
+    A temporary file mapped into memory and shared with worker processes by
+    name.
+    """
+    def __init__(self, size):
+        fd, self.path = tempfile.mkstemp(prefix="pyrelic-", dir=SHM_DIR)
+        self._file = os.fdopen(fd, "r+b")
+        self._file.truncate(size)
+        self.map = mmap.mmap(self._file.fileno(), size)
+
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+        os.remove(self.path)
+
+
+def _initWorker(snapshot=None):
+    """
+    Prepares a worker process. The fork copied the parent's RELIC generator
+    state and pools, so they are reset.
+    """
+    after_fork()
+    if snapshot:
+        loadSnapshot(snapshot)
+    for value in [generatorG1, generatorG2, generatorGt, orderGt]:
+        value()
+    if vpop.tweakCache() is None:
+        vpop.enableTweakCache(TWEAK_CACHE_SIZE)
+
+
+def _work(task):
+    """
+    Processes records [@start, @stop) of a segment in a worker process.
+    """
+    operation, path, start, stop, outputStart, params = task
+    op = _operations[operation]
+    with open(path, "r+b") as f:
+        m = mmap.mmap(f.fileno(), 0)
+        try:
+            for i in xrange(start, stop):
+                inputs = _readRecord(m, i*op.inputWidth, op.inputs)
+                _writeRecord(m, outputStart + i*op.outputWidth, op.outputs,
+                    op.func(*(inputs + tuple(params))))
+        finally:
+            m.close()
+
+
+def _readRecord(buf, offset, fields):
+    values = []
+    for field in fields:
+        values.append(field.read(buf, offset))
+        offset += field.width
+    return tuple(values)
+
+
+def _writeRecord(buf, offset, fields, values):
+    for field, value in zip(fields, values):
+        field.write(buf, offset, value)
+        offset += field.width
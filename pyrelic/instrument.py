@@ -0,0 +1,188 @@
+"""
+Opt-in instrumentation of calls into RELIC: call counts, cumulative wall
+time, and a histogram of wall times for each RELIC function, so a slowdown
+can be attributed to RELIC or to the Python code around it. Typical use:
+    with recording():
+        vpop.evalAndProve(w, t, x, msk, s)
+    print report()
+
+Disabled instrumentation costs nothing: functions are only wrapped while it
+is enabled (see relic.setWrapper). Functions that a caller looked up and
+stored before it was enabled (e.g. in a RecordStore) are not recorded.
+
+Run as a script to report on the vpop protocol:
+    python instrument.py [--json] [iterations]
+"""
+from relic import setWrapper
+from contextlib import contextmanager
+from threading import Lock
+from timeit import default_timer
+import json, sys
+
+# Upper bounds of the histogram buckets, in microseconds. The last bucket
+# holds the slower calls.
+BUCKETS = [2**i for i in range(18)]
+
+_lock = Lock()
+_stats = {}
+_enabled = False
+_started = default_timer()
+
+
+class _Stat(object):
+    """
+    Recorded calls of one function.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.histogram = [0]*(len(BUCKETS) + 1)
+
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        usec, i = seconds*1e6, 0
+        while i < len(BUCKETS) and usec > BUCKETS[i]:
+            i += 1
+        self.histogram[i] += 1
+
+
+def disable():
+    """
+    Stops recording. Recorded values are kept.
+    """
+    global _enabled
+    _enabled = False
+    setWrapper(None)
+
+
+def enable():
+    """
+    Starts recording calls into RELIC.
+    """
+    global _enabled
+    _enabled = True
+    setWrapper(_wrap)
+
+
+def enabled():
+    return _enabled
+
+
+@contextmanager
+def recording(clear=True):
+    """
+    Records calls into RELIC within a with block, after clearing earlier
+    values if @clear is True.
+    """
+    if clear:
+        reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def report(format="text", limit=None):
+    """
+    Reports the recorded values for the @limit functions with the most
+    time, as a table (@format "text") or a JSON object ("json") in the
+    structure of snapshot().
+    """
+    s = snapshot()
+    if format == "json":
+        return json.dumps(s, indent=2, sort_keys=True)
+    if format != "text":
+        raise ValueError("Unknown report format {}".format(format))
+
+    functions = sorted(s["functions"].items(),
+        key=lambda item: -item[1]["seconds"])[:limit]
+    lines = ["{:<24} {:>9} {:>11} {:>9} {:>9} {:>9}".format("function",
+        "calls", "total ms", "mean us", "p50 us", "p99 us")]
+    for name, f in functions:
+        lines.append("{:<24} {:>9} {:>11.2f} {:>9.1f} {:>9} {:>9}".format(
+            name, f["calls"], f["seconds"]*1e3, f["seconds"]*1e6/f["calls"],
+            _percentile(f["histogram"], 0.5),
+            _percentile(f["histogram"], 0.99)))
+    lines.append("RELIC: {:.2f} ms of {:.2f} ms elapsed ({:.0%})".format(
+        s["relicSeconds"]*1e3, s["elapsed"]*1e3,
+        s["relicSeconds"]/s["elapsed"] if s["elapsed"] else 0.0))
+    return "\n".join(lines)
+
+
+def reset():
+    """
+    Clears the recorded values and restarts the elapsed time.
+    """
+    global _started
+    with _lock:
+        _stats.clear()
+        _started = default_timer()
+
+
+def snapshot():
+    """
+    Retrieves the recorded values.
+    @returns a dict with keys:
+        functions: {name: {calls, seconds, histogram}}, where histogram[i]
+            counts the calls that took at most BUCKETS[i] microseconds (and
+            more than BUCKETS[i-1]); the last entry counts slower calls
+        buckets: BUCKETS
+        relicSeconds: total time in RELIC functions
+        elapsed: seconds since the last reset
+    """
+    with _lock:
+        functions = dict((name, dict(calls=stat.calls, seconds=stat.seconds,
+            histogram=list(stat.histogram))) for name, stat in _stats.items())
+        elapsed = default_timer() - _started
+    return dict(functions=functions, buckets=BUCKETS, elapsed=elapsed,
+        relicSeconds=sum(f["seconds"] for f in functions.values()))
+
+
+def _percentile(histogram, fraction):
+    """
+    Estimates a percentile as the upper bound of its bucket.
+    """
+    target, count = fraction*sum(histogram), 0
+    for i, n in enumerate(histogram):
+        count += n
+        if n and count >= target:
+            return BUCKETS[i] if i < len(BUCKETS) else \
+                ">{}".format(BUCKETS[-1])
+    return 0
+
+
+def _record(name, seconds):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.add(seconds)
+
+
+def _wrap(name, func):
+    def call(*args):
+        start = default_timer()
+        try:
+            return func(*args)
+        finally:
+            _record(name, default_timer() - start)
+    return call
+
+
+if __name__ == "__main__":
+    from testcommon import randomstr
+    import vpop
+    args = [a for a in sys.argv[1:] if a != "--json"]
+    iterations = int(args[0]) if args else 100
+
+    w, t, msk, s = "ensemble", "tweak", randomstr(), randomstr()
+    with recording():
+        for i in xrange(iterations):
+            r, x = vpop.blind(str(i))
+            y, pi = vpop.evalAndProve(w, t, x, msk, s)
+            vpop.verify(x, t, y, pi)
+            vpop.deblind(r, y)
+    print report("json" if "--json" in sys.argv else "text")
@@ -0,0 +1,133 @@
+"""
+A persistent key table for Pythia servers: maps each ensemble key selector w
+to its state value s and key rotation metadata. The table is stored in a
+memory-mapped hash table (see mmaphash.py), so lookups are O(1) and do not
+load the table into memory. A KeyTable can be passed to the PRF eval
+functions in place of s.
+"""
+from mmaphash import MmapHashTable
+from collections import namedtuple
+import hashlib, struct, time
+
+# Maximum length of a state value s.
+MAX_STATE_SIZE = 64
+
+# Record: version, time of last update, length of s, s (padded)
+_record = struct.Struct(">IdB{}s".format(MAX_STATE_SIZE))
+
+# Key rotation metadata stored along with the state value.
+KeyRecord = namedtuple("KeyRecord", ["s", "version", "updated"])
+
+
+class KeyTable(object):
+    """
+    A persistent map from ensemble key selectors to KeyRecords.
+    """
+    def __init__(self, path, capacity=1024):
+        """
+        Opens the key table at @path, creating it with room for @capacity
+        ensembles if it doesn't exist.
+        """
+        self._table = MmapHashTable(path, hashlib.sha256().digest_size,
+            _record.size, int(capacity/0.7) + 1)
+
+
+    def __contains__(self, w):
+        return _key(w) in self._table
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __len__(self):
+        return len(self._table)
+
+
+    def bulkLoad(self, items, count=None):
+        """
+        Inserts or replaces the state for many ensembles at once.
+        @items: (w, s) pairs; the version of each entry is set to 1
+        @count: number of items, if @items is an iterator
+        """
+        now = time.time()
+        self._table.bulkLoad(((_key(w), _pack(s, 1, now)) for w,s in items),
+            count if count is not None else
+                (len(items) if hasattr(items, "__len__") else None))
+
+
+    def close(self):
+        self._table.close()
+
+
+    def delete(self, w):
+        """
+        Removes ensemble @w.
+        @returns True if @w was present.
+        """
+        return self._table.delete(_key(w))
+
+
+    def flush(self):
+        self._table.flush()
+
+
+    def get(self, w):
+        """
+        Retrieves the KeyRecord for ensemble @w, or None if it is not present.
+        """
+        record = self._table.get(_key(w))
+        if record is None:
+            return None
+        version, updated, size, s = _record.unpack(record)
+        return KeyRecord(s[:size], version, updated)
+
+
+    def put(self, w, s, version=1):
+        """
+        Sets the state value for ensemble @w.
+        """
+        self._table.put(_key(w), _pack(s, version, time.time()))
+
+
+    def rotate(self, w, s):
+        """
+        Replaces the state value for ensemble @w with @s and increments its
+        version.
+        @returns the new KeyRecord
+        """
+        with self._table._lock:
+            current = self.get(w)
+            version = current.version + 1 if current else 1
+            self.put(w, s, version)
+            return self.get(w)
+
+
+    def state(self, w):
+        """
+        Retrieves the state value s for ensemble @w. Raises KeyError if @w is
+        not in the table.
+        """
+        record = self.get(w)
+        if record is None:
+            raise KeyError("Ensemble is not in the key table: {}".format(w))
+        return record.s
+
+
+def _key(w):
+    """
+    Table keys are the SHA-256 digest of the ensemble key selector.
+    """
+    return hashlib.sha256(str(w)).digest()
+
+
+def _pack(s, version, updated):
+    s = str(s)
+    if len(s) > MAX_STATE_SIZE:
+        raise ValueError("State values are limited to {} bytes".format(
+            MAX_STATE_SIZE))
+    return _record.pack(version, updated, len(s), s)
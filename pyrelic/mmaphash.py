@@ -0,0 +1,274 @@
+"""
+A persistent hash table of fixed-width keys and values stored in a
+memory-mapped file. Lookups use open addressing (linear probing) directly on
+the mapped file, so only the pages that are touched are read from disk and
+tables much larger than memory can be used.
+
+File layout: a 64 byte header followed by a power-of-two number of slots.
+Each slot is a status byte, the key, and the value.
+"""
+import hashlib, mmap, os, struct
+from threading import RLock
+
+# Header: magic, key size, value size, capacity, count, deleted slots
+MAGIC = "PYRHASH1"
+_header = struct.Struct(">8sIIQQQ")
+HEADER_SIZE = 64
+
+# Slot status
+EMPTY, USED, DELETED = "\0", "\1", "\2"
+
+# Maximum fraction of slots in use (including deleted slots) before the
+# table is resized.
+MAX_LOAD = 0.7
+
+
+class MmapHashTable(object):
+    """
+    Maps fixed-width byte string keys to fixed-width byte string values.
+    Safe for use by multiple threads in one process; a file must not be
+    opened for writing by more than one table at a time.
+    """
+    def __init__(self, path, keySize=None, valueSize=None, capacity=1024):
+        """
+        Opens the table at @path, or creates it with the given @keySize,
+        @valueSize and initial @capacity (number of slots) if the file does
+        not exist.
+        """
+        self.path = path
+        self._lock = RLock()
+
+        if not os.path.exists(path):
+            if keySize is None or valueSize is None:
+                raise ValueError("keySize and valueSize are required to "
+                    "create a table")
+            _create(path, keySize, valueSize, _roundCapacity(capacity))
+
+        self._open()
+        if (keySize not in (None, self.keySize)) or \
+                (valueSize not in (None, self.valueSize)):
+            self.close()
+            raise ValueError("{} has key and value sizes {},{}".format(path,
+                self.keySize, self.valueSize))
+
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __len__(self):
+        return self._count
+
+
+    def bulkLoad(self, items, count=None):
+        """
+        Inserts or replaces many (key, value) pairs. When the number of
+        @items (or @count, for iterators) is known, the table is resized
+        once, up front.
+        """
+        if count is None and hasattr(items, "__len__"):
+            count = len(items)
+
+        with self._lock:
+            if count:
+                self._reserve(self._count + count)
+            for key, value in items:
+                self._reserve(self._count + 1)
+                self._put(key, value)
+            self._writeHeader()
+
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        with self._lock:
+            if self._map is not None:
+                self._writeHeader()
+                self._map.flush()
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+
+    def delete(self, key):
+        """
+        Removes @key.
+        @returns True if @key was present.
+        """
+        with self._lock:
+            i, found = self._find(key)
+            if not found:
+                return False
+
+            self._map[self._offset(i)] = DELETED
+            self._count -= 1
+            self._deleted += 1
+            self._writeHeader()
+            return True
+
+
+    def flush(self):
+        """
+        Writes changes to disk.
+        """
+        with self._lock:
+            self._writeHeader()
+            self._map.flush()
+
+
+    def get(self, key):
+        """
+        Retrieves the value for @key, or None if it is not present.
+        """
+        with self._lock:
+            i, found = self._find(key)
+            if not found:
+                return None
+            start = self._offset(i) + 1 + self.keySize
+            return self._map[start:start + self.valueSize]
+
+
+    def items(self):
+        """
+        Generates every (key, value) pair in the table in slot order.
+        """
+        k, v = self.keySize, self.valueSize
+        for i in xrange(self.capacity):
+            with self._lock:
+                offset = self._offset(i)
+                if self._map[offset] != USED:
+                    continue
+                record = self._map[offset+1:offset+1+k+v]
+            yield record[:k], record[k:]
+
+
+    def put(self, key, value):
+        """
+        Inserts or replaces the @value for @key.
+        """
+        with self._lock:
+            self._reserve(self._count + 1)
+            self._put(key, value)
+            self._writeHeader()
+
+
+    def _find(self, key):
+        """
+        Finds the slot for @key.
+        @returns (index, found): the slot holding @key, or the slot where it
+            should be inserted.
+        """
+        if len(key) != self.keySize:
+            raise ValueError("Keys must be {} bytes".format(self.keySize))
+
+        m, mask, slotSize = self._map, self.capacity - 1, self._slotSize
+        i = _slotHash(key) & mask
+        insertAt = None
+        while True:
+            offset = HEADER_SIZE + i*slotSize
+            status = m[offset]
+            if status == EMPTY:
+                return (i if insertAt is None else insertAt), False
+
+            if status == DELETED:
+                if insertAt is None:
+                    insertAt = i
+            elif m[offset+1:offset+1+self.keySize] == key:
+                return i, True
+            i = (i + 1) & mask
+
+
+    def _offset(self, i):
+        return HEADER_SIZE + i*self._slotSize
+
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.keySize, self.valueSize, self.capacity, self._count, \
+            self._deleted = _header.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            self._file.close()
+            raise ValueError("{} is not a hash table file".format(self.path))
+        self._slotSize = 1 + self.keySize + self.valueSize
+
+
+    def _put(self, key, value):
+        if len(value) != self.valueSize:
+            raise ValueError("Values must be {} bytes".format(self.valueSize))
+
+        i, found = self._find(key)
+        offset = self._offset(i)
+        if not found:
+            if self._map[offset] == DELETED:
+                self._deleted -= 1
+            self._count += 1
+        self._map[offset:offset+self._slotSize] = USED + key + value
+
+
+    def _reserve(self, count):
+        """
+        Resizes the table, if needed, so that it can hold @count entries.
+        Deleted slots are discarded when the table is rebuilt.
+        """
+        if count + self._deleted <= MAX_LOAD*self.capacity:
+            return
+
+        capacity = _roundCapacity(int(count/MAX_LOAD) + 1)
+        tmp = self.path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        _create(tmp, self.keySize, self.valueSize, capacity)
+        table = MmapHashTable(tmp)
+        for key, value in self.items():
+            table._put(key, value)
+        table.close()
+
+        self._map.close()
+        self._file.close()
+        os.rename(tmp, self.path)
+        self._open()
+
+
+    def _writeHeader(self):
+        _header.pack_into(self._map, 0, MAGIC, self.keySize, self.valueSize,
+            self.capacity, self._count, self._deleted)
+
+
+def _create(path, keySize, valueSize, capacity):
+    """
+    Writes an empty table file.
+    """
+    with open(path, "wb") as f:
+        f.write(_header.pack(MAGIC, keySize, valueSize, capacity, 0, 0).
+            ljust(HEADER_SIZE, "\0"))
+        f.truncate(HEADER_SIZE + capacity*(1 + keySize + valueSize))
+
+
+def _roundCapacity(n):
+    """
+    Rounds @n up to a power of two (at least 8).
+    """
+    capacity = 8
+    while capacity < n:
+        capacity <<= 1
+    return capacity
+
+
+def _slotHash(key):
+    """
+    Computes the starting slot for @key. Python's hash() is not stable
+    across processes (with -R), so the index is derived from MD5.
+    """
+    return struct.unpack_from(">Q", hashlib.md5(key).digest())[0]
@@ -0,0 +1,96 @@
+"""
+Thread-parallel batch operations. ctypes releases the GIL while RELIC runs,
+so pairings, hashes, and scalar multiplications spread across a pool of
+threads use every core available to one process.
+
+Worker threads call relic.initThread before their first task. Other threads
+that use pyrelic concurrently should do the same.
+"""
+from pbc import *
+from relic import initThread
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+# Shared pool used when callers don't supply one (see threadPool).
+_pool = None
+_poolLock = Lock()
+
+
+def threadPool(threads=None):
+    """
+    Retrieves the shared thread pool, creating it with @threads workers (the
+    number of CPUs by default) on first use.
+    """
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ThreadPool(threads or cpu_count(), initializer=initThread)
+        return _pool
+
+
+def shutdown():
+    """
+    Stops the shared thread pool. A new pool is created on the next call.
+    """
+    global _pool
+    with _poolLock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def parallelMap(func, items, pool=None, chunksize=None):
+    """
+    Computes [func(x) for x in @items] on a thread @pool (the shared pool by
+    default).
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    pool = pool or threadPool()
+    if chunksize is None:
+        # A few chunks per thread balances the load without paying for a
+        # task per item.
+        chunksize = max(1, len(items) // (4*pool._processes))
+    return pool.map(func, items, chunksize)
+
+
+def parallelPair(pairs, pool=None):
+    """
+    Computes the pairing of each (P, Q) in @pairs.
+    @returns a list of GtElements
+    """
+    return parallelMap(lambda (P, Q): pair(P, Q), pairs, pool)
+
+
+def parallelHashG1(messages, pool=None):
+    """
+    Hashes each string in @messages onto G1.
+    """
+    return parallelMap(hashG1, messages, pool)
+
+
+def parallelHashG2(messages, pool=None):
+    """
+    Hashes each string in @messages onto G2.
+    """
+    return parallelMap(hashG2, messages, pool)
+
+
+def parallelMul(elements, scalars, pool=None):
+    """
+    Computes @elements[i]*@scalars[i] (@elements[i]**@scalars[i] in Gt). A
+    single scalar is applied to every element.
+    """
+    elements = list(elements)
+    if isinstance(scalars, (int, long, BigInt)):
+        scalars = [scalars]*len(elements)
+    if len(scalars) != len(elements):
+        raise ValueError("Expected one scalar per element")
+
+    def mul((x, a)):
+        return x**a if isinstance(x, GtElement) else x*a
+    return parallelMap(mul, zip(elements, scalars), pool)
@@ -3,12 +3,79 @@
 Interface to the Barreto Naehrig 256-bit pairing-based elliptic curves 
 (PBC) in the RELIC library.
 """
-from relic import librelic
-from ctypes import byref, c_int, c_ubyte
+from relic import byref, librelic, randLock
+from ctypes import c_ubyte, c_ulonglong
 from ec import *
 from ec import _getCachedValue, _equal, _serialize, _deserialize
 from bi import *
 from common import *
+from contextlib import contextmanager
+from random import SystemRandom
+import hashlib, math, struct, svdw, threading
+
+# Default domain-separation strings for hashG1 and hashG2.
+HASH_G1_DOMAIN = "PYRELIC_HASH_G1_V1"
+HASH_G2_DOMAIN = "PYRELIC_HASH_G2_V1"
+
+# Tags that identify the type of each value absorbed by a Hasher.
+TAG_BYTES = "b"
+TAG_SCALAR = "z"
+TAG_NEGATIVE_SCALAR = "n"
+TAG_G1 = "1"
+TAG_G2 = "2"
+TAG_GT = "t"
+TAG_EC = "e"
+TAG_STREAM = "s"
+
+# When set, hashG1 and hashG2 encode their arguments as in pyrelic 1.0:
+# the str() of the argument tuple.
+_legacyHash = False
+
+# Hash-to-curve algorithms for hashG1 and hashG2 (see setHashAlgorithm):
+#  relic:   RELIC's try-and-increment maps, g1_map_abi and g2_map_abi. Fast, 
+#           but the running time depends on the input.
+#  svdw:    Shallue-van de Woestijne map, hashed to the curve as in RFC 9380
+#           (two maps per hash). Cofactors in G2 are cleared with RELIC's
+#           endomorphism-based ep2_mul_cof_bn.
+#  svdw-nu: The same map evaluated once per hash (RFC 9380 encode_to_curve).
+#           Half the cost of svdw, but outputs are not uniformly distributed.
+HASH_RELIC = "relic"
+HASH_SVDW = "svdw"
+HASH_SVDW_NU = "svdw-nu"
+_hashAlgorithmG1 = HASH_RELIC
+_hashAlgorithmG2 = HASH_RELIC
+
+# Validation policies for deserialized elements (see validation()):
+#  off:     no checks. For trusted data, e.g. values we stored ourselves.
+#  element: each element is tested for membership in its group as it is
+#           deserialized; invalid elements raise ValueError.
+#  batch:   elements are collected by the enclosing validation() block and
+#           tested together, by a BatchValidator, when the block exits.
+VALIDATE_OFF = "off"
+VALIDATE_ELEMENT = "element"
+VALIDATE_BATCH = "batch"
+_validationPolicy = VALIDATE_OFF
+
+# Stack of (policy, BatchValidator) for the validation() blocks entered by
+# each thread.
+_validationContext = threading.local()
+
+# Held while reading RELIC's error state: there is one error code shared by
+# all threads, and reading it clears it.
+_errorLock = threading.Lock()
+
+# A BatchValidator accepts an invalid batch with probability at most
+# 2^-BATCH_SECURITY. Random coefficients are BATCH_BITS long (see
+# BatchValidator).
+BATCH_SECURITY = 64
+BATCH_BITS = 3
+
+# The smallest prime factor of the cofactor of G2 in the twist E'(Fp2), and 
+# of Gt in the cyclotomic subgroup of Fp12, for BN-254. G1 has cofactor 1.
+_smallestCofactorPrime = 13
+
+# Size, in bytes, of an element of the base field Fp.
+FP_BYTES = 32
 
 
 class G1Element(ec1Element):
@@ -47,6 +114,14 @@ class G1Element(ec1Element):
         return _scalarMultiply(self, other, orderG1(), librelic.g1_mul_abi)
 
 
+    def __reduce__(self):
+        """
+        Pickles this element as its compressed serialization. Unpickling
+        skips validation: only unpickle trusted data.
+        """
+        return (deserializeG1, (str(serializeG1(self)), True, VALIDATE_OFF))
+
+
     def inverse(self):
         """
         Retrieves the inverse of a G1 element.
@@ -111,6 +186,14 @@ class G2Element(ec2Element):
         return self.mul_table(other)
 
 
+    def __reduce__(self):
+        """
+        Pickles this element as its compressed serialization (see
+        G1Element.__reduce__).
+        """
+        return (deserializeG2, (str(serializeG2(self)), True, VALIDATE_OFF))
+
+
     def inverse(self):
         """
         Retrieves the inverse of a G1 element.
@@ -146,12 +229,7 @@ class G2Element(ec2Element):
             return NotImplemented
         other %= orderG2()
 
-        # Building the precomputation table, if there is not one already.
-        if not self._table:
-            self._table = lwnafTable()
-            librelic.ep2_mul_pre_lwnaf(byref(self._table), byref(self))
-
-
+        self.precompute()
         result = G2Element()
         librelic.ep2_mul_fix_lwnaf(byref(result), byref(self._table), 
             byref(other))
@@ -165,6 +243,19 @@ class G2Element(ec2Element):
         librelic.g2_norm_abi(byref(self), byref(self))
 
 
+    def precompute(self):
+        """
+        Builds the precomputation table for mul_table, if there is not one
+        already.
+        """
+        # The table is complete before it is stored: other threads may be
+        # using this element.
+        if not self._table:
+            table = lwnafTable()
+            librelic.ep2_mul_pre_lwnaf(byref(table), byref(self))
+            self._table = table
+
+
 
 class GtElement(ec12Element):
     """
@@ -181,6 +272,14 @@ class GtElement(ec12Element):
         return _equal(self, other, 1, librelic.gt_cmp_abi)
 
 
+    def __reduce__(self):
+        """
+        Pickles this element as its compressed serialization (see
+        G1Element.__reduce__).
+        """
+        return (deserializeGt, (str(serializeGt(self)), True, VALIDATE_OFF))
+
+
     def __invert__(self):
         """
         Computes the inverse of an element in Gt.
@@ -237,6 +336,106 @@ class GtElement(ec12Element):
         return librelic.gt_is_unity_abi(byref(self)) == 1
 
 
+class Hasher(object):
+    """
+    Incremental, domain-separated hash over a sequence of values. Each value
+    is absorbed as: tag || length || canonical bytes, so that inputs never 
+    need to be concatenated in memory and distinct sequences never collide.
+    """
+    def __init__(self, domain="", alg=hashlib.sha256):
+        """
+        Starts a new hash bound to the @domain separation string.
+        """
+        self._alg = alg
+        self._hash = alg()
+        self._absorb(TAG_BYTES, domain)
+
+
+    def absorb(self, *values):
+        """
+        Absorbs each of @values in order. Values may be strings, integer 
+        types, group elements, file objects, or iterators over strings.
+        @returns this hasher so calls can be chained.
+        """
+        for x in values:
+            if isinstance(x, (str, bytearray, buffer)):
+                self._absorb(TAG_BYTES, x)
+
+            # Check the subclasses first: G1Element is also an ec1Element.
+            elif isinstance(x, G1Element):
+                self._absorb(TAG_G1, serializeG1(x))
+
+            elif isinstance(x, G2Element):
+                self._absorb(TAG_G2, serializeG2(x))
+
+            elif isinstance(x, GtElement):
+                self._absorb(TAG_GT, serializeGt(x))
+
+            elif isinstance(x, ec1Element):
+                self._absorb(TAG_EC, serializeEc(x))
+
+            elif isinstance(x, unicode):
+                self._absorb(TAG_BYTES, x.encode("utf-8"))
+
+            elif isinstance(x, (BigInt, int, long)):
+                self._absorb(_scalarTag(x), serializeZ(x))
+
+            elif hasattr(x, "read") or hasattr(x, "next"):
+                self.absorbStream(x)
+
+            else:
+                raise NotImplementedError("Cannot hash {}; only group "\
+                    "elements, integer types, strings, and streams are "\
+                    "supported".format(type(x)))
+        return self
+
+
+    def absorbStream(self, stream, chunkSize=1 << 16):
+        """
+        Absorbs the contents of a file object or an iterator over strings, 
+        @stream, without reading it into memory. The contents are hashed
+        separately and absorbed as a single value, so the result does not 
+        depend on how the stream is chunked.
+        """
+        if hasattr(stream, "read"):
+            chunks = iter(lambda: stream.read(chunkSize), "")
+        else:
+            chunks = stream
+
+        inner = self._alg()
+        for chunk in chunks:
+            inner.update(chunk)
+        self._absorb(TAG_STREAM, inner.digest())
+        return self
+
+
+    def digest(self):
+        """
+        Retrieves the digest of everything absorbed so far. The hasher is not
+        modified and can continue to absorb values.
+        """
+        return self._hash.copy().digest()
+
+
+    def _absorb(self, tag, b):
+        """
+        Feeds @tag, the length of @b, and @b into the hash.
+        """
+        self._hash.update(tag + struct.pack(">I", len(b)))
+        self._hash.update(b)
+
+
+def _scalarTag(x):
+    """
+    Retrieves the tag for integer type @x which depends on its sign.
+    """
+    if isinstance(x, BigInt):
+        negative = x.sign == BigInt.NEGATIVE_FLAG.value and x.used > 0
+    else:
+        negative = x < 0
+    return TAG_NEGATIVE_SCALAR if negative else TAG_SCALAR
+
+
 def _add(a, b, relicAdd):
     """
     Adds two elements @a,@b of the same type into @result using @relicAddFunc.
@@ -287,25 +486,287 @@ def _genMultiply(a, element, n, relicGenMultiplyFunc):
     return result
 
 
-def deserializeG1(x, compressed=True):
+def deserializeG1(x, compressed=True, validate=None):
     """
     Deserializes an array of bytes, @x, into a G1 element.
+    @validate: validation policy; defaults to validationPolicy()
     """
-    return _deserialize(x, G1Element, compressed, librelic.g1_read_bin_abi)
+    return _deserializeValidated(x, G1Element, compressed, 
+        librelic.g1_read_bin_abi, validate)
 
 
-def deserializeG2(x, compressed=True):
+def deserializeG2(x, compressed=True, validate=None):
     """
     Deserializes an array of bytes, @x, into a G2 element.
+    @validate: validation policy; defaults to validationPolicy()
     """
-    return _deserialize(x, G2Element, compressed, librelic.g2_read_bin_abi)
+    return _deserializeValidated(x, G2Element, compressed, 
+        librelic.g2_read_bin_abi, validate)
 
 
-def deserializeGt(x, compressed=True):
+def deserializeGt(x, compressed=True, validate=None):
     """
     Deserializes an array of bytes, @x, into a Gt element.
+    @validate: validation policy; defaults to validationPolicy()
+    """
+    return _deserializeValidated(x, GtElement, compressed, 
+        librelic.gt_read_bin_abi, validate)
+
+
+def isValid(x):
+    """
+    Determines if @x is a member of its group: G1, G2, or Gt. Deserialized
+    elements are not necessarily members.
+    """
+    if isinstance(x, G1Element):
+        # G1 has prime order, so every point on the curve is a member.
+        return librelic.g1_is_valid_abi(byref(x)) == 1
+
+    if isinstance(x, G2Element):
+        return librelic.g2_is_valid_abi(byref(x)) == 1 and _hasOrderN(x)
+
+    assertType(x, GtElement)
+    return _hasOrderN(x)
+
+
+def validation(policy=VALIDATE_ELEMENT):
+    """
+    Sets the validation policy for elements deserialized by this thread in a
+    with block. For example, to validate a batch of client requests:
+        with validation(VALIDATE_BATCH):
+            xs = [vpop.unwrapX(x) for x in requests]
+    In batch mode the with statement returns the block's BatchValidator and
+    the elements are tested when the block exits: ValueError is raised if
+    any of them is invalid. In other modes it returns None.
     """
-    return _deserialize(x, GtElement, compressed, librelic.gt_read_bin_abi)
+    _checkPolicy(policy)
+    return _validationBlock(policy)
+
+
+def validationPolicy(default=None):
+    """
+    Retrieves the validation policy for this thread: the policy of the 
+    innermost validation() block, if any, else @default, else the module-wide
+    policy (see setValidationPolicy).
+    """
+    stack = getattr(_validationContext, "stack", None)
+    if stack:
+        return stack[-1][0]
+    return default if default is not None else _validationPolicy
+
+
+def setValidationPolicy(policy):
+    """
+    Sets the module-wide validation policy for deserialized elements: 
+    VALIDATE_OFF (the default) or VALIDATE_ELEMENT. Batch validation is only
+    available within a validation() block.
+    """
+    global _validationPolicy
+    _checkPolicy(policy)
+    if policy == VALIDATE_BATCH:
+        raise ValueError("Batch validation requires a validation() block")
+    _validationPolicy = policy
+
+
+class BatchValidator(object):
+    """
+    Tests many elements for group membership at once. Each element is first
+    checked cheaply: on the curve for G1 and G2, in the cyclotomic subgroup 
+    of Fp12 for Gt. For G1, which has prime order, this is sufficient. 
+
+    For G2 and Gt, a random linear combination S of the elements is tested
+    instead of each element: S*n is the identity (n the group order) if 
+    every element is valid. An invalid element is missed by one combination
+    with probability at most 1/8 (for BATCH_BITS=3 and the smallest cofactor
+    prime 13), so the test is repeated with fresh coefficients until the 
+    error bound is at most 2^-@security. Each repetition costs one addition 
+    per element and one multiplication by n: the test is cheaper than 
+    validating each element for batches of more than a few dozen elements.
+    """
+    def __init__(self, security=BATCH_SECURITY):
+        self.security = security
+        self._elements = {G1Element: [], G2Element: [], GtElement: []}
+
+
+    def __len__(self):
+        return sum(len(elements) for elements in self._elements.values())
+
+
+    def add(self, x):
+        """
+        Adds element @x to the batch.
+        """
+        assertType(x, (G1Element, G2Element, GtElement))
+        self._elements[type(x)].append(x)
+
+
+    def check(self):
+        """
+        Raises ValueError if any element in the batch is invalid.
+        """
+        if not self.isValid():
+            raise ValueError("The batch contains elements that are not "\
+                "group members")
+
+
+    def isValid(self):
+        """
+        Determines if every element in the batch is a member of its group.
+        """
+        if not all(librelic.g1_is_valid_abi(byref(P)) == 1 
+                for P in self._elements[G1Element]):
+            return False
+
+        if not all(librelic.g2_is_valid_abi(byref(P)) == 1 
+                for P in self._elements[G2Element]):
+            return False
+
+        if not all(_isCyclotomic(x) for x in self._elements[GtElement]):
+            return False
+
+        return self._combinationsValid(self._elements[G2Element], 
+                lambda P,Q: P + Q) and \
+            self._combinationsValid(self._elements[GtElement], 
+                lambda x,y: x * y)
+
+
+    def _combinationsValid(self, elements, add):
+        """
+        Tests random linear combinations of @elements, where @add is the
+        group operation.
+        """
+        if not elements:
+            return True
+
+        # Multiples 1..2^BATCH_BITS-1 of each element (a zero coefficient 
+        # skips the element).
+        tables = []
+        for x in elements:
+            table = [None, x]
+            for _ in range(2**BATCH_BITS - 2):
+                table.append(add(table[-1], x))
+            tables.append(table)
+
+        mask = 2**BATCH_BITS - 1
+        for _ in range(_batchRounds(self.security)):
+            coefficients = _systemRandom.getrandbits(BATCH_BITS*len(tables))
+            S = None
+            for table in tables:
+                multiple = table[coefficients & mask]
+                coefficients >>= BATCH_BITS
+                if multiple is not None:
+                    S = multiple if S is None else add(S, multiple)
+
+            if S is not None and not _hasOrderN(S):
+                return False
+        return True
+
+
+# Coefficients for batch validation must be unpredictable.
+_systemRandom = SystemRandom()
+
+
+def _batchRounds(security):
+    """
+    Computes the number of random linear combinations a BatchValidator tests
+    to reach an error bound of 2^-@security. An invalid element is missed by
+    one combination only if its coefficient falls in one residue class 
+    modulo a prime factor of its order: at most ceil(2^b/p) of the 2^b 
+    coefficients for a prime p (at least 13), and at most 1 if p > 2^b.
+    """
+    b = BATCH_BITS
+    p = _smallestCofactorPrime
+    missed = max(float(-(-2**b // p)), 1.0) / 2**b
+    return int(math.ceil(security / -math.log(missed, 2)))
+
+
+@contextmanager
+def _validationBlock(policy):
+    batch = BatchValidator() if policy == VALIDATE_BATCH else None
+    stack = _validationContext.__dict__.setdefault("stack", [])
+    stack.append((policy, batch))
+    try:
+        yield batch
+    finally:
+        stack.pop()
+
+    # Only reached if the block completes without an exception.
+    if batch is not None:
+        batch.check()
+
+
+def _checkPolicy(policy):
+    if policy not in (VALIDATE_OFF, VALIDATE_ELEMENT, VALIDATE_BATCH):
+        raise ValueError("Unknown validation policy {}; choose one of {}".\
+            format(policy, [VALIDATE_OFF, VALIDATE_ELEMENT, VALIDATE_BATCH]))
+
+
+def _hasOrderN(x):
+    """
+    Determines if @x*n (or @x**n) is the identity, where n is the order of 
+    G2 and Gt. The element operators reduce scalars modulo n, so this calls 
+    RELIC directly.
+    """
+    n = orderGt()
+    if isinstance(x, G2Element):
+        result = G2Element()
+        librelic.g2_mul_abi(byref(result), byref(x), byref(n))
+        return librelic.g2_is_infty_abi(byref(result)) == 1
+
+    result = GtElement()
+    librelic.gt_exp_abi(byref(result), byref(x), byref(n))
+    return librelic.gt_is_unity_abi(byref(result)) == 1
+
+
+def _isCyclotomic(x):
+    """
+    Determines if Fp12 element @x is in the cyclotomic subgroup, whose order
+    p^4 - p^2 + 1 is a multiple of the order of Gt: x^(p^4) * x = x^(p^2). 
+    Powers of p are cheap Frobenius maps (RELIC's fp12_frb computes at most
+    the p^3 power).
+    """
+    xp2, xp4 = GtElement(), GtElement()
+    librelic.fp12_frb(byref(xp2), byref(x), 2)
+    librelic.fp12_frb(byref(xp4), byref(xp2), 2)
+    return xp4 * x == xp2
+
+
+def _deserializeValidated(b, elementType, compressed, relicReadBinFunc, 
+        policy):
+    """
+    Deserializes bytes @b into an element of @elementType and applies the
+    validation @policy (None for the current policy).
+    """
+    policy = validationPolicy() if policy is None else policy
+    if policy == VALIDATE_OFF:
+        return _deserialize(b, elementType, compressed, relicReadBinFunc)
+
+    # RELIC reports malformed encodings only through its error state (and 
+    # returns some element regardless). Clear any earlier error first, and
+    # keep other threads from clearing or setting it in between.
+    with _errorLock:
+        librelic.err_get_code()
+        x = _deserialize(b, elementType, compressed, relicReadBinFunc)
+        malformed = librelic.err_get_code() != 0
+    if malformed:
+        raise ValueError("Malformed encoding of a {}".format(
+            elementType._elementType))
+
+    if policy == VALIDATE_ELEMENT:
+        if not isValid(x):
+            raise ValueError("Deserialized value is not a valid {}".format(
+                x._elementType))
+
+    elif policy == VALIDATE_BATCH:
+        stack = getattr(_validationContext, "stack", None)
+        if not stack or stack[-1][1] is None:
+            raise ValueError("Batch validation requires a validation() "\
+                "block")
+        stack[-1][1].add(x)
+
+    else:
+        _checkPolicy(policy)
+    return x
 
 
 def generatorG1():
@@ -338,43 +799,234 @@ def getBuffer(x):
     Copy @x into a (modifiable) ctypes byte array
     """
     b = bytes(x)
-    return (c_ubyte * len(b)).from_buffer_copy(bytes(x))
-
+    return (c_ubyte * len(b)).from_buffer_copy(b)
 
 
-def _hash(x, elementType, relicHashFunc):
+def _hash(x, elementType, domain, legacy=None, algorithm=None):
     """
-    Hash an array of bytes, @x, using @relicHashFunc and returns the result
-    of @elementType.
+    Hash a tuple of values, @x, onto the group of @elementType. @x may also
+    be a single Hasher that already holds the input.
     """
-    # Combine all inputs into a single bytearray
-    barray = bytearray()
-    map(barray.extend, bytes(x))
-
-    # Create an element of the correct type to hold the hash result
+    if legacy is None:
+        legacy = _legacyHash
+
+    # The legacy encoding hashes the string representation of the tuple.
+    if legacy:
+        msg = str(x)
+
+    # Otherwise, absorb each value into a domain-separated hasher.
+    else:
+        if len(x) == 1 and isinstance(x[0], Hasher):
+            h = x[0]
+        else:
+            h = Hasher(domain).absorb(*x)
+        msg = h.digest()
+
+    # Map the resulting bytes onto the group using the selected algorithm.
+    if algorithm is None:
+        if elementType is G1Element:
+            algorithm = _hashAlgorithmG1
+        else:
+            algorithm = _hashAlgorithmG2
+
+    if algorithm not in _hashAlgorithms:
+        raise ValueError("Unknown hash-to-curve algorithm {}; choose one "\
+            "of {}".format(algorithm, hashAlgorithms()))
+    return _hashAlgorithms[algorithm](msg, elementType)
+
+
+def _hashRelic(msg, elementType):
+    """
+    Maps the string @msg onto the group of @elementType using RELIC's 
+    try-and-increment map.
+    """
+    if elementType is G1Element:
+        relicHashFunc = librelic.g1_map_abi
+    else:
+        relicHashFunc = librelic.g2_map_abi
+
+    # Create an element of the correct type to hold the hash result, then
+    # hash using the RELIC function.
+    buf = getBuffer(msg)
     result = elementType()
-
-    # Convert barray into a modifiable ctypes buffer, hash using the provided
-    # function, and return the result.
-    buf = getBuffer(barray)
     relicHashFunc(byref(result), byref(buf), sizeof(buf))
     return result
 
 
-def hashG1(*args):
+def _hashSvdw(msg, elementType, count=2):
+    """
+    Maps the string @msg onto the group of @elementType by summing the
+    Shallue-van de Woestijne map of @count field elements hashed from @msg.
+    """
+    mapper, dst = _svdwMap(elementType)
+    dst += "_RO_V1" if count == 2 else "_NU_V1"
+
+    result = None
+    for u in svdw.hashToField(msg, dst, count, mapper.field):
+        P = _fromAffine(elementType, *mapper.map(u))
+        result = P if result is None else result + P
+
+    # Move points on the twist into G2. The Frobenius map used by RELIC 
+    # requires a normalized point.
+    if elementType is G2Element:
+        result.normalize()
+        P = G2Element()
+        librelic.ep2_mul_cof_bn(byref(P), byref(result))
+        result = P
+    return result
+
+
+def _fromAffine(elementType, x, y):
+    """
+    Creates an element of @elementType from affine coordinates @x,@y 
+    (elements of Fp or Fp2 represented as in the svdw module).
+    """
+    if elementType is G1Element:
+        coords = [x, y]
+        deserialize = deserializeG1
+    else:
+        coords = list(x) + list(y)
+        deserialize = deserializeG2
+
+    # Points on the twist are not yet in G2.
+    b = "\4" + "".join(serializeZ(c, FP_BYTES) for c in coords)
+    return deserialize(b, False, VALIDATE_OFF)
+
+
+def _toAffine(P):
+    """
+    Retrieves the affine coordinates of a G1 or G2 element @P as elements of
+    Fp or Fp2 represented as in the svdw module.
+    """
+    if isinstance(P, G1Element):
+        b = serializeG1(P, False)
+    else:
+        b = serializeG2(P, False)
+
+    coords = [longFromString(bytes(b[i:i+FP_BYTES])) 
+        for i in range(1, len(b), FP_BYTES)]
+
+    if isinstance(P, G1Element):
+        return coords[0], coords[1]
+    return tuple(coords[:2]), tuple(coords[2:])
+
+
+def _svdwMap(elementType):
     """
-    Hash an array of bytes, @x, onto the group G1. 
+    Retrieves the (cached) SvdW map and the DST prefix for the group of
+    @elementType.
+    """
+    if elementType in _svdwMap.cached:
+        return _svdwMap.cached[elementType]
+
+    p = _fieldPrime()
+    if elementType is G1Element:
+        F = svdw.PrimeField(p, _relicPowmod, _relicInvmod)
+        generator, name = generatorG1(), "G1"
+    else:
+        F = svdw.QuadraticField(p, _relicPowmod, _relicInvmod)
+        generator, name = generatorG2(), "G2"
+
+    # BN curves (and their twists) have the form y^2 = x^3 + B. Recover B 
+    # from two points and make sure they agree.
+    B = []
+    for P in [generator, generator + generator]:
+        x,y = _toAffine(P)
+        B.append(F.sub(F.sqr(y), F.mul(F.sqr(x), x)))
+
+    if B[0] != B[1]:
+        raise Exception("The SvdW map requires a curve y^2 = x^3 + B")
+
+    mapper = svdw.SvdwMap(F, F.zero, B[0])
+    _svdwMap.cached[elementType] = (mapper, "PYRELIC_HASH_" + name + "_SVDW")
+    return _svdwMap.cached[elementType]
+
+_svdwMap.cached = {}
+
+
+def _fieldPrime():
+    """
+    Retrieves the prime p of the base field Fp as a Python long.
+    """
+    if not _fieldPrime.cached:
+        digits = (c_ulonglong*ecPoint.COORD_LEN).from_address(
+            librelic.fp_prime_get())
+        _fieldPrime.cached = sum(long(digits[i]) << (64*i) 
+            for i in range(ecPoint.COORD_LEN))
+    return _fieldPrime.cached
+
+_fieldPrime.cached = None
+
+
+def _relicPowmod(a, e, p):
+    """
+    Computes @a^@e mod @p using RELIC. @p must be the prime of Fp.
+    """
+    # RELIC keeps field elements in Montgomery form: convert in and out 
+    # through the canonical byte representation.
+    t = (c_ulonglong*ecPoint.COORD_LEN)()
+    buf = getBuffer(serializeZ(a, FP_BYTES))
+    librelic.fp_read_bin(byref(t), byref(buf), FP_BYTES)
+
+    # Cache BigInt exponents; there are only a few distinct ones.
+    exp = _relicPowmod.exponents.get(e)
+    if exp is None:
+        exp = _relicPowmod.exponents.setdefault(e, BigInt(e))
+
+    librelic.fp_exp_slide(byref(t), byref(t), byref(exp))
+    librelic.fp_write_bin(byref(buf), FP_BYTES, byref(t))
+    return longFromString(bytes(bytearray(buf)))
+
+_relicPowmod.exponents = {}
+
+
+def _relicInvmod(a, p):
+    """
+    Computes 1/@a mod @p using RELIC. @p must be the prime of Fp.
+    """
+    t = (c_ulonglong*ecPoint.COORD_LEN)()
+    buf = getBuffer(serializeZ(a, FP_BYTES))
+    librelic.fp_read_bin(byref(t), byref(buf), FP_BYTES)
+    librelic.fp_inv_lower(byref(t), byref(t))
+    librelic.fp_write_bin(byref(buf), FP_BYTES, byref(t))
+    return longFromString(bytes(bytearray(buf)))
+
+
+def hashG1(*args, **kwargs):
+    """
+    Hash @args onto the group G1. Arguments may be strings, integer types,
+    group elements, file objects, or iterators over strings; or a single 
+    Hasher that has already absorbed the input.
+    @domain: optional domain-separation string
+    @legacy: optionally overrides the setting from setLegacyHash()
+    @algorithm: optionally overrides the setting from setHashAlgorithm()
     @returns a G1Element.
     """
-    return _hash(args, G1Element, librelic.g1_map_abi)
+    return _hash(args, G1Element, kwargs.get("domain", HASH_G1_DOMAIN), 
+        kwargs.get("legacy"), kwargs.get("algorithm"))
 
 
-def hashG2(*x):
+def hashG2(*args, **kwargs):
     """
-    Hash an array of bytes, @x, onto the group G2.
+    Hash @args onto the group G2. Accepts the same arguments as hashG1.
     @returns a G2Element.
     """ 
-    return _hash(x, G2Element, librelic.g2_map_abi)
+    return _hash(args, G2Element, kwargs.get("domain", HASH_G2_DOMAIN), 
+        kwargs.get("legacy"), kwargs.get("algorithm"))
+
+
+def hashAlgorithms():
+    """
+    Retrieves the names of the available hash-to-curve algorithms.
+    """
+    return sorted(_hashAlgorithms.keys())
+
+
+def isLegacyHash():
+    """
+    Determines if hashG1 and hashG2 use the legacy input encoding.
+    """
+    return _legacyHash
 
 
 def orderG1():
@@ -422,7 +1074,8 @@ def _random(elementType, relicRandomFunc):
     Retrieves a random element of @elementType by calling @relicRandomFunc.
     """
     result = elementType()
-    relicRandomFunc(byref(result))
+    with randLock:
+        relicRandomFunc(byref(result))
     return result
 
 
@@ -447,6 +1100,15 @@ def randomGt():
     return _random(GtElement, librelic.gt_rand)
 
 
+def registerHashAlgorithm(name, func):
+    """
+    Adds a hash-to-curve algorithm that can be selected by @name. 
+    @func(msg, elementType) must map the string @msg onto the group of 
+    @elementType (G1Element or G2Element) and return the element.
+    """
+    _hashAlgorithms[name] = func
+
+
 def serializeG1(x, compress=True):
     """
     Converts G1 element @x into an array of bytes. If @compress is True, 
@@ -476,3 +1138,38 @@ def serializeGt(x, compress=True):
     return _serialize(x, compress, librelic.gt_size_bin_abi,
         librelic.gt_write_bin_abi)
 
+
+def setHashAlgorithm(g1=None, g2=None):
+    """
+    Selects the hash-to-curve algorithms used by hashG1 (@g1) and hashG2 
+    (@g2). Each algorithm produces different hashes, so values derived from
+    them (e.g. stored PRF outputs) depend on this setting.
+    """
+    global _hashAlgorithmG1, _hashAlgorithmG2
+    for name in [g1, g2]:
+        if name is not None and name not in _hashAlgorithms:
+            raise ValueError("Unknown hash-to-curve algorithm {}; choose "\
+                "one of {}".format(name, hashAlgorithms()))
+
+    if g1 is not None:
+        _hashAlgorithmG1 = g1
+    if g2 is not None:
+        _hashAlgorithmG2 = g2
+
+
+def setLegacyHash(enabled=True):
+    """
+    Switches hashG1 and hashG2 to (or back from) the pyrelic 1.0 input 
+    encoding. Hashes computed under the two encodings differ, so values 
+    derived from them (e.g. stored PRF outputs) depend on this setting.
+    """
+    global _legacyHash
+    _legacyHash = bool(enabled)
+
+
+# Available hash-to-curve algorithms by name.
+_hashAlgorithms = {
+    HASH_RELIC: _hashRelic,
+    HASH_SVDW: _hashSvdw,
+    HASH_SVDW_NU: lambda msg, elementType: _hashSvdw(msg, elementType, 1),
+}
@@ -0,0 +1,207 @@
+"""
+Pools of values that are expensive to compute but don't depend on a request
+(e.g. proof nonces and blinding factors). A background thread or process
+keeps each pool full so that requests only pay for taking an item.
+"""
+from pbc import *
+from relic import initThread, registerAfterFork, reseed
+from Queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+import os, weakref
+
+# Where pools compute their items.
+THREAD = "thread"
+PROCESS = "process"
+
+
+class Pool(object):
+    """
+    A bounded pool of items produced by @produce() and refilled in the
+    background. Every item is handed out at most once. When the pool is
+    empty, take() computes an item inline instead of waiting.
+    """
+    def __init__(self, produce, size=64, mode=THREAD, encode=None,
+            decode=None):
+        """
+        Creates a pool holding up to @size items. In PROCESS mode, items
+        are produced in a child process and passed through a pipe: @encode
+        and @decode convert them to and from picklable values.
+        """
+        if size < 1:
+            raise ValueError("size must be positive")
+        if mode not in (THREAD, PROCESS):
+            raise ValueError("Unknown pool mode: {}".format(mode))
+
+        self.size = size
+        self.mode = mode
+        self._produce = produce
+        identity = lambda item: item
+        self._encode = encode if mode == PROCESS and encode else identity
+        self._decode = decode if mode == PROCESS and decode else identity
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._start()
+        _pools.add(self)
+
+
+    def restart(self):
+        """
+        Discards the items in the pool and starts a new refill worker. Used
+        in forked children (see relic.after_fork): a child must not hand out
+        the same items as its parent, and the parent's worker doesn't run in
+        the child.
+        """
+        self._lock = Lock()
+        self._start()
+
+
+    def stats(self):
+        """
+        @returns a dict with keys: hits (items taken from the pool), misses
+            (items computed inline), size
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=self.size)
+
+
+    def stop(self):
+        """
+        Stops refilling the pool. Items already in the pool are discarded.
+        """
+        _pools.discard(self)
+        self._stop.set()
+        if self.mode == PROCESS:
+            self._worker.terminate()
+        self._worker.join()
+
+
+    def take(self):
+        """
+        Removes an item from the pool, or computes one if the pool is empty.
+        """
+        try:
+            item = self._decode(self._queue.get_nowait())
+        except Empty:
+            with self._lock:
+                self.misses += 1
+            return self._produce()
+
+        with self._lock:
+            self.hits += 1
+        return item
+
+
+    def _start(self):
+        if self.mode == THREAD:
+            self._queue = Queue(self.size)
+            self._stop = Event()
+            self._worker = Thread(target=self._refill)
+        else:
+            # Imported here: multiprocessing is slow to import and only
+            # needed by process pools.
+            import multiprocessing
+            self._queue = multiprocessing.Queue(self.size)
+            self._stop = multiprocessing.Event()
+            self._worker = multiprocessing.Process(target=self._refill)
+        self._worker.daemon = True
+        self._worker.start()
+
+
+    def _refill(self):
+        """
+        Keeps the pool full until it is stopped.
+        """
+        # A forked child shares the parent's generator state.
+        if self.mode == PROCESS:
+            reseed()
+        else:
+            initThread()
+
+        while not self._stop.is_set():
+            item = self._encode(self._produce())
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except Full:
+                    pass
+
+
+# Running pools, restarted by relic.after_fork.
+_pools = weakref.WeakSet()
+
+
+def _restartPools():
+    for pool in list(_pools):
+        pool.restart()
+
+registerAfterFork(_restartPools)
+
+
+def randomScalar(order):
+    """
+    Selects a random BigInt modulo @order from the operating system's
+    generator. Unlike randomZ(), this is safe to call from a background
+    thread or forked process while RELIC's generator is in use.
+    """
+    # 128 extra bits make the bias from the reduction negligible.
+    n = long(order)
+    size = (n.bit_length() + 128 + 7)//8
+    return BigInt(longFromString(os.urandom(size)) % n)
+
+
+class NoncePool(Pool):
+    """
+    Precomputed proof nonces: pairs (v, g*v) for a random scalar v and the
+    generator g of @group (G1Element or GtElement).
+    """
+    def __init__(self, group=G1Element, size=64, mode=THREAD):
+        generator, serialize, deserialize = {
+            G1Element: (generatorG1, serializeG1, deserializeG1),
+            GtElement: (generatorGt, serializeGt, deserializeGt)}[group]
+        order = orderGt()
+
+        def produce():
+            v = randomScalar(order)
+            if group is G1Element:
+                t1 = generator()*v
+                t1.normalize()
+            else:
+                t1 = generator()**v
+            return v, t1
+
+        # Uncompressed points avoid a square root when deserializing.
+        def encode(item):
+            v, t1 = item
+            return serializeZ(v), str(serialize(t1, False))
+
+        def decode(item):
+            v, t1 = item
+            return deserializeZ(v), deserialize(t1, False, VALIDATE_OFF)
+
+        Pool.__init__(self, produce, size, mode, encode, decode)
+
+
+class BlindingPool(Pool):
+    """
+    Precomputed blinding factors: pairs (r, 1/r) modulo the order of Gt for
+    a random scalar r.
+    """
+    def __init__(self, size=64, mode=THREAD):
+        order = orderGt()
+
+        def produce():
+            rInv = None
+            while not rInv:
+                r = randomScalar(order)
+                rInv = inverse(r, order)
+            return r, rInv % order
+
+        def encode(item):
+            return tuple(serializeZ(x) for x in item)
+
+        def decode(item):
+            return tuple(deserializeZ(x) for x in item)
+
+        Pool.__init__(self, produce, size, mode, encode, decode)
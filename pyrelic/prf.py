@@ -3,8 +3,18 @@ Common routines for Pythia pseudorandom function (PRF) protocols based on
 pairing based curves (BN-254).
 """
 from pbc import *
+from cache import LruCache
+from keytable import KeyTable
+from pool import NoncePool, THREAD
+from ctypes import memset, sizeof
 import base64
 
+# Optional cache of per-ensemble key material (see enableKeyCache).
+_keyCache = None
+
+# Optional pools of precomputed proof nonces by group (see enableNoncePool).
+_noncePools = {}
+
 def genKw(w,msk,z):
     """
     Generates key Kw using key-selector @w, master secret key @msk, and
@@ -19,6 +29,212 @@ def genKw(w,msk,z):
     return BigInt(longFromString(b) % long(orderGt()))
 
 
+class KeyMaterial(object):
+    """
+    The secret key kw for one ensemble along with values derived from it that
+    are reused across requests. Pubkeys are computed on first use.
+    """
+    def __init__(self, w, msk, s):
+        self._kw = genKw(w, msk, s)
+        self._kw._pubkeys = {}
+        self.kwLong = long(self._kw)
+        self._serialized = {}
+
+
+    @property
+    def kw(self):
+        """
+        A copy of the key owned by the caller, so zeroize() does not modify
+        keys that are still in use. Pubkeys memoized on the copy are shared
+        with this KeyMaterial.
+        """
+        kw = BigInt.from_buffer_copy(self._kw)
+        kw._pubkeys = self._kw._pubkeys
+        return kw
+
+
+    def pubkeyG1(self):
+        return pubkeyG1(self._kw)
+
+    def pubkeyG2(self):
+        return pubkeyG2(self._kw)
+
+    def pubkeyGt(self):
+        return pubkeyGt(self._kw)
+
+
+    def serializedPubkey(self, group, compress=True):
+        """
+        Retrieves the serialized pubkey in @group (one of G1Element,
+        G2Element, GtElement).
+        """
+        key = (group, compress)
+        if key not in self._serialized:
+            pubkey, serialize = {
+                G1Element: (pubkeyG1, serializeG1),
+                G2Element: (pubkeyG2, serializeG2),
+                GtElement: (pubkeyGt, serializeGt)}[group]
+            self._serialized[key] = str(serialize(pubkey(self._kw), compress))
+        return self._serialized[key]
+
+
+    def zeroize(self):
+        """
+        Overwrites this KeyMaterial's copy of the key with zeros. Copies
+        handed out by .kw and the pubkeys (which are public) are not touched.
+        """
+        memset(byref(self._kw), 0, sizeof(self._kw))
+        self.kwLong = 0
+        self._serialized.clear()
+
+
+def getKw(w, msk, s):
+    """
+    Generates key Kw (see genKw), retrieving it from the key cache if it is
+    enabled.
+    @returns Kw as a BigInt owned by the caller.
+    """
+    return getKeyMaterial(w, msk, s).kw
+
+
+def getKeyMaterial(w, msk, s):
+    """
+    Retrieves the KeyMaterial for ensemble (@w, @s) under @msk, from the key
+    cache if it is enabled. @s may be a KeyTable, in which case the state
+    value for @w is looked up in the table.
+    """
+    if isinstance(s, KeyTable):
+        s = s.state(w)
+
+    cache = _keyCache
+    if cache is None:
+        return KeyMaterial(w, msk, s)
+    return cache.getOrCompute((w, msk, s), lambda: KeyMaterial(w, msk, s))
+
+
+def enableKeyCache(maxsize=1024, ttl=None, zeroize=False, shards=8):
+    """
+    Caches the key material for up to @maxsize ensembles for at most @ttl
+    seconds, so eval and prove skip key derivation and pubkey computation.
+    With @zeroize, the cache's copy of each key is overwritten when it leaves
+    the cache (keys already returned by getKw are copies and stay valid).
+    Replaces any existing cache.
+    @returns the cache.LruCache (for metrics and invalidation)
+    """
+    global _keyCache
+    onEvict = (lambda key, material: material.zeroize()) if zeroize else None
+    _keyCache = LruCache(maxsize, shards, ttl, onEvict)
+    return _keyCache
+
+
+def disableKeyCache():
+    """
+    Stops caching key material and discards the cache.
+    """
+    global _keyCache
+    if _keyCache is not None:
+        _keyCache.clear()
+    _keyCache = None
+
+
+def invalidateKey(w, msk, s):
+    """
+    Removes the cached key material for ensemble (@w, @s).
+    @returns True if it was cached.
+    """
+    cache = _keyCache
+    return cache is not None and cache.invalidate((w, msk, s))
+
+
+def keyCache():
+    """
+    Retrieves the key cache, or None if caching is disabled.
+    """
+    return _keyCache
+
+
+def pubkeyG1(kw):
+    """
+    Computes the pubkey Q*@kw where <Q> = G1. The result is memoized on @kw,
+    so callers must not modify it.
+    """
+    return _pubkey(kw, "G1", lambda: generatorG1()*kw)
+
+
+def pubkeyG2(kw):
+    """
+    Computes the pubkey Q*@kw where <Q> = G2 (see pubkeyG1).
+    """
+    return _pubkey(kw, "G2", lambda: generatorG2()*kw)
+
+
+def pubkeyGt(kw):
+    """
+    Computes the pubkey g**@kw where <g> = Gt (see pubkeyG1).
+    """
+    return _pubkey(kw, "Gt", lambda: generatorGt()**kw)
+
+
+def _pubkey(kw, name, compute):
+    """
+    Retrieves the pubkey memoized on @kw under @name, or calls @compute().
+    Keys that are Python integers are not memoized.
+    """
+    memo = getattr(kw, "_pubkeys", None)
+    if memo is None and isinstance(kw, BigInt):
+        memo = kw._pubkeys = {}
+
+    p = memo.get(name) if memo is not None else None
+    if p is None:
+        p = compute()
+        p.normalize()
+        if memo is not None:
+            memo[name] = p
+    return p
+
+
+def nonce(group=G1Element):
+    """
+    Selects a random proof nonce v and computes g*v (or g**v) for the
+    generator g of @group (G1Element or GtElement). Takes a precomputed pair
+    from the nonce pool if one is enabled.
+    @returns (v, g*v) with g*v normalized
+    """
+    pool = _noncePools.get(group)
+    if pool is not None:
+        return pool.take()
+
+    v = randomZ(orderGt())
+    if group is GtElement:
+        return v, generatorGt()**v
+
+    t = generatorG1()*v
+    t.normalize()
+    return v, t
+
+
+def enableNoncePool(group=G1Element, size=64, mode=THREAD):
+    """
+    Starts a pool of @size precomputed nonces for @group, refilled by a
+    background thread or process (@mode is pool.THREAD or pool.PROCESS).
+    Replaces any existing pool for @group.
+    @returns the pool.NoncePool (for metrics)
+    """
+    disableNoncePool(group)
+    _noncePools[group] = NoncePool(group, size, mode)
+    return _noncePools[group]
+
+
+def disableNoncePool(group=None):
+    """
+    Stops the nonce pool for @group, or all nonce pools if @group is None.
+    """
+    for g in ([group] if group else _noncePools.keys()):
+        pool = _noncePools.pop(g, None)
+        if pool is not None:
+            pool.stop()
+
+
 def getDelta(original, update):
     """
     Generates an update token delta_{k->k'}.
@@ -27,12 +243,12 @@ def getDelta(original, update):
     @return (delta, p'): @delta = k'/k, @p' is a new pubkey based on k'.
     """
     # Compute both keys
-    k = genKw(*original)
-    kPrime = genKw(*update)
+    k = getKw(*original)
+    kPrime = getKw(*update)
 
     # Compute delta,p'
     delta = (kPrime * inverse(k, orderGt())) % orderGt()
-    pPrime = generatorGt()**kPrime
+    pPrime = pubkeyGt(kPrime)
     return delta,pPrime
 
 
@@ -73,9 +289,9 @@ def wrap(x):
 
 # Individual unwrap functions
 unwrapStr = lambda x: x
-unwrapG1 = lambda x: _unwrap(x, deserializeG1)
-unwrapG2 = lambda x: _unwrap(x, deserializeG2)
-unwrapGt = lambda x: _unwrap(x, deserializeGt)
+unwrapG1 = lambda x, validate=None: _unwrap(x, deserializeG1, validate=validate)
+unwrapG2 = lambda x, validate=None: _unwrap(x, deserializeG2, validate=validate)
+unwrapGt = lambda x, validate=None: _unwrap(x, deserializeGt, validate=validate)
 unwrapLong = lambda x: long(x, 16)
 unwrapDelta = unwrapLong
 
@@ -87,9 +303,11 @@ def _wrap(x, serializeFunc, encodeFunc=base64.urlsafe_b64encode, compress=True):
     return encodeFunc(serializeFunc(x, compress))
 
 
-def _unwrap(x, deserializeFunc, decodeFunc=base64.urlsafe_b64decode, compress=True):
+def _unwrap(x, deserializeFunc, decodeFunc=base64.urlsafe_b64decode, compress=True,
+        validate=None):
     """
-    Unwraps an element @x by decoding and then deserializing
+    Unwraps an element @x by decoding and then deserializing, applying the
+    validation policy @validate (see pbc.validation).
     """
-    return deserializeFunc(decodeFunc(str(x)), compress)
+    return deserializeFunc(decodeFunc(str(x)), compress, validate)
 
@@ -0,0 +1,159 @@
+"""
+Variable-time group operations for public data. Proof verification only
+touches public values (the proof, the server's response, the tweak, and
+pubkeys), so it can use algorithms whose running time depends on the
+scalars: simultaneous (Shamir) multiplication in G1 and sliding-window
+multi-exponentiation in Gt.
+
+NEVER pass secret values (keys, nonces, blinding factors) to these
+functions. Secret-dependent code keeps using the element operators.
+"""
+from pbc import *
+from relic import librelic
+
+# Window size for the sliding-window multi-exponentiation in Gt.
+GT_WINDOW = 4
+
+# When disabled, the functions below use the element operators.
+_fastPath = True
+
+
+def isFastPath():
+    """
+    Determines if public-data operations use the variable-time algorithms.
+    """
+    return _fastPath
+
+
+def setFastPath(enabled=True):
+    """
+    Enables or disables the variable-time algorithms for public data (e.g.
+    to compare their performance).
+    """
+    global _fastPath
+    _fastPath = bool(enabled)
+
+
+def mulSimG1(P, a, Q, b):
+    """
+    Computes P*@a + Q*@b for public @P,@Q \in G1 and public scalars @a,@b.
+    @returns a G1Element
+    """
+    assertType(P, G1Element)
+    assertType(Q, G1Element)
+    if not _fastPath:
+        return P*a + Q*b
+
+    # RELIC's simultaneous multiplication doesn't handle zero scalars.
+    n = long(orderG1())
+    a, b = _toLong(a) % n, _toLong(b) % n
+    if not a or not b:
+        return Q*b if a == 0 else P*a
+
+    a, b = BigInt(a), BigInt(b)
+    result = G1Element()
+    if P is generatorG1():
+        librelic.ep_mul_sim_gen(byref(result), byref(a), byref(Q), byref(b))
+    else:
+        librelic.ep_mul_sim_inter(byref(result), byref(P), byref(a),
+            byref(Q), byref(b))
+    return result
+
+
+def expSimGt(x, a, y, b):
+    """
+    Computes @x**@a * @y**@b for public @x,@y \in Gt and public scalars
+    @a,@b using an interleaved sliding-window exponentiation: the squarings
+    are shared between the two exponents.
+    @returns a GtElement
+    """
+    assertType(x, GtElement)
+    assertType(y, GtElement)
+    if not _fastPath:
+        return x**a * y**b
+    return _multiExpGt([x, y], [a, b])
+
+
+def _multiExpGt(bases, exps, w=GT_WINDOW):
+    """
+    Computes the product of @bases[i]**@exps[i].
+    """
+    n = long(orderGt())
+    exps = [_toLong(e) % n for e in exps]
+    sqr, mul = librelic.gt_sqr_abi, librelic.gt_mul_abi
+
+    # Digits of each exponent by bit position, and tables of odd powers
+    # x, x^3, ..., x^(2^w - 1) for each base.
+    digits = [_slidingWindow(e, w) for e in exps]
+    tables = [_oddPowers(x, w) for x in bases]
+
+    # Two buffers: each operation reads one and writes the other.
+    buffers = [GtElement(), GtElement()]
+    refs = [byref(buffers[0]), byref(buffers[1])]
+    current = 0
+    started = False
+
+    for i in xrange(max(e.bit_length() for e in exps) - 1, -1, -1):
+        if started:
+            sqr(refs[1-current], refs[current])
+            current = 1 - current
+
+        for d, table in zip(digits, tables):
+            digit = d.get(i)
+            if digit is None:
+                continue
+
+            if started:
+                mul(refs[1-current], refs[current], byref(table[digit >> 1]))
+                current = 1 - current
+            else:
+                librelic.gt_copy_abi(refs[current], byref(table[digit >> 1]))
+                started = True
+
+    if not started:
+        librelic.gt_set_unity_abi(refs[current])
+    return buffers[current]
+
+
+def _oddPowers(x, w):
+    """
+    Computes [x, x^3, x^5, ..., x^(2^w - 1)].
+    """
+    x2 = GtElement()
+    librelic.gt_sqr_abi(byref(x2), byref(x))
+    table = [x]
+    for _ in range(2**(w-1) - 1):
+        table.append(table[-1]*x2)
+    return table
+
+
+def _slidingWindow(e, w):
+    """
+    Recodes @e into odd digits of at most @w bits.
+    @returns a dict mapping bit positions to digits such that
+        e = sum(digit * 2^position)
+    """
+    digits = {}
+    i = e.bit_length() - 1
+    while i >= 0:
+        if not (e >> i) & 1:
+            i -= 1
+            continue
+
+        # The window ends at the lowest set bit within w bits of i.
+        j = max(i - w + 1, 0)
+        while not (e >> j) & 1:
+            j += 1
+        digits[j] = (e >> j) & ((1 << (i - j + 1)) - 1)
+        i = j - 1
+    return digits
+
+
+def _toLong(x):
+    """
+    Converts a BigInt (including its sign) or Python integer to a long.
+    """
+    if isinstance(x, BigInt):
+        value = long(x)
+        return -value if x.sign == BigInt.NEGATIVE_FLAG.value else value
+    return long(x)
@@ -1,7 +1,7 @@
 """
 Python interface to the RELIC cryptographic library.
 """
-import atexit, ctypes, sys
+import atexit, ctypes, os, sys, threading
 from common import *
 from os import path
 
@@ -39,17 +39,171 @@ name = "librelic." + ext
 moduleDirectory = path.dirname(__file__)
 libPath = path.join(moduleDirectory,  "lib", name)
 
-# Load the relic library
-librelic = ctypes.cdll.LoadLibrary(libPath)
 
-# Initialize the RELIC core (memory allocation, error handling, and  
-# other internal state)
-if librelic.core_init() != 0:
-    raise Exception("Could not initialize RELIC core")
+# The foreign function interface used to call RELIC, selected at import by
+# the PYRELIC_BACKEND environment variable:
+#  ctypes:  the default.
+#  cffi:    declares the prototypes of RELIC's functions (see abi.py), so 
+#           calls skip ctypes' conversion of each argument. Requires the 
+#           cffi package.
+BACKEND = os.environ.get("PYRELIC_BACKEND", "ctypes")
+if BACKEND not in ("ctypes", "cffi"):
+    raise ValueError("Unknown PYRELIC_BACKEND {}; choose ctypes or cffi".
+        format(BACKEND))
 
-# Set the pairing based curve (PC) parameters.
-if librelic.pc_param_set_any_abi() != 0:
-    raise Exception("Could not set PBC parameters")
+# Pointer arguments are passed as byref(x) and null pointers as NULL. With
+# cffi, pointers are declared as integers and passed as addresses.
+if BACKEND == "cffi":
+    byref, NULL = ctypes.addressof, 0
+else:
+    byref, NULL = ctypes.byref, None
+
+
+class _Library(object):
+    """
+    Stands in for the RELIC library until it is needed: the first function
+    lookup (e.g. librelic.bn_add) calls init(). Functions are then stored on
+    this object, so later lookups are plain attribute reads.
+    """
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        init()
+
+        # Wrapping and storing the function can't interleave with
+        # setWrapper, or a wrapped function could be stored after the
+        # wrapper is removed.
+        with _wrapperLock:
+            func = getattr(_library, name)
+            if _wrapper:
+                func = _wrapper(name, func)
+            setattr(self, name, func)
+        return func
+
+librelic = _Library()
+
+# The loaded library (ctypes.CDLL or cffi library), or None until init() is
+# called.
+_library = None
+_initLock = threading.Lock()
+
+# Wraps each function looked up through librelic (see setWrapper), or None.
+_wrapper = None
+_wrapperLock = threading.Lock()
+
+# Functions called by after_fork (see registerAfterFork).
+_afterForkHandlers = []
+
+# Serializes use of RELIC's pseudorandom generator. Unless RELIC is built
+# with thread support (MULTI = PTHREAD or OPENMP), the generator's state is
+# part of the one context shared by all threads.
+randLock = threading.RLock()
+
+
+def initThread():
+    """
+    Prepares RELIC for use by the calling thread. When RELIC is built with
+    thread support, each thread has its own context (including the 
+    pseudorandom generator), which is created and seeded on the first call.
+    Otherwise all threads share the context created by init(): arithmetic 
+    only reads it and random numbers are drawn under randLock. Safe to call
+    more than once.
+    @returns True if a context was created.
+    """
+    if librelic.core_get():
+        return False
+
+    _initCore()
+    reseed()
+    return True
+
+
+def after_fork():
+    """
+    Re-initializes per-process state in a child process forked from one
+    that has used RELIC: reseeds RELIC's generator (the child otherwise 
+    repeats the parent's random values) and calls the registered handlers,
+    e.g. to discard pools of precomputed nonces. Call it first in each
+    child, before starting threads.
+    """
+    if _library is None:
+        return
+    reseed()
+    for handler in _afterForkHandlers:
+        handler()
+
+
+def init():
+    """
+    Loads the RELIC library and initializes it for this process, if that
+    hasn't been done already. This happens automatically on first use; a
+    pre-fork server can call init() before forking so that its children 
+    share the initialized library (and then call after_fork in each child).
+    """
+    global _library
+    if _library is not None:
+        return
+
+    with _initLock:
+        if _library is None:
+            library = _load()
+            _initCore(library)
+            _library = library
+
+
+def registerAfterFork(handler):
+    """
+    Registers @handler() to be called by after_fork.
+    """
+    _afterForkHandlers.append(handler)
+
+
+def setWrapper(wrapper):
+    """
+    Wraps every RELIC function looked up through librelic from now on:
+    @wrapper(name, func) returns the function to call in place of @func.
+    None removes the wrapper. References to functions that were stored
+    before the call are not affected.
+    """
+    global _wrapper
+    with _wrapperLock:
+        _wrapper = wrapper
+        librelic.__dict__.clear()
+
+
+def reseed(size=64):
+    """
+    Reseeds RELIC's pseudorandom generator with @size bytes from the
+    operating system. Must be called in processes forked after the library
+    was loaded: the child otherwise repeats the parent's random values.
+    """
+    seed = os.urandom(size)
+    with randLock:
+        librelic.rand_seed(seed, size)
+
+
+def _load():
+    if BACKEND == "cffi":
+        import abi, cffi
+        ffi = cffi.FFI()
+        ffi.cdef(abi.PROTOTYPES)
+        return ffi.dlopen(libPath)
+
+    library = ctypes.cdll.LoadLibrary(libPath)
+    for name in ["core_get", "fp_prime_get"]:
+        getattr(library, name).restype = ctypes.c_void_p
+    return library
+
+
+def _initCore(library=librelic):
+    # Initialize the RELIC core (memory allocation, error handling, and  
+    # other internal state)
+    if library.core_init() != 0:
+        raise Exception("Could not initialize RELIC core")
+
+    # Set the pairing based curve (PC) parameters.
+    if library.pc_param_set_any_abi() != 0:
+        raise Exception("Could not set PBC parameters")
 
 
 @atexit.register
@@ -57,5 +211,6 @@ def cleanup():
     """
     Relic library clean-up routine. Registered to be called on module exit.
     """
-    librelic.core_clean()
+    if _library is not None:
+        _library.core_clean()
 
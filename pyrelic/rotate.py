@@ -0,0 +1,180 @@
+"""
+Streaming key rotation. After an ensemble key is rotated, every stored PRF
+output z must be updated to z**delta (see prf.getDelta and prf.update).
+rotate() streams wrapped Gt values from a file or iterator, updates them in
+batches on a batch executor (a ProcessEngine by default, or any other
+BatchOperations such as rpc.RpcExecutor), and appends the results to an
+output file. At most a few batches are held in memory, and progress is
+checkpointed so an interrupted rotation resumes where it stopped.
+
+Command line:
+    python rotate.py INPUT OUTPUT DELTA [CHECKPOINT]
+where INPUT and OUTPUT hold one wrapped value per line and DELTA is a
+wrapped update token.
+"""
+from prf import unwrapDelta, unwrapGt, wrap
+from engine import ProcessEngine
+from bi import serializeZ
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
+import hashlib, itertools, json, os, sys
+
+# Values updated per batch.
+BATCH_SIZE = 4096
+
+# Progress of a rotation: records written in total, seconds spent in this
+# run, and records per second in this run.
+RotationProgress = namedtuple("RotationProgress", ["records", "seconds",
+    "rate"])
+
+
+def rotate(source, output, delta, executor=None, batchSize=BATCH_SIZE,
+        checkpoint=None, report=None, validate=None):
+    """
+    Updates each wrapped Gt value in @source with update token @delta and
+    writes the wrapped results, one per line, to the file at @output.
+    @source: a path to a file with one wrapped value per line, or an
+        iterable of wrapped values
+    @executor: a BatchOperations; a ProcessEngine on every CPU is started
+        (and stopped) if None
+    @checkpoint: the path of a checkpoint file. If it exists, the rotation
+        resumes after the last completed batch; otherwise it is created.
+        The checkpoint is updated after each batch has been synced to
+        @output. ValueError is raised if it was made with a different
+        @delta or source file, or if @output is missing.
+    @report(progress): called with a RotationProgress after each batch
+    @validate: the validation policy for input values (see pbc.validation)
+    @returns the final RotationProgress
+    """
+    if executor is None:
+        with ProcessEngine() as engine:
+            return rotate(source, output, delta, engine, batchSize,
+                checkpoint, report, validate)
+
+    # The checkpoint identifies the rotation, so that resuming with other
+    # values can't mix the outputs of two keys.
+    identity = {"delta": hashlib.sha256(serializeZ(delta)).hexdigest(),
+        "source": os.path.abspath(source) if isinstance(source, basestring)
+            else None}
+    state = _load(checkpoint)
+    if state:
+        for name, value in identity.items():
+            if state.get(name) != value:
+                raise ValueError("The checkpoint {} was made with a "\
+                    "different {}".format(checkpoint, name))
+        if not os.path.exists(output):
+            raise ValueError("The checkpoint {} resumes a rotation, but its"\
+                " output {} does not exist".format(checkpoint, output))
+        out = open(output, "r+b")
+        out.truncate(state["outputOffset"])
+        out.seek(0, os.SEEK_END)
+    else:
+        out = open(output, "wb")
+        state = dict(identity, records=0, inputOffset=0, outputOffset=0)
+        _save(checkpoint, state)
+
+    # Each batch is updated on a background thread while the next one is
+    # read and the previous one is written.
+    pool = ThreadPool(1)
+    start, written = default_timer(), state["records"]
+    def finish(pending):
+        result, count, inputOffset = pending
+        out.write("".join(wrap(z) + "\n" for z in result.get()))
+        out.flush()
+        os.fsync(out.fileno())
+
+        state.update(records=state["records"] + count,
+            inputOffset=inputOffset, outputOffset=out.tell())
+        _save(checkpoint, state)
+        if report:
+            report(_progress(state["records"], written, start))
+
+    try:
+        pending = None
+        for batch, inputOffset in _batches(source, state, batchSize):
+            zs = [unwrapGt(z, validate) for z in batch]
+            next = (pool.apply_async(executor.update, (zs, delta)),
+                len(zs), inputOffset)
+            if pending:
+                finish(pending)
+            pending = next
+        if pending:
+            finish(pending)
+    finally:
+        pool.close()
+        pool.join()
+        out.close()
+
+    return _progress(state["records"], written, start)
+
+
+def _batches(source, state, batchSize):
+    """
+    Reads batches from @source, skipping the records already processed
+    according to @state.
+    @yields (batch, input offset after the batch)
+    """
+    if not isinstance(source, basestring):
+        values = itertools.islice(source, state["records"], None)
+        while True:
+            batch = [str(z).strip() for z in itertools.islice(values,
+                batchSize)]
+            if not batch:
+                break
+            yield batch, 0
+        return
+
+    # File positions can't be read while iterating over lines, so lines are
+    # read with readline().
+    with open(source, "rb") as f:
+        f.seek(state["inputOffset"])
+        while True:
+            batch = []
+            while len(batch) < batchSize:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    batch.append(line.strip())
+            if not batch:
+                break
+            yield batch, f.tell()
+
+
+def _load(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def _progress(records, written, start):
+    seconds = default_timer() - start
+    return RotationProgress(records, seconds,
+        (records - written)/seconds if seconds > 0 else 0.0)
+
+
+def _save(path, state):
+    """
+    Replaces the checkpoint at @path atomically.
+    """
+    if path:
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [4, 5]:
+        sys.exit("usage: python rotate.py INPUT OUTPUT DELTA [CHECKPOINT]")
+
+    def show(progress):
+        sys.stderr.write("\r{} records, {:.0f} records/s".format(
+            progress.records, progress.rate))
+
+    rotate(sys.argv[1], sys.argv[2], unwrapDelta(sys.argv[3]),
+        checkpoint=(sys.argv[4:] or [None])[0], report=show)
+    sys.stderr.write("\n")
@@ -0,0 +1,417 @@
+"""
+Remote execution of pairing-heavy batches. An RpcWorker daemon serves the
+batch operations of engine.py (pairings, scalar multiplications, Gt
+exponentiations, updates, and vpop eval, evalAndProve and verify) over TCP.
+An RpcExecutor spreads batches across workers over pooled connections,
+pipelining the requests on each one.
+
+Messages are frames: a 4 byte length followed by the body. Records use the
+fixed-width element format of engine.py, so no Python objects are pickled.
+    request:  call id, operation name, parameters, record count, records
+    response: call id, status, then the record count and records (OK), or
+              an error message (ERROR)
+"""
+from engine import BatchOperations, _operations, _readRecord, _writeRecord
+from pbc import *
+from relic import initThread
+from Queue import Empty, Queue
+from threading import Lock, Thread
+import socket, struct, SocketServer
+
+# Response status
+OK, ERROR = 0, 1
+
+# Records sent in one request.
+CHUNK_SIZE = 64
+
+# Operations that are passed the worker's key (msk, s) after the caller's
+# parameters.
+KEYED_OPERATIONS = set(["eval", "evalAndProve"])
+
+_u8 = struct.Struct(">B")
+_u32 = struct.Struct(">I")
+_call = struct.Struct(">IB")
+
+
+class RpcWorker(object):
+    """
+    Serves batch operations to RpcExecutors. Each connection is handled by
+    its own thread.
+    """
+    def __init__(self, address, msk=None, s=None):
+        """
+        Listens on TCP @address (port 0 selects a free port; see .address).
+        PRF evaluation requests use master secret key @msk and state value
+        @s, and are refused if @msk is None. Their inputs are tested for
+        group membership before the key is applied to them.
+        """
+        self.msk = msk
+        self.s = s
+        self._server = _TcpServer(address, _Handler)
+        self._server.worker = self
+        self.address = self._server.server_address
+        self._thread = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+
+    def serveForever(self):
+        self._server.serve_forever()
+
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        """
+        self._thread = Thread(target=self.serveForever)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def process(self, body):
+        """
+        Processes one request frame @body.
+        @returns the response frame body
+        """
+        callId = _u32.unpack_from(body)[0] if len(body) >= _u32.size else 0
+        try:
+            _, operation, params, records = _decodeRequest(body)
+            op = _operations[operation]
+            if operation in KEYED_OPERATIONS:
+                if self.msk is None:
+                    raise Exception("This worker has no key")
+                params = params + (self.msk, self.s)
+                _validateRecords(records)
+
+            buf = bytearray(len(records)*op.outputWidth)
+            for i, record in enumerate(records):
+                _writeRecord(buf, i*op.outputWidth, op.outputs,
+                    op.func(*(record + params)))
+        except Exception as e:
+            return _call.pack(callId, ERROR) + (str(e) or repr(e))
+        return _call.pack(callId, OK) + _u32.pack(len(records)) + str(buf)
+
+
+class RpcExecutor(BatchOperations):
+    """
+    Runs batch operations on remote RpcWorkers. Batches are split into
+    chunks of @chunkSize records, spread round-robin across the workers'
+    connections; the requests on each connection are sent by one thread
+    while the responses are read by another. Thread-safe.
+    """
+    def __init__(self, addresses, connections=2, chunkSize=CHUNK_SIZE):
+        """
+        Uses the workers at @addresses ((host, port) pairs) with up to
+        @connections pooled connections to each.
+        """
+        self.addresses = list(addresses)
+        self.connections = connections
+        self.chunkSize = chunkSize
+        self._pools = dict((a, Queue()) for a in self.addresses)
+        self._opened = dict((a, 0) for a in self.addresses)
+        self._lock = Lock()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        for pool in self._pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except Empty:
+                    break
+
+
+    def eval(self, w, t, xs):
+        """
+        Computes vpop.eval under the workers' key for each blinded message
+        in @xs.
+        @returns a list of results y
+        """
+        return [y for y, in self.map("eval", [(x,) for x in xs], (w, t))]
+
+
+    def evalAndProve(self, w, t, xs):
+        """
+        Computes vpop.evalAndProve under the workers' key for each blinded
+        message in @xs.
+        @returns a list of (y, pi)
+        """
+        return [(y, (p, c, u)) for y,p,c,u in self.map("evalAndProve",
+            [(x,) for x in xs], (w, t))]
+
+
+    def map(self, operation, records, params=()):
+        """
+        Applies the @operation (by name) to each tuple of inputs in @records
+        along with the shared @params (strings and non-negative integers).
+        @returns a list of output tuples
+        """
+        op = _operations[operation]
+        records = list(records)
+        chunks = [records[i:i+self.chunkSize]
+            for i in range(0, len(records), self.chunkSize)]
+        if not chunks:
+            return []
+
+        # Assign chunks round-robin to one connection per worker, plus more
+        # connections when there are enough chunks.
+        lanes = min(len(chunks), len(self.addresses)*self.connections)
+        assigned = [[] for _ in range(lanes)]
+        for i in range(len(chunks)):
+            assigned[i % lanes].append(i)
+
+        results, errors = [None]*len(chunks), []
+        def run(lane):
+            try:
+                address = self.addresses[lane % len(self.addresses)]
+                bodies = [_encodeRequest(i, operation, params, op,
+                    chunks[i]) for i in assigned[lane]]
+                for i, records in self._call(address, op, bodies):
+                    results[i] = records
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=run, args=(lane,)) for lane in range(lanes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return [record for chunk in results for record in chunk]
+
+
+    def _call(self, address, op, bodies):
+        """
+        Sends request @bodies on one connection to @address while reading
+        the responses. (Sending every request before reading would deadlock
+        once the requests and responses in flight fill the socket buffers.)
+        @returns a list of (call id, records)
+        """
+        connection = self._connect(address)
+        sendErrors = []
+        def send():
+            try:
+                for body in bodies:
+                    connection.send(body)
+            except Exception as e:
+                sendErrors.append(e)
+                connection.shutdown()
+
+        sender = Thread(target=send)
+        sender.daemon = True
+        sender.start()
+        try:
+            responses, error = [], None
+            for _ in bodies:
+                body = connection.receive()
+                callId, status = _call.unpack_from(body)
+                if status == ERROR:
+                    error = error or Exception("Remote error: {}".format(
+                        body[_call.size:]))
+                    continue
+
+                count, = _u32.unpack_from(body, _call.size)
+                start = _call.size + _u32.size
+                responses.append((callId, [_readRecord(body,
+                    start + i*op.outputWidth, op.outputs)
+                        for i in range(count)]))
+            sender.join()
+        except:
+            connection.shutdown()
+            sender.join()
+            connection.close()
+            with self._lock:
+                self._opened[address] -= 1
+            if sendErrors:
+                raise sendErrors[0]
+            raise
+
+        self._pools[address].put(connection)
+        if error:
+            raise error
+        return responses
+
+
+    def _connect(self, address):
+        """
+        Takes a pooled connection to @address, opening one if there are
+        fewer than the limit, or waiting for one otherwise.
+        """
+        try:
+            return self._pools[address].get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            open = self._opened[address] < self.connections
+            if open:
+                self._opened[address] += 1
+
+        if not open:
+            return self._pools[address].get()
+        try:
+            return _Connection(address)
+        except:
+            with self._lock:
+                self._opened[address] -= 1
+            raise
+
+
+class _Connection(object):
+    """
+    A TCP connection that sends and receives frames.
+    """
+    def __init__(self, address):
+        self._socket = socket.create_connection(address)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile("rb")
+
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+    def receive(self):
+        return _receive(self._file)
+
+
+    def send(self, body):
+        self._socket.sendall(_u32.pack(len(body)) + body)
+
+
+    def shutdown(self):
+        """
+        Stops sending and receiving, waking threads blocked on either.
+        """
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+    """
+    Answers the requests on one connection in order.
+    """
+    def handle(self):
+        initThread()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                body = _receive(self.rfile)
+            except EOFError:
+                break
+
+            response = self.server.worker.process(body)
+            self.wfile.write(_u32.pack(len(response)) + response)
+            self.wfile.flush()
+
+
+class _TcpServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _decodeRequest(body):
+    """
+    @returns (call id, operation name, params tuple, list of records)
+    """
+    callId, size = _call.unpack_from(body)
+    offset = _call.size
+    operation = body[offset:offset+size]
+    offset += size
+
+    params = []
+    count, = _u8.unpack_from(body, offset)
+    offset += _u8.size
+    for _ in range(count):
+        tag = body[offset]
+        size, = _u32.unpack_from(body, offset + 1)
+        value = body[offset+1+_u32.size:offset+1+_u32.size+size]
+        offset += 1 + _u32.size + size
+        params.append(deserializeZ(value) if tag == "z" else value)
+
+    op = _operations.get(operation)
+    count, = _u32.unpack_from(body, offset)
+    offset += _u32.size
+    if op is not None and len(body) != offset + count*op.inputWidth:
+        raise ValueError("Malformed request")
+    records = [] if op is None else [_readRecord(body,
+        offset + i*op.inputWidth, op.inputs) for i in range(count)]
+    return callId, operation, tuple(params), records
+
+
+def _validateRecords(records):
+    """
+    Raises ValueError unless every element in @records is a member of its
+    group. Records are decoded without validation, and a point that is not
+    in its group could reveal information about the key applied to it.
+    """
+    batch = BatchValidator()
+    for record in records:
+        for value in record:
+            if isinstance(value, (G1Element, G2Element, GtElement)):
+                batch.add(value)
+    batch.check()
+
+
+def _encodeRequest(callId, operation, params, op, records):
+    parts = [_call.pack(callId, len(operation)), operation,
+        _u8.pack(len(params))]
+    for param in params:
+        if isinstance(param, (int, long, BigInt)):
+            if param < 0:
+                raise ValueError("Integer parameters must be non-negative")
+            tag, value = "z", serializeZ(param)
+        else:
+            tag, value = "s", str(param)
+        parts += [tag, _u32.pack(len(value)), value]
+
+    buf = bytearray(len(records)*op.inputWidth)
+    for i, record in enumerate(records):
+        _writeRecord(buf, i*op.inputWidth, op.inputs, record)
+    parts += [_u32.pack(len(records)), str(buf)]
+    return "".join(parts)
+
+
+def _receive(f):
+    """
+    Reads one frame body from file @f. Raises EOFError at the end of the
+    stream.
+    """
+    header = f.read(_u32.size)
+    if len(header) < _u32.size:
+        raise EOFError()
+    size, = _u32.unpack(header)
+    body = f.read(size)
+    if len(body) < size:
+        raise EOFError()
+    return body
@@ -0,0 +1,79 @@
+"""
+Cache-aware ordering of pending PRF requests. Requests for the same ensemble
+w share key material (kw, pubkeys) and requests for the same tweak t share
+the hashed tweak, but only while those values are still in the key and
+tweak caches (see prf.enableKeyCache and vpop.enableTweakCache). Running
+such requests consecutively keeps the caches hot.
+"""
+from collections import OrderedDict
+from timeit import default_timer
+
+
+class Scheduler(object):
+    """
+    Reorders batches of pending requests into groups that share a tenant
+    (ensemble w) and a tweak t, within a latency budget and with a fairness
+    limit per tenant.
+    """
+    def __init__(self, key, budget=0.01, quota=16):
+        """
+        @key(request) returns (tenant, tweak) for a request.
+        @budget: requests that have waited more than @budget seconds run
+            first, in arrival order.
+        @quota: at most @quota requests of one tenant run before every other
+            waiting tenant gets a turn, so a hot tenant cannot starve the
+            others.
+        """
+        if quota < 1:
+            raise ValueError("quota must be positive")
+        self.key = key
+        self.budget = budget
+        self.quota = quota
+
+
+    def order(self, requests, arrivals, now=None):
+        """
+        Orders @requests, which arrived at times @arrivals (default_timer
+        values).
+        @returns a list of groups (tenant, tweak, [indices into @requests])
+        """
+        now = default_timer() if now is None else now
+        keys = [self.key(r) for r in requests]
+        byArrival = sorted(range(len(requests)), key=lambda i: arrivals[i])
+
+        # Group requests by tenant, then tweak, in order of each one's oldest
+        # request.
+        tenants = OrderedDict()
+        for i in byArrival:
+            tenant, tweak = keys[i]
+            tenants.setdefault(tenant, OrderedDict()).setdefault(tweak,
+                []).append(i)
+
+        groups = []
+
+        # Overdue requests first, along with the rest of their groups.
+        for i in byArrival:
+            if now - arrivals[i] <= self.budget:
+                break
+            tenant, tweak = keys[i]
+            if tweak in tenants.get(tenant, {}):
+                groups.append((tenant, tweak, tenants[tenant].pop(tweak)))
+                if not tenants[tenant]:
+                    del tenants[tenant]
+
+        # Then round-robin across tenants, @quota requests at a time.
+        while tenants:
+            for tenant in list(tenants):
+                tweaks, remaining = tenants[tenant], self.quota
+                while tweaks and remaining:
+                    tweak, indices = next(tweaks.iteritems())
+                    groups.append((tenant, tweak, indices[:remaining]))
+                    if len(indices) > remaining:
+                        tweaks[tweak] = indices[remaining:]
+                        remaining = 0
+                    else:
+                        del tweaks[tweak]
+                        remaining -= len(indices)
+                if not tweaks:
+                    del tenants[tenant]
+        return groups
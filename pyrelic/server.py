@@ -0,0 +1,389 @@
+"""
+A reference Pythia PRF server and client for a local TCP or UNIX socket.
+Requests and responses are JSON objects, one per line, with elements in the
+wrap/unwrap encoding:
+    request:  {"id": 1, "prf": "vpop", "w": "...", "t": "...", "x": "..."}
+    response: {"id": 1, "y": "...", "pi": ["...", "...", "..."]}
+              {"id": 1, "error": "..."}
+A request {"id": 1, "op": "stats"} is answered at once with the server's
+batching metrics: {"id": 1, "stats": {...}}.
+Concurrent requests, from one connection or many, are collected into
+micro-batches that run on a pool of worker threads. Requests wait in a
+pending list while every worker is busy, and the Scheduler (see
+scheduler.py) chooses each batch from everything pending, grouped by
+ensemble and tweak. Responses are written as soon as their group completes,
+so they may arrive out of order.
+"""
+from prf import enableKeyCache, keyCache, wrap
+from scheduler import Scheduler
+from relic import initThread
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from Queue import Empty, Queue
+from threading import Condition, Event, Lock, Thread
+from timeit import default_timer
+import json, os, socket, SocketServer
+import bls, vpop, vprf
+
+# PRF modules by request name.
+PRFS = {"vpop": vpop, "vprf": vprf, "bls": bls}
+
+
+class MicroBatcher(object):
+    """
+    Collects items submitted by many threads into batches of at most
+    @maxBatch items and runs each batch on a pool of @workers threads.
+    @process(items) returns a list of results.
+
+    Batching adapts to load: while a worker is idle, queued items are
+    dispatched immediately. While every worker is busy, items wait in a
+    pending list (collected at least every @maxDelay seconds), and the next
+    batch is chosen when a worker becomes free. With a @scheduler (see
+    scheduler.Scheduler), the batch is its first groups of pending items,
+    and @process is called once per group so that each group's results are
+    delivered as soon as they are computed. Otherwise batches are taken in
+    arrival order.
+    """
+    def __init__(self, process, maxBatch=32, maxDelay=0.005, workers=None,
+            scheduler=None):
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.workers = workers or cpu_count()
+        self.scheduler = scheduler
+        self.batches = 0
+        self.items = 0
+
+        self._process = process
+        self._queue = Queue()
+        self._busy = 0
+        self._lock = Lock()
+        self._idle = Condition(self._lock)
+        self._stop = Event()
+        self._pool = ThreadPool(self.workers, initializer=initThread)
+        self._dispatcher = Thread(target=self._dispatch)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+
+    def close(self):
+        """
+        Stops dispatching and waits for running batches to finish.
+        """
+        self._stop.set()
+        self._dispatcher.join()
+        self._pool.close()
+        self._pool.join()
+
+
+    def stats(self):
+        """
+        @returns a dict with keys: batches, items, meanBatch
+        """
+        with self._lock:
+            return dict(batches=self.batches, items=self.items,
+                meanBatch=float(self.items)/self.batches if self.batches
+                    else 0.0)
+
+
+    def submit(self, item, callback):
+        """
+        Queues @item. @callback(result) is called on a worker thread when
+        its result is computed.
+        """
+        self._queue.put((item, callback, default_timer()))
+
+
+    def _dispatch(self):
+        # Items queued before close() are still dispatched.
+        pending = []
+        while not (self._stop.is_set() and self._queue.empty() and
+                not pending):
+            if not pending:
+                try:
+                    pending.append(self._queue.get(timeout=0.1))
+                except Empty:
+                    continue
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            with self._lock:
+                if self._busy >= self.workers:
+                    self._idle.wait(self.maxDelay)
+                    continue
+                groups = self._take(pending)
+                self._busy += 1
+                self.batches += 1
+                self.items += sum(len(group) for group in groups)
+            self._pool.apply_async(self._run, (groups,))
+
+
+    def _run(self, groups):
+        try:
+            for group in groups:
+                try:
+                    results = self._process([item for item,_,_ in group])
+                except Exception as e:
+                    results = [e]*len(group)
+                for (_, callback, _), result in zip(group, results):
+                    callback(result)
+        finally:
+            with self._lock:
+                self._busy -= 1
+                self._idle.notify()
+
+
+    def _take(self, pending):
+        """
+        Removes the next batch from the @pending (item, callback, arrival)
+        entries.
+        @returns the batch as a list of groups of entries
+        """
+        if self.scheduler is None:
+            batch = pending[:self.maxBatch]
+            del pending[:self.maxBatch]
+            return [batch]
+
+        groups, taken = [], set()
+        for _, _, indices in self.scheduler.order(
+                [item for item,_,_ in pending],
+                [arrival for _,_,arrival in pending]):
+            indices = indices[:self.maxBatch - len(taken)]
+            groups.append([pending[i] for i in indices])
+            taken.update(indices)
+            if len(taken) == self.maxBatch:
+                break
+        pending[:] = [entry for i, entry in enumerate(pending)
+            if i not in taken]
+        return groups
+
+
+class PrfServer(object):
+    """
+    Serves Pythia PRF requests (vpop, vprf, and bls) for one master secret
+    key. Typical use in tests and benchmarks:
+        server = PrfServer(("127.0.0.1", 0), msk, s)
+        server.start()
+        client = PrfClient(server.address)
+    """
+    def __init__(self, address, msk, s, maxBatch=32, maxDelay=0.005,
+            workers=None, budget=0.01, quota=16):
+        """
+        Listens on @address: (host, port) for TCP, where port 0 selects a
+        free port, or a path for a UNIX socket. @s is the state value or a
+        keytable.KeyTable. Batching parameters are passed to MicroBatcher,
+        and @budget and @quota to the Scheduler. Enables the key and tweak
+        caches if they are disabled.
+        """
+        self.msk = msk
+        self.s = s
+        self.scheduler = Scheduler(lambda r: (r.get("w"), r.get("t")), 
+            budget, quota)
+        if keyCache() is None:
+            enableKeyCache()
+        if vpop.tweakCache() is None:
+            vpop.enableTweakCache()
+
+        self.batcher = MicroBatcher(self._evalBatch, maxBatch, maxDelay,
+            workers, self.scheduler)
+
+        serverType = _UnixServer if isinstance(address, basestring) else \
+            _TcpServer
+        self._server = serverType(address, _Handler)
+        self._server.batcher = self.batcher
+        self.address = self._server.server_address
+        self._thread = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        """
+        Stops accepting requests and shuts down the workers.
+        """
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+        self.batcher.close()
+        if isinstance(self.address, basestring):
+            os.remove(self.address)
+
+
+    def serveForever(self):
+        self._server.serve_forever()
+
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        """
+        self._thread = Thread(target=self.serveForever)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def _eval(self, request):
+        try:
+            prf = PRFS[request["prf"]]
+            x = prf.unwrapX(str(request["x"]))
+            y, pi = prf.evalAndProve(str(request["w"]), str(request["t"]), x,
+                self.msk, self.s)
+            return {"id": request.get("id"), "y": wrap(y),
+                "pi": [None if v is None else wrap(v) for v in pi]}
+        except Exception as e:
+            return {"id": request.get("id"), "error": str(e) or repr(e)}
+
+
+    def _evalBatch(self, requests):
+        return [self._eval(request) for request in requests]
+
+
+class PrfClient(object):
+    """
+    Sends requests to a PrfServer over one connection. Not thread-safe.
+    """
+    def __init__(self, address):
+        family = socket.AF_UNIX if isinstance(address, basestring) else \
+            socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.connect(address)
+        self._file = self._socket.makefile("r+b")
+        self._nextId = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+    def query(self, prf, w, t, x):
+        """
+        Evaluates the PRF named @prf on input @x.
+        @returns (y, pi)
+        """
+        return self.queryMany(prf, w, t, [x])[0]
+
+
+    def stats(self):
+        """
+        Retrieves the server's batching metrics (see MicroBatcher.stats).
+        """
+        self._file.write(json.dumps({"id": None, "op": "stats"}) + "\n")
+        self._file.flush()
+        return json.loads(self._file.readline())["stats"]
+
+
+    def queryMany(self, prf, w, t, xs):
+        """
+        Evaluates the PRF named @prf on each input in @xs. The requests are
+        pipelined: all are sent before any response is read. Raises
+        Exception if the server reports an error.
+        @returns a list of (y, pi)
+        """
+        module = PRFS[prf]
+        ids = range(self._nextId, self._nextId + len(xs))
+        self._nextId += len(xs)
+
+        for i, x in zip(ids, xs):
+            self._file.write(json.dumps({"id": i, "prf": prf, "w": w, "t": t,
+                "x": wrap(x)}) + "\n")
+        self._file.flush()
+
+        responses = {}
+        while len(responses) < len(xs):
+            line = self._file.readline()
+            if not line:
+                raise Exception("The server closed the connection")
+            response = json.loads(line)
+            responses[response["id"]] = response
+
+        results = []
+        for i in ids:
+            response = responses[i]
+            if "error" in response:
+                raise Exception("Server error: {}".format(response["error"]))
+            p, c, u = response["pi"]
+            results.append((module.unwrapY(response["y"]),
+                (module.unwrapP(p), module.unwrapC(c), module.unwrapU(u))))
+        return results
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+    """
+    Reads requests from one connection and writes responses as their
+    batches complete.
+    """
+    def handle(self):
+        self._writeLock = Lock()
+        self._pending = 0
+        self._done = Condition(self._writeLock)
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Requests must be JSON objects")
+            except ValueError as e:
+                self._respond({"id": None, "error": str(e)}, False)
+                continue
+
+            if request.get("op") == "stats":
+                self._respond({"id": request.get("id"),
+                    "stats": self.server.batcher.stats()}, False)
+                continue
+
+            with self._writeLock:
+                self._pending += 1
+            self.server.batcher.submit(request, self._respond)
+
+        # The connection closes when this method returns.
+        with self._writeLock:
+            while self._pending:
+                self._done.wait()
+
+
+    def _respond(self, response, pending=True):
+        if isinstance(response, Exception):
+            response = {"id": None, "error": str(response)}
+
+        with self._writeLock:
+            try:
+                self.wfile.write(json.dumps(response) + "\n")
+                self.wfile.flush()
+            except socket.error:
+                pass
+            if pending:
+                self._pending -= 1
+                self._done.notify_all()
+
+
+class _TcpServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+    daemon_threads = True
@@ -0,0 +1,61 @@
+"""
+Client-side query sessions for the Pythia PRFs. A session blinds the message
+and, while the request is in flight, computes the parts of proof
+verification that don't depend on the server's response.
+"""
+from relic import initThread
+from threading import Thread
+
+
+class QuerySession(object):
+    """
+    One client query to a Pythia server using the PRF module @prf (vprf,
+    vpop, or bls). Typical use:
+        session = QuerySession(vpop, m, t)
+        ... send session.x and t to the server, wait for y, pi ...
+        z = session.finish(y, pi)
+    """
+    def __init__(self, prf, m, t):
+        """
+        Blinds message @m and starts computing the verification inputs for
+        tweak @t on a worker thread.
+        """
+        self.prf = prf
+        self.t = t
+        self.rInv, self.x = prf.blind(m)
+
+        self._beta = None
+        self._error = None
+        self._worker = Thread(target=self._prepare)
+        self._worker.daemon = True
+        self._worker.start()
+
+
+    def finish(self, y, pi, errorOnFail=True):
+        """
+        Verifies the server's response @y and proof @pi, then deblinds @y.
+        @returns the PRF output z, or None if the proof fails verification
+            and @errorOnFail is False.
+        """
+        beta = self.beta()
+        if not self.prf.verify(self.x, self.t, y, pi, errorOnFail, beta=beta):
+            return None
+        return self.prf.deblind(self.rInv, y)
+
+
+    def beta(self):
+        """
+        Waits for the verification inputs to be computed and returns them.
+        """
+        self._worker.join()
+        if self._error is not None:
+            raise self._error
+        return self._beta
+
+
+    def _prepare(self):
+        try:
+            initThread()
+            self._beta = self.prf.prepareVerify(self.x, self.t)
+        except Exception as e:
+            self._error = e
@@ -0,0 +1,262 @@
+"""
+A sharded, multi-process Pythia PRF service on one machine. A supervisor
+forks one PrfServer process per shard, each listening on a UNIX socket, and
+assigns ensembles to shards by consistent hashing of w. Requests for an
+ensemble always reach the same shard, so its key and tweak caches stay
+effective, and adding or removing a shard moves only the ensembles on the
+affected part of the ring.
+"""
+from relic import after_fork
+from server import PrfClient, PrfServer
+from bisect import bisect
+import hashlib, multiprocessing, os, shutil, struct, tempfile, time
+
+# Points on the ring per shard. More points spread ensembles more evenly.
+REPLICAS = 64
+
+# Seconds to wait for a new shard to start listening.
+START_TIMEOUT = 10.0
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys onto a set of nodes.
+    """
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+
+    def __contains__(self, node):
+        return node in set(self._nodes.values())
+
+
+    def __len__(self):
+        return len(set(self._nodes.values()))
+
+
+    def add(self, node):
+        """
+        Adds @node to the ring.
+        """
+        for i in range(self.replicas):
+            point = _hash("{}#{}".format(node, i))
+            if point not in self._nodes:
+                self._nodes[point] = node
+                self._points.insert(bisect(self._points, point), point)
+
+
+    def node(self, key):
+        """
+        Retrieves the node that owns @key.
+        """
+        if not self._points:
+            raise LookupError("The ring is empty")
+        i = bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._nodes[self._points[i]]
+
+
+    def remove(self, node):
+        """
+        Removes @node from the ring.
+        """
+        self._points = [p for p in self._points if self._nodes[p] != node]
+        self._nodes = dict((p, self._nodes[p]) for p in self._points)
+
+
+    def shares(self):
+        """
+        Computes the fraction of the key space owned by each node.
+        @returns a dict mapping nodes to fractions
+        """
+        result = dict((node, 0.0) for node in self._nodes.values())
+        for i, point in enumerate(self._points):
+            previous = self._points[i-1] if i else self._points[-1] - 2**64
+            result[self._nodes[point]] += float(point - previous) / 2**64
+        return result
+
+
+class ShardSupervisor(object):
+    """
+    Runs PrfServer shards in child processes. Typical use:
+        with ShardSupervisor(msk, s, shards=4) as supervisor:
+            with supervisor.client() as client:
+                y, pi = client.query("vpop", w, t, x)
+    """
+    def __init__(self, msk, s, shards=None, **serverArgs):
+        """
+        Starts @shards worker processes (the number of CPUs by default),
+        each serving the PRFs for @msk and state value @s. Other arguments
+        are passed to each PrfServer.
+        """
+        self.msk = msk
+        self.s = s
+        self.ring = HashRing()
+        self._serverArgs = serverArgs
+        self._directory = tempfile.mkdtemp(prefix="pyrelic-shards-")
+        self._shards = {}
+        self._nextShard = 0
+        for _ in range(shards or multiprocessing.cpu_count()):
+            self.addShard()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def addShard(self):
+        """
+        Starts a new shard and adds it to the ring.
+        @returns the shard's name
+        """
+        name = "shard{}".format(self._nextShard)
+        self._nextShard += 1
+        path = os.path.join(self._directory, name + ".sock")
+
+        process = multiprocessing.Process(target=_serve,
+            args=(path, self.msk, self.s, self._serverArgs))
+        process.daemon = True
+        process.start()
+
+        deadline = time.time() + START_TIMEOUT
+        while not os.path.exists(path):
+            if not process.is_alive() or time.time() > deadline:
+                process.terminate()
+                raise Exception("Shard {} failed to start".format(name))
+            time.sleep(0.01)
+
+        self._shards[name] = (process, path)
+        self.ring.add(name)
+        return name
+
+
+    def address(self, w):
+        """
+        Retrieves the socket path of the shard that owns ensemble @w.
+        """
+        return self._shards[self.ring.node(w)][1]
+
+
+    def client(self):
+        """
+        Creates a ShardClient that routes requests through this supervisor's
+        ring.
+        """
+        return ShardClient(self)
+
+
+    def close(self):
+        """
+        Stops every shard.
+        """
+        for name in list(self._shards):
+            self.removeShard(name)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+
+    def removeShard(self, name):
+        """
+        Removes shard @name from the ring and stops its process. Its
+        ensembles move to the neighboring shards on the ring.
+        """
+        self.ring.remove(name)
+        process, path = self._shards.pop(name)
+        process.terminate()
+        process.join()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+    def shards(self):
+        return sorted(self._shards)
+
+
+    def stats(self):
+        """
+        Reports the load on each shard: its batching metrics (see
+        MicroBatcher.stats) and its share of the ensemble key space.
+        @returns a dict mapping shard names to dicts
+        """
+        shares = self.ring.shares()
+        result = {}
+        for name, (_, path) in self._shards.items():
+            with PrfClient(path) as client:
+                result[name] = client.stats()
+            result[name]["share"] = shares.get(name, 0.0)
+        return result
+
+
+class ShardClient(object):
+    """
+    Sends each request to the shard that owns its ensemble, keeping one
+    connection per shard. Not thread-safe.
+    """
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self._clients = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+
+
+    def query(self, prf, w, t, x):
+        """
+        Evaluates the PRF named @prf on input @x (see PrfClient.query).
+        """
+        return self._client(w).query(prf, w, t, x)
+
+
+    def queryMany(self, prf, w, t, xs):
+        """
+        Evaluates the PRF named @prf on each input in @xs (see
+        PrfClient.queryMany).
+        """
+        return self._client(w).queryMany(prf, w, t, xs)
+
+
+    def _client(self, w):
+        path = self.supervisor.address(w)
+
+        # Drop connections to shards that were removed.
+        for stale in set(self._clients) - set([path]):
+            if not os.path.exists(stale):
+                self._clients.pop(stale).close()
+
+        if path not in self._clients:
+            self._clients[path] = PrfClient(path)
+        return self._clients[path]
+
+
+def _hash(key):
+    """
+    Positions @key on the ring. Python's hash() is not stable across
+    processes (with -R), so positions are derived from MD5.
+    """
+    return struct.unpack_from(">Q", hashlib.md5(key).digest())[0]
+
+
+def _serve(path, msk, s, serverArgs):
+    """
+    Runs one shard in a child process. The fork copied the parent's RELIC
+    generator state and pools, so they are reset.
+    """
+    after_fork()
+    PrfServer(path, msk, s, **serverArgs).serveForever()
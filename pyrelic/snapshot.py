@@ -0,0 +1,145 @@
+"""
+Snapshots of precomputed values: the group generators and orders and LWNAF
+multiplication tables for G2 elements (the generator and, e.g., G2 pubkeys).
+A process that loads a snapshot skips computing them, and because the file
+is memory-mapped, processes that load the same snapshot share its pages.
+
+The values are stored as the raw ctypes structures, so a snapshot can only
+be loaded by a build with the same structure layout (word size, BN_SIZE,
+and field sizes; see relic.py) and the same curve parameters. Both are
+checked on load.
+
+File layout: a header (magic, version, index size), a JSON index, and the
+structures, each aligned to 64 bytes. Offsets in the index are relative to
+the first structure.
+"""
+from pbc import *
+from ec import ecPoint, lwnafTable
+from ctypes import addressof, c_void_p, sizeof, string_at
+import json, mmap, os, struct
+
+MAGIC = "PYRSNAP1"
+VERSION = 1
+_header = struct.Struct(">8sII")
+ALIGNMENT = 64
+
+# Structure types by name
+_types = {"G1": G1Element, "G2": G2Element, "Gt": GtElement, "Z": BigInt,
+    "lwnaf": lwnafTable}
+
+# Cached values stored in every snapshot: (entry name, cached function)
+_cachedValues = [("generatorG1", generatorG1), ("generatorG2", generatorG2),
+    ("generatorGt", generatorGt), ("orderG1", orderG1), ("orderG2", orderG2),
+    ("orderGt", orderGt)]
+
+
+def layout():
+    """
+    Describes the structure layout of this build.
+    """
+    return {
+        "word": sizeof(c_void_p)*8,
+        "bnSize": BigInt.BN_SIZE,
+        "coordLen": ecPoint.COORD_LEN,
+        "lwnafSize": lwnafTable.SIZE,
+        "sizes": dict((name, sizeof(t)) for name, t in _types.items()),
+    }
+
+
+def loadSnapshot(path, install=True):
+    """
+    Maps the snapshot at @path into memory. If @install is True, the
+    snapshot's generators and orders replace the cached values, and the
+    generator of G2 takes its LWNAF table. Raises ValueError if the
+    snapshot was written by an incompatible build.
+
+    The file is mapped copy-on-write: pages stay shared until a value is
+    modified, and modifications never reach the file.
+    @returns a dict mapping the names of the G2 elements passed to
+        writeSnapshot to elements that use the snapshot's tables
+    """
+    with open(path, "rb") as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, version, size = _header.unpack_from(m)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} snapshot".format(path,
+            VERSION))
+
+    index = json.loads(m[_header.size:_header.size + size])
+    if index["layout"] != json.loads(json.dumps(layout())):
+        raise ValueError("{} was written by a build with a different "\
+            "structure layout: {}".format(path, index["layout"]))
+
+    start, values = _align(_header.size + size), {}
+    for name, (typeName, offset) in index["entries"].items():
+        values[name] = _types[typeName].from_buffer(m, start + offset)
+
+    # The curve parameters must match as well.
+    for name, func, resultType in [
+            ("generatorG1", librelic.g1_get_gen_abi, G1Element),
+            ("generatorG2", librelic.g2_get_gen_abi, G2Element),
+            ("orderGt", librelic.gt_get_ord_abi, BigInt)]:
+        expected = resultType()
+        func(byref(expected))
+        if _raw(expected) != _raw(values[name]):
+            raise ValueError("{} was written for different curve "\
+                "parameters".format(path))
+
+    for name, table in index["tables"].items():
+        values[name]._table = values[table]
+
+    if install:
+        for name, cached in _cachedValues:
+            cached.cached = values[name]
+
+    return dict((name, values[name]) for name in index["elements"])
+
+
+def writeSnapshot(path, elements={}):
+    """
+    Writes a snapshot of the generators, orders, and the LWNAF table of the
+    generator of G2 to @path. Tables are also stored for each G2 element
+    in the dict @elements (name: element), to be returned by loadSnapshot.
+    """
+    values, tables = [], {}
+    for name, cached in _cachedValues:
+        values.append((name, cached()))
+
+    g2 = [("generatorG2", generatorG2())] + sorted(elements.items())
+    for name, P in g2:
+        if not isinstance(P, G2Element):
+            raise TypeError("Only G2 elements have tables")
+        if name != "generatorG2":
+            values.append((name, P))
+        P.precompute()
+        tables[name] = name + ".table"
+        values.append((tables[name], P._table))
+
+    typeNames = dict((t, name) for name, t in _types.items())
+    entries, size = {}, 0
+    for name, value in values:
+        entries[name] = [typeNames[type(value)], size]
+        size += _align(sizeof(value))
+
+    index = json.dumps({"layout": layout(), "entries": entries,
+        "tables": tables, "elements": sorted(elements)})
+    start = _align(_header.size + len(index))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write((_header.pack(MAGIC, VERSION, len(index)) + index).ljust(
+            start, "\0"))
+        for name, value in values:
+            f.seek(start + entries[name][1])
+            f.write(_raw(value))
+        f.truncate(start + size)
+    os.rename(tmp, path)
+
+
+def _align(n):
+    return -(-n // ALIGNMENT)*ALIGNMENT
+
+
+def _raw(x):
+    return string_at(addressof(x), sizeof(x))
@@ -0,0 +1,376 @@
+"""
+A persistent store of PRF outputs: compressed G1 or Gt elements keyed by an
+arbitrary string (e.g. a user name), for services that keep deblinded
+Pythia outputs.
+
+Elements are stored as fixed-width records in a memory-mapped file, in
+insertion order, and a key index (see mmaphash.py) maps each key to its
+record. Lookups are O(1), elements are read by RELIC directly from the
+mapped file and written directly into it, and scans (for verification or
+key rotation) read the file sequentially.
+
+Records file layout: a 64 byte header followed by the records. Each record
+is the SHA-256 digest of its key, a 2 byte length, and the compressed
+element padded to the width of the largest element of its group.
+
+Updates (e.g. key rotation) overwrite records in place, so they record
+their progress in the header and journal each batch (in @path.journal)
+before writing it: an interrupted update resumes where it stopped and
+replaces each element exactly once.
+"""
+from pbc import *
+from relic import byref, librelic
+from mmaphash import MmapHashTable
+from ctypes import c_ubyte
+import hashlib, mmap, os, prf, struct
+
+# Header: magic, group, record size, record count, then the update in
+# progress (if any): tag, next record, end record. The tag is all zeros when
+# no update is in progress.
+MAGIC = "PYRSTOR1"
+_header = struct.Struct(">8s2sIQ16sQQ")
+HEADER_SIZE = 64
+
+# Identifies an update: a truncated SHA-256 digest of its tag.
+TAG_SIZE = 16
+_noTag = "\0"*TAG_SIZE
+
+# Journal: tag, start record, end record, then the records.
+_journal = struct.Struct(">16sQQ")
+
+# Keys are stored as SHA-256 digests.
+KEY_SIZE = hashlib.sha256().digest_size
+
+# Records read or written per batch by scans and updates.
+BATCH_SIZE = 4096
+
+# Index entries: record number
+_index = struct.Struct(">Q")
+
+# Length of a serialized element
+_length = struct.Struct(">H")
+
+# Element type and prefix of the RELIC functions for each group. The
+# functions are looked up when a store is opened.
+_groups = {"G1": (G1Element, "g1"), "G2": (G2Element, "g2"),
+    "Gt": (GtElement, "gt")}
+_generators = {"G1": generatorG1, "G2": generatorG2, "Gt": generatorGt}
+
+_compressed = 1
+
+
+class RecordStore(object):
+    """
+    A persistent map from string keys to group elements. Elements are not
+    validated when they are read: they were valid when they were stored.
+    Not thread-safe.
+    """
+    def __init__(self, path, group=GtElement, capacity=1024):
+        """
+        Opens the store at @path (with its index at @path.index), creating
+        it for elements of type @group with room for @capacity records if it
+        doesn't exist. The file grows as records are added.
+        """
+        self.path = path
+        self._map = None
+        if not os.path.exists(path):
+            name = _groupName(group)
+            sizeBin = getattr(librelic, _groups[name][1] + "_size_bin_abi")
+            recordSize = KEY_SIZE + _length.size + sizeBin(
+                byref(_generators[name]()), _compressed)
+            with open(path, "wb") as f:
+                f.write(_header.pack(MAGIC, name, recordSize, 0, _noTag, 0,
+                    0).ljust(HEADER_SIZE, "\0"))
+                f.truncate(HEADER_SIZE + capacity*recordSize)
+
+        self._open()
+        if group is not self.group:
+            self._map.close()
+            self._file.close()
+            raise ValueError("{} stores {}s".format(path,
+                self.group._elementType))
+        self._indexTable = MmapHashTable(path + ".index", KEY_SIZE,
+            _index.size, int(capacity/0.7) + 1)
+
+
+    def __contains__(self, key):
+        return _digest(key) in self._indexTable
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __len__(self):
+        return self._count
+
+
+    def append(self, items):
+        """
+        Stores each (key, element) in @items, replacing the elements of keys
+        that are already present.
+        """
+        if self._pending:
+            raise ValueError("{} has an interrupted update: resume it "\
+                "first".format(self.path))
+        items = list(items)
+        self._reserve(self._count + len(items))
+        for key, x in items:
+            self._put(key, x)
+        self._writeHeader()
+
+
+    def close(self):
+        """
+        Flushes and closes the store.
+        """
+        if self._map is not None:
+            self.flush()
+            self._map.close()
+            self._file.close()
+            self._indexTable.close()
+            self._map = None
+
+
+    def flush(self):
+        """
+        Writes changes to disk.
+        """
+        self._writeHeader()
+        self._map.flush()
+        self._indexTable.flush()
+
+
+    def get(self, key):
+        """
+        Retrieves the element for @key, or None if it is not present.
+        """
+        entry = self._indexTable.get(_digest(key))
+        if entry is None:
+            return None
+        return self._read(_index.unpack(entry)[0])
+
+
+    def put(self, key, x):
+        """
+        Stores element @x for @key.
+        """
+        self.append([(key, x)])
+
+
+    def rotate(self, delta, executor=None, batchSize=BATCH_SIZE):
+        """
+        Applies the update token @delta (see prf.getDelta) to every stored
+        element in place, on @executor (see engine.BatchOperations) if one
+        is given. If a rotation is interrupted, calling rotate again with
+        the same @delta resumes it.
+        """
+        if executor:
+            func = lambda zs: executor.update(zs, delta)
+        else:
+            func = lambda zs: [prf.update(z, delta) for z in zs]
+        self.update(func, "rotate:" + serializeZ(delta), batchSize)
+
+
+    def scan(self, batchSize=BATCH_SIZE):
+        """
+        Reads every element in record order.
+        @yields lists of at most @batchSize elements
+        """
+        for start in xrange(0, self._count, batchSize):
+            yield [self._read(i) for i in xrange(start,
+                min(start + batchSize, self._count))]
+
+
+    def update(self, func, tag, batchSize=BATCH_SIZE):
+        """
+        Replaces the elements in place, a batch at a time:
+        @func(elements) returns the new elements for a batch. If the update
+        is interrupted (by an exception or a crash), calling update again
+        with the same @tag (a string identifying @func) resumes it; the
+        store can't be modified otherwise until it is resumed.
+        """
+        tag = hashlib.sha256(tag).digest()[:TAG_SIZE]
+        journal = self.path + ".journal"
+        if self._pending is None:
+            if os.path.exists(journal):
+                os.remove(journal)
+            self._pending = (tag, 0, self._count)
+            self._sync()
+        elif self._pending[0] != tag:
+            raise ValueError("{} has an interrupted update with a "\
+                "different tag".format(self.path))
+        else:
+            self._recover()
+
+        _, start, end = self._pending
+        while start < end:
+            stop = min(start + batchSize, end)
+            buf = bytearray(self._map[self._offset(start):self._offset(stop)])
+            batch = [self._read(i) for i in xrange(start, stop)]
+            for i, x in enumerate(func(batch)):
+                self._encode(buf, i*self._recordSize, x)
+
+            _writeJournal(journal, tag, start, stop, buf)
+            self._apply(start, stop, buf)
+            start = stop
+
+        self._pending = None
+        self._sync()
+        if os.path.exists(journal):
+            os.remove(journal)
+
+
+    def _apply(self, start, stop, buf):
+        """
+        Writes the journaled records @buf over records @start to @stop, then
+        records the progress of the update.
+        """
+        self._map[self._offset(start):self._offset(stop)] = str(buf)
+        self._map.flush()
+        tag, _, end = self._pending
+        self._pending = (tag, stop, end)
+        self._sync()
+
+
+    def _encode(self, buf, offset, x):
+        """
+        Serializes @x into the record at @offset in @buf (the mapped file or
+        a copy of its records).
+        """
+        offset += KEY_SIZE
+        size = self._sizeBin(byref(x), _compressed)
+        if KEY_SIZE + _length.size + size > self._recordSize:
+            raise ValueError("Serialized element is too large")
+        b = (c_ubyte*size).from_buffer(buf, offset + _length.size)
+        self._writeBin(byref(b), size, byref(x), _compressed)
+        _length.pack_into(buf, offset, size)
+
+
+    def _offset(self, i):
+        return HEADER_SIZE + i*self._recordSize
+
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, name, self._recordSize, self._count, tag, start, end = \
+            _header.unpack_from(self._map)
+        self._pending = None if tag == _noTag else (tag, start, end)
+        if magic != MAGIC:
+            self._map.close()
+            self._file.close()
+            raise ValueError("{} is not a record store".format(self.path))
+
+        self.group, prefix = _groups[name]
+        self._sizeBin, self._writeBin, self._readBin = [getattr(librelic,
+            prefix + suffix) for suffix in ["_size_bin_abi",
+                "_write_bin_abi", "_read_bin_abi"]]
+        self.capacity = (len(self._map) - HEADER_SIZE) // self._recordSize
+
+
+    def _put(self, key, x):
+        if not isinstance(x, self.group):
+            raise TypeError("Expected a {}".format(self.group._elementType))
+
+        digest = _digest(key)
+        entry = self._indexTable.get(digest)
+        if entry is None:
+            i = self._count
+            self._count += 1
+            self._indexTable.put(digest, _index.pack(i))
+        else:
+            i, = _index.unpack(entry)
+
+        offset = self._offset(i)
+        self._map[offset:offset+KEY_SIZE] = digest
+        self._write(i, x)
+
+
+    def _read(self, i):
+        """
+        Reads record @i directly from the mapped file.
+        """
+        offset = self._offset(i) + KEY_SIZE
+        size, = _length.unpack_from(self._map, offset)
+        b = (c_ubyte*size).from_buffer(self._map, offset + _length.size)
+        x = self.group()
+        self._readBin(byref(x), byref(b), size, _compressed)
+        return x
+
+
+    def _recover(self):
+        """
+        Rewrites the batch in the journal if the interrupted update stopped
+        after journaling it but before recording its progress.
+        """
+        path = self.path + ".journal"
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        tag, start, stop = _journal.unpack_from(data)
+        if (tag, start) == self._pending[:2]:
+            self._apply(start, stop, bytearray(data[_journal.size:]))
+
+
+    def _reserve(self, count):
+        """
+        Grows the file, if needed, so that it can hold @count records.
+        """
+        if count <= self.capacity:
+            return
+        capacity = max(count, 2*self.capacity)
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(HEADER_SIZE + capacity*self._recordSize)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.capacity = capacity
+
+
+    def _sync(self):
+        """
+        Writes the header and records to disk.
+        """
+        self._writeHeader()
+        self._map.flush()
+
+
+    def _write(self, i, x):
+        """
+        Serializes @x directly into record @i.
+        """
+        self._encode(self._map, self._offset(i), x)
+
+
+    def _writeHeader(self):
+        tag, start, end = self._pending or (_noTag, 0, 0)
+        _header.pack_into(self._map, 0, MAGIC, _groupName(self.group),
+            self._recordSize, self._count, tag, start, end)
+
+
+def _digest(key):
+    return hashlib.sha256(key).digest()
+
+
+def _groupName(group):
+    for name, (elementType, _) in _groups.items():
+        if group is elementType:
+            return name
+    raise ValueError("Unsupported group {}".format(group))
+
+
+def _writeJournal(path, tag, start, stop, buf):
+    """
+    Replaces the journal at @path atomically with records @start to @stop.
+    """
+    with open(path + ".tmp", "wb") as f:
+        f.write(_journal.pack(tag, start, stop))
+        f.write(buf)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(path + ".tmp", path)
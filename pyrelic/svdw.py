@@ -0,0 +1,342 @@
+"""
+Shallue-van de Woestijne (SvdW) hashing onto short Weierstrass curves
+y^2 = x^3 + A*x + B over a prime field Fp or its quadratic extension Fp2.
+Follows the hash_to_field, expand_message_xmd, and map_to_curve_svdw routines
+of RFC 9380. The map runs the same sequence of field operations for every
+input (no try-and-increment loop); note that Python integer arithmetic itself
+makes no constant-time guarantees.
+
+This module only does field arithmetic on Python longs. Curve constants are
+supplied by the caller (see pbc.py) and points are returned as affine
+coordinates.
+"""
+import binascii, hashlib, struct
+from common import *
+
+
+class PrimeField(object):
+    """
+    Arithmetic in Fp for a prime p = 3 mod 4. Elements are Python longs.
+    """
+    # Number of coordinates in Fp.
+    degree = 1
+
+    def __init__(self, p, powmod=pow, invmod=None):
+        """
+        Creates the field of integers modulo the prime @p. Exponentiation
+        dominates the cost of the map, so a faster implementation of 
+        powmod(a,e,p) and invmod(a,p) can be supplied.
+        """
+        if p % 4 != 3:
+            raise ValueError("Only primes p = 3 mod 4 are supported")
+
+        self.p = p
+        self._pow = powmod
+        self._inv = invmod
+        self.zero = 0
+        self.one = 1
+        self._sqrtExp = (p+1)//4
+        self._legendreExp = (p-1)//2
+
+
+    def add(self, a, b):
+        return (a + b) % self.p
+
+    def sub(self, a, b):
+        return (a - b) % self.p
+
+    def neg(self, a):
+        return -a % self.p
+
+    def mul(self, a, b):
+        return (a * b) % self.p
+
+    def sqr(self, a):
+        return (a * a) % self.p
+
+    def fromInt(self, x):
+        return x % self.p
+
+    def fromCoefficients(self, c):
+        return c[0] % self.p
+
+    def coefficients(self, a):
+        return (a,)
+
+
+    def inv0(self, a):
+        """
+        Computes 1/@a, or 0 when @a is 0.
+        """
+        if self._inv and a:
+            return self._inv(a, self.p)
+        return self._pow(a, self.p-2, self.p)
+
+
+    def isSquare(self, a):
+        """
+        Determines if @a is a square (including 0).
+        """
+        return self._pow(a, self._legendreExp, self.p) != self.p-1
+
+
+    def sgn0(self, a):
+        """
+        The "sign" of @a as defined in RFC 9380.
+        """
+        return a % 2
+
+
+    def sqrt(self, a):
+        """
+        Retrieves a square root of @a. @a must be a square.
+        """
+        return self._pow(a, self._sqrtExp, self.p)
+
+
+class QuadraticField(object):
+    """
+    Arithmetic in Fp2 = Fp[i]/(i^2 + 1) for a prime p = 3 mod 4. Elements
+    are pairs (a0, a1) representing a0 + a1*i.
+    """
+    # Number of coordinates in Fp2.
+    degree = 2
+
+    def __init__(self, p, powmod=pow, invmod=None):
+        """
+        Creates the quadratic extension of the integers modulo the prime @p.
+        @powmod and @invmod are used for arithmetic in Fp (see PrimeField).
+        """
+        self.base = PrimeField(p, powmod, invmod)
+        self.p = p
+        self.zero = (0, 0)
+        self.one = (1, 0)
+
+
+    def add(self, a, b):
+        p = self.p
+        return ((a[0] + b[0]) % p, (a[1] + b[1]) % p)
+
+    def sub(self, a, b):
+        p = self.p
+        return ((a[0] - b[0]) % p, (a[1] - b[1]) % p)
+
+    def neg(self, a):
+        p = self.p
+        return (-a[0] % p, -a[1] % p)
+
+    def mul(self, a, b):
+        p = self.p
+        return ((a[0]*b[0] - a[1]*b[1]) % p, (a[0]*b[1] + a[1]*b[0]) % p)
+
+    def sqr(self, a):
+        p = self.p
+        return ((a[0] + a[1]) * (a[0] - a[1]) % p, 2*a[0]*a[1] % p)
+
+    def fromInt(self, x):
+        return (x % self.p, 0)
+
+    def fromCoefficients(self, c):
+        return (c[0] % self.p, c[1] % self.p)
+
+    def coefficients(self, a):
+        return a
+
+
+    def inv0(self, a):
+        """
+        Computes 1/@a, or 0 when @a is 0.
+        """
+        p = self.p
+        n = self.base.inv0((a[0]*a[0] + a[1]*a[1]) % p)
+        return (a[0]*n % p, -a[1]*n % p)
+
+
+    def isSquare(self, a):
+        """
+        Determines if @a is a square: exactly when its norm is a square in Fp.
+        """
+        return self.base.isSquare((a[0]*a[0] + a[1]*a[1]) % self.p)
+
+
+    def sgn0(self, a):
+        """
+        The "sign" of @a as defined in RFC 9380.
+        """
+        return (a[0] % 2) | ((a[0] == 0) & (a[1] % 2))
+
+
+    def sqrt(self, a):
+        """
+        Retrieves a square root of @a using the norm (complex) method. @a
+        must be a square.
+        """
+        p, base = self.p, self.base
+        a0, a1 = a
+
+        # n = sqrt(a0^2 + a1^2); then sqrt(a) = x0 + x1*i where
+        # x0^2 = (a0 + n)/2 and x1 = a1/(2*x0).
+        n = base.sqrt((a0*a0 + a1*a1) % p)
+        d = (a0 + n) * ((p+1)//2) % p
+
+        # Only possible when a1 == 0: the other choice of n is needed.
+        if d == 0:
+            d = (a0 - n) * ((p+1)//2) % p
+
+        # s = d^((p+1)/4) is either sqrt(d) or sqrt(-d). In the second case
+        # (a0 - n)/2 = -a1^2/(4d) is the square, which swaps x0 and x1.
+        s = base.sqrt(d)
+        t = a1 * base.inv0(2*s % p) % p
+        if s*s % p == d:
+            return (s, t)
+        return (t, s)
+
+
+class SvdwMap(object):
+    """
+    The Shallue-van de Woestijne map onto y^2 = x^3 + A*x + B (RFC 9380,
+    section 6.6.1).
+    """
+    def __init__(self, field, A, B, Z=None):
+        """
+        Prepares the map for the curve with coefficients @A,@B (elements of
+        @field). If @Z is not given, the first suitable value from the
+        sequence 1, -1, 2, -2, ... (and i, -i, 1+i, ... for Fp2) is used.
+        """
+        self.field = field
+        self.A, self.B = A, B
+        self.Z = Z if Z is not None else self._findZ()
+
+        F, Z = field, self.Z
+        gZ = self.g(Z)
+        three = F.fromInt(3)
+        four = F.fromInt(4)
+
+        # h = 3Z^2 + 4A
+        h = F.add(F.mul(three, F.sqr(Z)), F.mul(four, A))
+        self.c1 = gZ
+        self.c2 = F.neg(F.mul(Z, F.inv0(F.fromInt(2))))
+        c3 = F.sqrt(F.neg(F.mul(gZ, h)))
+        self.c3 = F.neg(c3) if F.sgn0(c3) else c3
+        self.c4 = F.neg(F.mul(F.mul(four, gZ), F.inv0(h)))
+
+
+    def g(self, x):
+        """
+        Computes the curve's right-hand side x^3 + A*x + B.
+        """
+        F = self.field
+        return F.add(F.mul(F.add(F.sqr(x), self.A), x), self.B)
+
+
+    def map(self, u):
+        """
+        Maps the field element @u to a point (x,y) on the curve.
+        """
+        F = self.field
+
+        tv1 = F.mul(F.sqr(u), self.c1)
+        tv2 = F.add(F.one, tv1)
+        tv1 = F.sub(F.one, tv1)
+        tv3 = F.inv0(F.mul(tv1, tv2))
+        tv4 = F.mul(F.mul(F.mul(u, tv1), tv3), self.c3)
+
+        x1 = F.sub(self.c2, tv4)
+        x2 = F.add(self.c2, tv4)
+        x3 = F.add(F.mul(F.sqr(F.mul(F.sqr(tv2), tv3)), self.c4), self.Z)
+
+        # Evaluate both candidates before choosing so the sequence of
+        # operations does not depend on the input.
+        e1 = F.isSquare(self.g(x1))
+        e2 = F.isSquare(self.g(x2)) and not e1
+        x = (x3, x1, x2)[e1 + 2*e2]
+
+        y = F.sqrt(self.g(x))
+        if F.sgn0(u) != F.sgn0(y):
+            y = F.neg(y)
+        return x, y
+
+
+    def _findZ(self):
+        """
+        Finds a value Z that meets the criteria of RFC 9380, appendix H.1.
+        """
+        F = self.field
+        three, four = F.fromInt(3), F.fromInt(4)
+
+        for Z in _candidates(F):
+            gZ = self.g(Z)
+            h = F.add(F.mul(three, F.sqr(Z)), F.mul(four, self.A))
+            if gZ == F.zero or h == F.zero:
+                continue
+
+            # -(3Z^2 + 4A)/(4g(Z)) must be a non-zero square
+            if not F.isSquare(F.neg(F.mul(h, F.inv0(F.mul(four, gZ))))):
+                continue
+
+            # At least one of g(Z) and g(-Z/2) must be square.
+            if F.isSquare(gZ) or \
+                F.isSquare(self.g(F.neg(F.mul(Z, F.inv0(F.fromInt(2)))))):
+                return Z
+
+        raise ValueError("Could not find a suitable Z for the SvdW map")
+
+
+def _candidates(F, limit=64):
+    """
+    Generates the sequence of Z candidates for field @F.
+    """
+    for k in range(1, limit):
+        for sign in (1, -1):
+            yield F.fromInt(sign*k)
+
+    if F.degree == 2:
+        for k in range(1, limit):
+            for a0 in range(0, k+1):
+                for s0 in (1, -1):
+                    for s1 in (1, -1):
+                        yield F.fromCoefficients((s0*a0, s1*k))
+
+
+def expandMessageXmd(msg, dst, length, alg=hashlib.sha256):
+    """
+    Expands @msg into @length pseudorandom bytes under the domain separation
+    tag @dst (RFC 9380, section 5.3.1).
+    """
+    blockSize = alg().block_size
+    digestSize = alg().digest_size
+    ell = (length + digestSize - 1) // digestSize
+    if ell > 255 or length > 65535 or len(dst) > 255:
+        raise ValueError("Requested expansion is too long")
+
+    dstPrime = dst + chr(len(dst))
+    b0 = alg("\0"*blockSize + msg + struct.pack(">H", length) + "\0" +
+        dstPrime).digest()
+    bi = alg(b0 + "\1" + dstPrime).digest()
+    out = [bi]
+
+    # b_i = H(strxor(b_0, b_(i-1)) || i || DST')
+    x0 = longFromString(b0)
+    for i in range(2, ell+1):
+        x = binascii.unhexlify(format(x0 ^ longFromString(bi), "x").
+            zfill(2*digestSize))
+        bi = alg(x + chr(i) + dstPrime).digest()
+        out.append(bi)
+    return "".join(out)[:length]
+
+
+def hashToField(msg, dst, count, field, securityBits=128):
+    """
+    Hashes @msg into @count elements of @field (RFC 9380, section 5.2).
+    """
+    L = (field.p.bit_length() + securityBits + 7) // 8
+    b = expandMessageXmd(msg, dst, count*field.degree*L)
+
+    result = []
+    for i in range(count):
+        coefficients = []
+        for j in range(field.degree):
+            offset = L*(j + i*field.degree)
+            coefficients.append(longFromString(b[offset:offset+L]))
+        result.append(field.fromCoefficients(coefficients))
+    return result
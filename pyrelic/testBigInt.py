@@ -1,7 +1,7 @@
 #!/usr/bin/eval python
 
 from testcommon import *
-import unittest, random
+import pickle, unittest, random
 from bi import *
 from relic import *
 
@@ -107,6 +107,22 @@ class BigIntTests(unittest.TestCase):
             l = long(b)
             self.assertTrue( l <= maxValue )
 
+    def testSerializeZ(self):
+        # BigInts and Python integers serialize to the same bytes.
+        for x in [0, 1, 255, 256, long(randomZ())]:
+            b = serializeZ(x)
+            self.assertEqual(b, serializeZ(BigInt(x)))
+            self.assertEqual(x, long(deserializeZ(b)))
+
+        self.assertEqual("", serializeZ(0))
+        self.assertEqual("\0\0\1\0", serializeZ(256, 4))
+        self.assertRaises(ValueError, serializeZ, 2**32, 4)
+
+    def testPickle(self):
+        for x in [1, -5, long(randomZ()), -long(randomZ())]:
+            y = pickle.loads(pickle.dumps(BigInt(x), pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(x, long(y) if y.sign == 0 else -long(y))
+
 
 # Run!
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest, threading
+from unittest import TestCase
+from cache import *
+import cache
+
+
+class LruCacheTests(TestCase):
+    """
+    Tests for the sharded LRU cache.
+    """
+    def testGetPut(self):
+        c = LruCache(10)
+        self.assertEqual(None, c.get("a"))
+        c.put("a", 1)
+        self.assertEqual(1, c.get("a"))
+        self.assertTrue("a" in c)
+        self.assertEqual(1, len(c))
+
+
+    def testEvictLeastRecent(self):
+        """
+        With a single shard, the least recently used entry is evicted first.
+        """
+        c = LruCache(3, shards=1)
+        for k in "abc":
+            c.put(k, k)
+
+        # Touch "a" so that "b" is now the oldest
+        c.get("a")
+        c.put("d", "d")
+
+        self.assertFalse("b" in c)
+        for k in "acd":
+            self.assertTrue(k in c)
+        self.assertEqual(1, c.stats()["evictions"])
+
+
+    def testBounded(self, n=1000):
+        c = LruCache(100, shards=8)
+        for i in range(n):
+            c.put(i, i)
+        self.assertTrue(len(c) <= 104)
+
+
+    def testGetOrCompute(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            return "value"
+
+        c = LruCache()
+        self.assertEqual("value", c.getOrCompute("k", compute))
+        self.assertEqual("value", c.getOrCompute("k", compute))
+        self.assertEqual(1, len(calls))
+
+        # None is cached like any other value
+        c.getOrCompute("none", lambda: None)
+        self.assertEqual(None, c.getOrCompute("none", compute))
+        self.assertEqual(1, len(calls))
+
+
+    def testInvalidate(self):
+        c = LruCache()
+        c.put("a", 1)
+        self.assertTrue(c.invalidate("a"))
+        self.assertFalse(c.invalidate("a"))
+        self.assertFalse("a" in c)
+
+        c.put("b", 2)
+        c.clear()
+        self.assertEqual(0, len(c))
+
+
+    def testStats(self):
+        c = LruCache()
+        c.put("a", 1)
+        c.get("a")
+        c.get("a")
+        c.get("b")
+        stats = c.stats()
+        self.assertEqual(2, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertAlmostEqual(2/3.0, stats["hitRate"])
+        self.assertEqual(1, stats["size"])
+
+
+    def testThreads(self, threads=8, n=2000):
+        """
+        Concurrent access leaves the cache bounded and the metrics consistent.
+        """
+        c = LruCache(64)
+        def worker(offset):
+            for i in range(n):
+                c.getOrCompute((offset + i) % 100, lambda: i)
+
+        workers = [threading.Thread(target=worker, args=(k,)) 
+            for k in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        stats = c.stats()
+        self.assertEqual(threads*n, stats["hits"] + stats["misses"])
+        self.assertTrue(len(c) <= 64)
+
+
+class LruCacheExpiryTests(TestCase):
+    """
+    Tests for entry lifetimes and the eviction callback.
+    """
+    def setUp(self):
+        self.evicted = []
+        self.now = 1000.0
+        self.time = cache.time.time
+        cache.time.time = lambda: self.now
+
+
+    def tearDown(self):
+        cache.time.time = self.time
+
+
+    def onEvict(self, key, value):
+        self.evicted.append((key, value))
+
+
+    def testExpire(self):
+        c = LruCache(ttl=10, onEvict=self.onEvict)
+        c.put("a", 1)
+        self.now += 5
+        self.assertEqual(1, c.get("a"))
+
+        self.now += 6
+        self.assertFalse("a" in c)
+        self.assertEqual(None, c.get("a"))
+        self.assertEqual([("a", 1)], self.evicted)
+        self.assertEqual(1, c.stats()["expirations"])
+
+
+    def testExpireAll(self):
+        c = LruCache(ttl=10)
+        c.put("a", 1)
+        self.now += 5
+        c.put("b", 2)
+        self.now += 6
+        self.assertEqual(1, c.expire())
+        self.assertEqual(1, len(c))
+        self.assertTrue("b" in c)
+
+
+    def testOnEvict(self):
+        """
+        The callback sees evicted, replaced, invalidated, and cleared entries.
+        """
+        c = LruCache(2, shards=1, onEvict=self.onEvict)
+        c.put("a", 1)
+        c.put("b", 2)
+        c.put("c", 3)
+        c.put("b", 4)
+        c.invalidate("c")
+        c.clear()
+        self.assertEqual([("a", 1), ("b", 2), ("c", 3), ("b", 4)], 
+            self.evicted)
+
+
+    def testConcurrentCompute(self):
+        """
+        When two misses on a key race, the value stored first is kept and the
+        other is dropped without calling the callback.
+        """
+        c = LruCache(ttl=10, onEvict=self.onEvict)
+        def compute():
+            # Another thread stores its value while this one computes.
+            self.assertEqual("first", c.getOrCompute("k", lambda: "first"))
+            return "second"
+
+        self.assertEqual("first", c.getOrCompute("k", compute))
+        self.assertEqual("first", c.get("k"))
+        self.assertEqual([], self.evicted)
+
+        # An expired value is replaced.
+        self.now += 20
+        self.assertEqual("third", c.putIfAbsent("k", "third"))
+        self.assertEqual([("k", "first")], self.evicted)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
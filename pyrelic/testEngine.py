@@ -0,0 +1,103 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from engine import *
+from engine import _operations
+from prf import getDelta, update
+from ctypes import sizeof
+from unittest import TestCase
+import unittest, vpop
+
+
+class ProcessEngineTests(TestCase):
+    """
+    Tests for the process-pool batch engine.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = ProcessEngine(processes=2)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
+
+    def setUp(self):
+        self.w, self.t = "ensemble", "tweak"
+        self.msk, self.s = randomstr(), randomstr()
+        self.xs = [vpop.blind(randomstr())[1] for _ in range(5)]
+
+
+    def testEval(self):
+        self.assertEqual(self.engine.eval(self.w, self.t, self.xs, self.msk,
+            self.s), [vpop.eval(self.w, self.t, x, self.msk, self.s)[0]
+                for x in self.xs])
+        self.assertEqual(self.engine.eval(self.w, self.t, [], self.msk,
+            self.s), [])
+
+
+    def testEvalAndProveVerify(self):
+        results = self.engine.evalAndProve(self.w, self.t, self.xs, self.msk,
+            self.s)
+        for x, (y, pi) in zip(self.xs, results):
+            self.assertTrue(vpop.verify(x, self.t, y, pi))
+
+        responses = [(x, y, pi) for x, (y, pi) in zip(self.xs, results)]
+        self.assertEqual(self.engine.verify(self.t, responses), [True]*5)
+
+        # A response for a different tweak fails.
+        self.assertEqual(self.engine.verify("other", responses[:1]), [False])
+
+
+    def testPairUpdate(self):
+        pairs = [(randomG1(), randomG2()) for _ in range(3)] + \
+            [(G1Element(), generatorG2())]
+        zs = self.engine.pair(pairs)
+        self.assertEqual(zs, [pair(P, Q) for P,Q in pairs])
+
+        delta, _ = getDelta(("w", self.msk, self.s),
+            ("w", randomstr(), randomstr()))
+        self.assertEqual(self.engine.update(zs, delta),
+            [update(z, delta) for z in zs])
+
+
+    def testRecordSizes(self):
+        """
+        Records are fixed-width and much smaller than the ctypes structures.
+        """
+        self.assertEqual(_operations["pair"].outputWidth, GT.width)
+        self.assertLess(GT.width, sizeof(GtElement))
+        self.assertRaises(ValueError, Z.write, bytearray(Z.width), 0, 2**300)
+
+        for field, x in [(G1, generatorG1()), (G2, generatorG2()),
+                (GT, generatorGt())]:
+            self.assertEqual(field.size, len(field.serialize(x)))
+
+
+    def testNegativeScalars(self):
+        """
+        Negative scalars are reduced modulo the group order.
+        """
+        P, x = randomG1(), generatorGt()**randomZ()
+        self.assertEqual(self.engine.mul([(P, -5), (P, BigInt(-5))]),
+            [P*(orderGt() - 5)]*2)
+        self.assertEqual(self.engine.exp([(x, -3)]), [x**(orderGt() - 3)])
+        self.assertTrue((self.engine.exp([(x, -3)])[0] * x**3).isUnity())
+
+
+    def testLazyImport(self):
+        """
+        Importing the engine (or the RPC executor built on it) doesn't
+        initialize RELIC.
+        """
+        import os, subprocess, sys
+        code = "import engine, rpc, relic; print relic._library is None"
+        output = subprocess.check_output([sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual("True", output.strip())
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
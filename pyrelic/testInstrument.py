@@ -0,0 +1,94 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from instrument import *
+from pbc import *
+from relic import librelic
+from unittest import TestCase
+import instrument, json, relic, threading, time, unittest
+
+
+class InstrumentTests(TestCase):
+    """
+    Tests for the instrumentation of calls into RELIC.
+    """
+    def tearDown(self):
+        disable()
+        reset()
+
+
+    def testRecording(self):
+        P, Q = randomG1(), randomG2()
+        with recording():
+            self.assertTrue(enabled())
+            for _ in range(3):
+                pair(P, Q)
+            P + P
+        self.assertFalse(enabled())
+
+        functions = snapshot()["functions"]
+        self.assertEqual(functions["pc_map_abi"]["calls"], 3)
+        self.assertEqual(sum(functions["pc_map_abi"]["histogram"]), 3)
+        self.assertEqual(functions["g1_add_abi"]["calls"], 1)
+        self.assertGreater(functions["pc_map_abi"]["seconds"],
+            functions["g1_add_abi"]["seconds"])
+
+        # Nothing is recorded while disabled, and reset clears the values.
+        pair(P, Q)
+        self.assertEqual(snapshot()["functions"]["pc_map_abi"]["calls"], 3)
+        reset()
+        self.assertEqual(snapshot()["functions"], {})
+
+
+    def testDisabledIsUnwrapped(self):
+        """
+        While disabled, librelic returns the library's own functions.
+        """
+        with recording():
+            wrapped = librelic.g1_add_abi
+        self.assertIsNot(librelic.g1_add_abi, wrapped)
+        self.assertIs(librelic.g1_add_abi, relic._library.g1_add_abi)
+
+
+    def testDisableDuringLookup(self):
+        """
+        A lookup that is wrapping a function while instrumentation is
+        disabled doesn't leave the wrapped function in place.
+        """
+        started, release = threading.Event(), threading.Event()
+        def wrapper(name, func):
+            started.set()
+            release.wait()
+            return lambda *args: func(*args)
+
+        relic.setWrapper(wrapper)
+        lookup = threading.Thread(target=getattr,
+            args=(librelic, "g1_add_abi"))
+        lookup.start()
+        started.wait()
+        stop = threading.Thread(target=disable)
+        stop.start()
+        time.sleep(0.05)
+        release.set()
+        lookup.join()
+        stop.join()
+        self.assertIs(librelic.g1_add_abi, relic._library.g1_add_abi)
+
+
+    def testReports(self):
+        with recording():
+            pair(randomG1(), randomG2())
+        text = report()
+        self.assertIn("pc_map_abi", text)
+        self.assertIn("RELIC:", text)
+        self.assertEqual(len(report(limit=1).splitlines()), 3)
+
+        data = json.loads(report("json"))
+        self.assertEqual(data["buckets"], instrument.BUCKETS)
+        self.assertEqual(data["functions"]["pc_map_abi"]["calls"], 1)
+        self.assertRaises(ValueError, report, "xml")
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest, os, shutil, struct, tempfile
+from unittest import TestCase
+from keytable import *
+from mmaphash import MmapHashTable
+import prf, vprf, vpop
+
+
+class MmapHashTableTests(TestCase):
+    """
+    Tests for the memory-mapped hash table.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "table")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def testPutGet(self, n=1000):
+        """
+        Entries survive resizing and reopening the file.
+        """
+        table = MmapHashTable(self.path, 4, 8, capacity=8)
+        for i in range(n):
+            table.put(struct.pack(">I", i), struct.pack(">Q", i*i))
+        self.assertEqual(n, len(table))
+        table.close()
+
+        table = MmapHashTable(self.path)
+        for i in range(n):
+            self.assertEqual(struct.pack(">Q", i*i), 
+                table.get(struct.pack(">I", i)))
+        self.assertEqual(None, table.get("none"))
+        self.assertEqual(n, len(list(table.items())))
+        table.close()
+
+
+    def testDelete(self):
+        table = MmapHashTable(self.path, 4, 1)
+        for i in range(100):
+            table.put(struct.pack(">I", i), "x")
+        for i in range(0, 100, 2):
+            self.assertTrue(table.delete(struct.pack(">I", i)))
+        self.assertFalse(table.delete(struct.pack(">I", 0)))
+        self.assertEqual(50, len(table))
+
+        # Deleted slots are reused and don't hide later entries
+        for i in range(100):
+            self.assertEqual(i % 2 == 1, struct.pack(">I", i) in table)
+        table.put(struct.pack(">I", 0), "y")
+        self.assertEqual("y", table.get(struct.pack(">I", 0)))
+        table.close()
+
+
+    def testSizes(self):
+        table = MmapHashTable(self.path, 4, 2)
+        self.assertRaises(ValueError, table.put, "abc", "xy")
+        self.assertRaises(ValueError, table.put, "abcd", "x")
+        table.close()
+        self.assertRaises(ValueError, MmapHashTable, self.path, 8, 2)
+
+
+class KeyTableTests(TestCase):
+    """
+    Tests for the persistent key table.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "keys")
+        self.table = KeyTable(self.path)
+
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.dir)
+
+
+    def testPutGet(self):
+        self.table.put("w", "s")
+        record = self.table.get("w")
+        self.assertEqual("s", record.s)
+        self.assertEqual(1, record.version)
+        self.assertEqual("s", self.table.state("w"))
+        self.assertEqual(None, self.table.get("x"))
+        self.assertRaises(KeyError, self.table.state, "x")
+        self.assertRaises(ValueError, self.table.put, "w", "s"*100)
+
+
+    def testRotate(self):
+        self.table.put("w", "s1")
+        record = self.table.rotate("w", "s2")
+        self.assertEqual(("s2", 2), record[:2])
+        self.assertEqual(1, self.table.rotate("new", "s").version)
+
+
+    def testBulkLoad(self, n=2000):
+        self.table.bulkLoad(("w{}".format(i), "s{}".format(i)) 
+            for i in xrange(n))
+        self.table.close()
+
+        self.table = KeyTable(self.path)
+        self.assertEqual(n, len(self.table))
+        for i in range(0, n, 97):
+            self.assertEqual("s{}".format(i), self.table.state("w{}".format(i)))
+
+
+    def testEval(self):
+        """
+        The PRFs accept a KeyTable in place of the state value.
+        """
+        w, t, m, msk = "w", "t", "m", "msk"
+        self.table.put(w, "state")
+        self.assertEqual(vprf.eval(w,t,m,msk,"state")[0], 
+            vprf.eval(w,t,m,msk,self.table)[0])
+
+        _, x = vpop.blind(m)
+        y,kw,tTilde = vpop.eval(w,t,x,msk,self.table)
+        self.assertEqual(prf.genKw(w,msk,"state"), kw)
+        self.assertRaises(KeyError, vprf.eval, "unknown",t,m,msk,self.table)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
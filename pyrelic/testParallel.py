@@ -0,0 +1,75 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from parallel import *
+from relic import initThread
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+import unittest
+
+
+class ParallelTests(TestCase):
+    """
+    Tests for thread-parallel batch operations.
+    """
+    def setUp(self):
+        self.pool = ThreadPool(4, initializer=initThread)
+
+
+    def tearDown(self):
+        self.pool.close()
+        self.pool.join()
+
+
+    def testInitThread(self):
+        """
+        The calling thread already has a context.
+        """
+        self.assertFalse(initThread())
+
+
+    def testPair(self):
+        pairs = [(randomG1(), randomG2()) for _ in range(12)]
+        self.assertEqual(parallelPair(pairs, self.pool),
+            [pair(P, Q) for P,Q in pairs])
+        self.assertEqual(parallelPair([], self.pool), [])
+
+
+    def testHash(self):
+        messages = [str(i) for i in range(20)]
+        self.assertEqual(parallelHashG1(messages, self.pool),
+            [hashG1(m) for m in messages])
+        self.assertEqual(parallelHashG2(messages, self.pool),
+            [hashG2(m) for m in messages])
+
+
+    def testMul(self):
+        P, Q, x = randomG1(), randomG2(), randomGt()
+        scalars = [randomZ(orderG1()) for _ in range(8)]
+        self.assertEqual(parallelMul([P]*8, scalars, self.pool),
+            [P*a for a in scalars])
+        self.assertEqual(parallelMul([Q]*8, scalars, self.pool),
+            [Q*a for a in scalars])
+        self.assertEqual(parallelMul([x, P], 5, self.pool), [x**5, P*5])
+        self.assertRaises(ValueError, parallelMul, [P, Q], [1], self.pool)
+
+
+    def testRandom(self):
+        """
+        Threads drawing random values concurrently get distinct values.
+        """
+        values = parallelMap(lambda _: long(randomZ(orderG1())), range(200),
+            self.pool, chunksize=1)
+        self.assertEqual(len(set(values)), len(values))
+
+
+    def testSharedPool(self):
+        self.assertIs(threadPool(), threadPool())
+        self.assertEqual(parallelMap(lambda x: x*2, range(10)),
+            range(0, 20, 2))
+        shutdown()
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
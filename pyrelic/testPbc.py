@@ -2,9 +2,10 @@
 
 from testcommon import *
 from pbc import *
+from relic import byref, initThread, librelic
 from timeit import timeit
 from unittest import TestCase, SkipTest
-import unittest
+import pickle, threading, unittest
 
 
 class PbcTests(TestCase):
@@ -120,17 +121,137 @@ class HashTestBase(TestCase):
         self.assertNotEqual(h1a, h3)
 
 
+    def testHashStream(self):
+        """
+        Streams hash the same regardless of how they are chunked, but 
+        differently from the same bytes passed as a string.
+        """
+        from StringIO import StringIO
+        m = randomstr(1000)
+
+        h1 = self.hashfunc("prefix", StringIO(m))
+        h2 = self.hashfunc("prefix", iter([m[:10], "", m[10:]]))
+        h3 = self.hashfunc("prefix", m)
+        self.assertEqual(h1, h2)
+        self.assertNotEqual(h1, h3)
+
+
+    def testHasher(self):
+        """
+        Hashing a pre-filled Hasher matches hashing its inputs directly.
+        """
+        m1, m2 = randomstr(), randomZ()
+        h = Hasher(self.domain)
+        h.absorb(m1)
+        h.absorb(m2)
+        self.assertEqual(self.hashfunc(h), self.hashfunc(m1, m2))
+
+
+    def testHashDomain(self):
+        """
+        Hashes under different domains give different results.
+        """
+        m = randomstr()
+        self.assertNotEqual(self.hashfunc(m), 
+            self.hashfunc(m, domain="Another domain"))
+
+
+    def testHashBoundaries(self):
+        """
+        Arguments are length-prefixed so their boundaries matter.
+        """
+        self.assertNotEqual(self.hashfunc("ab", "c"), self.hashfunc("a", "bc"))
+        self.assertNotEqual(self.hashfunc("1"), self.hashfunc(1))
+
+
+    def testHashLegacy(self):
+        """
+        Legacy mode hashes the string representation of the arguments.
+        """
+        m1, m2 = randomstr(), 42
+        h1 = self.hashfunc(m1, m2, legacy=True)
+        self.assertNotEqual(h1, self.hashfunc(m1, m2))
+
+        setLegacyHash()
+        try:
+            self.assertTrue(isLegacyHash())
+            self.assertEqual(h1, self.hashfunc(m1, m2))
+        finally:
+            setLegacyHash(False)
+
+
 class PbcHashG1Test(HashTestBase):
     def setUp(self):
         self.hashfunc = hashG1
         self.expectedType = G1Element
+        self.domain = HASH_G1_DOMAIN
 
 
 class PbcHashG2Test(HashTestBase):
     def setUp(self):
         self.hashfunc = hashG2
         self.expectedType = G2Element
+        self.domain = HASH_G2_DOMAIN
+
+
+
+class HashAlgorithmTests(TestCase):
+    """
+    Tests for the selectable hash-to-curve algorithms.
+    """
+    def tearDown(self):
+        setHashAlgorithm(HASH_RELIC, HASH_RELIC)
+
+
+    def assertInGroup(self, P, order, relicMultiply):
+        """
+        Ensures that @P*order is the identity (without reducing the scalar).
+        """
+        R = type(P)()
+        relicMultiply(byref(R), byref(P), byref(order))
+        self.assertFalse(P.isIdentity())
+        self.assertTrue(R.isIdentity())
+
+
+    def testAlgorithms(self):
+        """
+        Each algorithm hashes deterministically into G1 and G2, and different
+        algorithms give different results.
+        """
+        seen = set()
+        for alg in hashAlgorithms():
+            for i in range(5):
+                P = hashG1(i, algorithm=alg)
+                Q = hashG2(i, algorithm=alg)
+                self.assertInGroup(P, orderG1(), librelic.g1_mul_abi)
+                self.assertInGroup(Q, orderG2(), librelic.g2_mul_abi)
+                self.assertEqual(P, hashG1(i, algorithm=alg))
+                self.assertEqual(Q, hashG2(i, algorithm=alg))
+                seen.add(str(serializeG1(P)))
+                seen.add(str(serializeG2(Q)))
+
+        self.assertEqual(len(seen), 10*len(hashAlgorithms()))
+
+
+    def testSetHashAlgorithm(self):
+        """
+        The selected algorithm is used by default.
+        """
+        setHashAlgorithm(g2=HASH_SVDW)
+        self.assertEqual(hashG1("x"), hashG1("x", algorithm=HASH_RELIC))
+        self.assertEqual(hashG2("x"), hashG2("x", algorithm=HASH_SVDW))
+        self.assertNotEqual(hashG2("x"), hashG2("x", algorithm=HASH_RELIC))
+        self.assertRaises(ValueError, setHashAlgorithm, "no such algorithm")
+        self.assertRaises(ValueError, hashG1, "x", algorithm="no such")
+
 
+    def testRegister(self):
+        """
+        Registered algorithms can be selected by name.
+        """
+        P = randomG1()
+        registerHashAlgorithm("constant", lambda msg, elementType: P)
+        self.assertEqual(P, hashG1("x", algorithm="constant"))
 
 
 import base64
@@ -244,6 +365,196 @@ class GtSerializeTests(PbcSerialBase):
         self.deserialize = deserializeGt
 
 
+class ValidationTests(TestCase):
+    """
+    Tests for group membership checks on deserialized elements.
+    """
+    def setUp(self):
+        self.P, self.Q = randomG1(), randomG2()
+        self.x = pair(self.P, self.Q)
+
+        # A point on the curve y^2 = x^3 + b that is not in G1.
+        b = bytearray(serializeG1(self.P, False))
+        b[-1] ^= 1
+        self.badG1 = str(b)
+
+        # A point on the twist that is not in G2.
+        import pbc
+        mapper, dst = pbc._svdwMap(G2Element)
+        u = svdw.hashToField("twist", dst, 1, mapper.field)[0]
+        self.badG2 = serializeG2(pbc._fromAffine(G2Element, *mapper.map(u)))
+
+        # An element of the cyclotomic subgroup of Fp12 that is not in Gt.
+        y, z = GtElement(), GtElement()
+        librelic.fp12_rand(byref(y))
+        librelic.fp12_conv_cyc(byref(z), byref(y))
+        self.badGt = serializeGt(z)
+
+
+    def testIsValid(self):
+        for x in [self.P, self.Q, self.x, generatorG1(), generatorG2(), 
+                generatorGt()]:
+            self.assertTrue(isValid(x))
+
+        self.assertFalse(isValid(deserializeG1(self.badG1, False)))
+        self.assertFalse(isValid(deserializeG2(self.badG2)))
+        self.assertFalse(isValid(deserializeGt(self.badGt)))
+
+
+    def testPolicies(self):
+        # Validation is off by default.
+        deserializeG2(self.badG2)
+        self.assertRaises(ValueError, deserializeG2, self.badG2, 
+            validate=VALIDATE_ELEMENT)
+        self.assertEqual(deserializeG2(serializeG2(self.Q), 
+            validate=VALIDATE_ELEMENT), self.Q)
+
+        with validation(VALIDATE_ELEMENT):
+            self.assertEqual(validationPolicy(), VALIDATE_ELEMENT)
+            self.assertRaises(ValueError, deserializeGt, self.badGt)
+
+            # Per-call policies override the block.
+            deserializeGt(self.badGt, validate=VALIDATE_OFF)
+        self.assertEqual(validationPolicy(), VALIDATE_OFF)
+
+        self.assertRaises(ValueError, setValidationPolicy, VALIDATE_BATCH)
+        self.assertRaises(ValueError, validation, "everything")
+        self.assertRaises(ValueError, deserializeG1, serializeG1(self.P), 
+            validate=VALIDATE_BATCH)
+
+
+    def testMalformed(self):
+        """
+        Malformed encodings are rejected when validation is enabled.
+        """
+        for serialize, deserialize, x in [(serializeG1, deserializeG1, 
+                self.P), (serializeG2, deserializeG2, self.Q), 
+                (serializeGt, deserializeGt, self.x)]:
+            for compressed in [True, False]:
+                b = serialize(x, compressed)
+                for bad in [b[:-1], "\xff"*len(b)]:
+                    self.assertRaises(ValueError, deserialize, bad, 
+                        compressed, VALIDATE_ELEMENT)
+                    deserialize(bad, compressed, VALIDATE_OFF)
+                self.assertEqual(x, deserialize(b, compressed, 
+                    VALIDATE_ELEMENT))
+
+
+    def testMalformedThreads(self, n=200):
+        """
+        Concurrent deserializations do not see each other's errors.
+        """
+        good, bad = serializeG1(self.P), "\xff"*len(serializeG1(self.P))
+        errors = []
+        def worker(b, expectValid):
+            initThread()
+            for _ in range(n):
+                try:
+                    deserializeG1(b, validate=VALIDATE_ELEMENT)
+                    valid = True
+                except ValueError:
+                    valid = False
+                if valid != expectValid:
+                    errors.append(b)
+
+        threads = [threading.Thread(target=worker, args=args) 
+            for args in [(good, True), (bad, False)]*2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors)
+
+
+    def testBatch(self):
+        values = [(deserializeG1, serializeG1(randomG1())) for _ in range(3)]+\
+            [(deserializeG2, serializeG2(randomG2())) for _ in range(3)] + \
+            [(deserializeGt, serializeGt(self.x**randomZ())) 
+                for _ in range(3)]
+
+        with validation(VALIDATE_BATCH) as batch:
+            for deserialize, b in values:
+                deserialize(b)
+        self.assertEqual(len(batch), len(values))
+
+        for deserialize, bad in [(deserializeG2, self.badG2), 
+                (deserializeGt, self.badGt)]:
+            with self.assertRaises(ValueError):
+                with validation(VALIDATE_BATCH):
+                    for d, b in values:
+                        d(b)
+                    deserialize(bad)
+
+        with self.assertRaises(ValueError):
+            with validation(VALIDATE_BATCH):
+                deserializeG1(self.badG1, False)
+
+
+    def testBatchRounds(self):
+        """
+        With 3-bit coefficients, each combination misses an invalid element
+        with probability at most 1/8.
+        """
+        import pbc
+        self.assertEqual(pbc._batchRounds(64), 22)
+        self.assertEqual(pbc._batchRounds(3), 1)
+
+
+class PickleTests(TestCase):
+    """
+    Tests for pickling group elements.
+    """
+    def testRoundTrip(self):
+        P, Q = randomG1(), randomG2()
+        x = pair(P, Q)
+        for value in [P, Q, x, G1Element(), generatorG2(), generatorGt()]:
+            for protocol in [0, pickle.HIGHEST_PROTOCOL]:
+                self.assertEqual(pickle.loads(pickle.dumps(value, protocol)),
+                    value)
+
+        # Precomputation tables are not pickled.
+        Q*randomZ()
+        self.assertIsNone(pickle.loads(pickle.dumps(Q))._table)
+
+
+    def testCompact(self):
+        x = pair(randomG1(), randomG2())
+        self.assertLess(len(pickle.dumps(x, pickle.HIGHEST_PROTOCOL)), 
+            len(serializeGt(x)) + 100)
+
+
+class BackendTests(TestCase):
+    """
+    Tests for the FFI backends (see relic.BACKEND).
+    """
+    def testBackendsAgree(self):
+        """
+        Both backends compute the same values. The backend is selected at
+        import, so the other one runs in a child process.
+        """
+        try:
+            import cffi
+        except ImportError:
+            raise SkipTest("cffi is not installed")
+
+        import os, subprocess, sys
+        P, Q, a = randomG1(), randomG2(), randomZ()
+        code = "\n".join(["from pbc import *", "import sys",
+            "P, Q = deserializeG1(sys.argv[1].decode('hex')), "\
+                "deserializeG2(sys.argv[2].decode('hex'))",
+            "a = BigInt(long(sys.argv[3]))",
+            "x = pair(P*a, Q) * pair(P, Q*a)",
+            "print str(serializeGt(x)).encode('hex')"])
+        for backend in ["ctypes", "cffi"]:
+            output = subprocess.check_output([sys.executable, "-c", code,
+                str(serializeG1(P)).encode("hex"),
+                str(serializeG2(Q)).encode("hex"), str(long(a))],
+                env=dict(os.environ, PYRELIC_BACKEND=backend),
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+            self.assertEqual(deserializeGt(output.strip().decode("hex")),
+                pair(P, Q)**(2*long(a)))
+
+
 # Run!
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest, itertools, time
+from unittest import TestCase
+from pool import *
+import os, prf, relic, vprf, vpop
+
+
+def waitFull(pool, timeout=10):
+    """
+    Waits until @pool has been filled.
+    """
+    deadline = time.time() + timeout
+    while not pool._queue.full() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class PoolTests(TestCase):
+    """
+    Tests for background-refilled pools.
+    """
+    def testSingleUse(self, n=100):
+        """
+        Items are never handed out twice.
+        """
+        counter = itertools.count()
+        pool = Pool(lambda: next(counter), size=8)
+        waitFull(pool)
+        items = [pool.take() for _ in range(n)]
+        pool.stop()
+        self.assertEqual(n, len(set(items)))
+
+        stats = pool.stats()
+        self.assertEqual(n, stats["hits"] + stats["misses"])
+        self.assertTrue(stats["hits"] >= 8)
+
+
+    def testEmpty(self):
+        """
+        An empty pool computes items inline.
+        """
+        pool = Pool(lambda: "x", size=1)
+        pool.stop()
+        while not pool._queue.empty():
+            pool._queue.get()
+        self.assertEqual("x", pool.take())
+        self.assertEqual(1, pool.stats()["misses"])
+
+
+    def testRandomScalar(self, n=100):
+        randomNoRepeat(lambda: randomScalar(orderG1()), n)
+        for _ in range(n):
+            self.assertTrue(long(randomScalar(orderG1())) < long(orderG1()))
+
+
+    def testNonces(self):
+        """
+        Nonce pools produce matching pairs in both modes and groups.
+        """
+        for mode in [THREAD, PROCESS]:
+            for group, g in [(G1Element, generatorG1()), 
+                    (GtElement, generatorGt())]:
+                pool = NoncePool(group, size=4, mode=mode)
+                waitFull(pool)
+                for _ in range(6):
+                    v, t = pool.take()
+                    self.assertEqual(g*v if group is G1Element else g**v, t)
+                self.assertTrue(pool.stats()["hits"] > 0)
+                pool.stop()
+
+
+    def testProcessReseed(self, n=16):
+        """
+        Nonces from a process pool don't repeat those of the parent.
+        """
+        pool = NoncePool(G1Element, size=n, mode=PROCESS)
+        waitFull(pool)
+        randomNoRepeat(lambda: pool.take()[0], n)
+        pool.stop()
+
+
+    def testAfterFork(self, n=8):
+        """
+        A forked child that calls after_fork doesn't hand out its parent's
+        items.
+        """
+        pool = Pool(lambda: os.urandom(16), size=n)
+        waitFull(pool)
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                relic.after_fork()
+                os.write(w, "".join(pool.take() for _ in range(n)))
+            finally:
+                os._exit(0)
+
+        os.close(w)
+        child = os.read(r, 16*n)
+        os.close(r)
+        os.waitpid(pid, 0)
+        parent = set(pool.take() for _ in range(n))
+        pool.stop()
+
+        self.assertEqual(len(child), 16*n)
+        self.assertFalse(parent & set(child[i:i+16]
+            for i in range(0, len(child), 16)))
+
+
+    def testProofs(self):
+        """
+        Proofs are valid when the nonce pool is enabled.
+        """
+        for mode in [THREAD, PROCESS]:
+            pool = prf.enableNoncePool(size=4, mode=mode)
+            waitFull(pool)
+            try:
+                y,kw,beta = vprf.eval("w","t","m","msk","s")
+                for _ in range(6):
+                    pi = vprf.prove("m", beta, kw, y)
+                    self.assertTrue(vprf.verify("m", "t", y, pi))
+
+                _, x = vpop.blind("m")
+                y,kw,tTilde = vpop.eval("w","t",x,"msk","s")
+                pi = vpop.prove(x, tTilde, kw, y)
+                self.assertTrue(vpop.verify(x, "t", y, pi))
+            finally:
+                prf.disableNoncePool()
+
+
+class BlindingPoolTests(TestCase):
+    """
+    Tests for the client-side pool of blinding factors.
+    """
+    def tearDown(self):
+        vpop.disableBlindingPool()
+
+
+    def testFactors(self):
+        for mode in [THREAD, PROCESS]:
+            pool = BlindingPool(size=4, mode=mode)
+            waitFull(pool)
+            for _ in range(6):
+                r, rInv = pool.take()
+                self.assertEqual(1, long((r*rInv) % orderGt()))
+            pool.stop()
+
+
+    def testSingleUse(self, n=20):
+        pool = vpop.enableBlindingPool(size=n)
+        waitFull(pool)
+        randomNoRepeat(lambda: vpop.blind("m")[1], n)
+        self.assertEqual(n, pool.stats()["hits"])
+
+
+    def testProtocol(self):
+        """
+        Blinding with pooled factors gives the same PRF output.
+        """
+        def run():
+            r, x = vpop.blind("m")
+            y,_,_ = vpop.eval("w","t",x,"msk","s")
+            return vpop.deblind(r, y)
+
+        expected = run()
+        for mode in [THREAD, PROCESS]:
+            waitFull(vpop.enableBlindingPool(size=2, mode=mode))
+            for _ in range(3):
+                self.assertEqual(expected, run())
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
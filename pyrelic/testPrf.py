@@ -0,0 +1,120 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest
+from unittest import TestCase
+from prf import *
+import bls, vprf, vpop
+
+w = "Some super-secret ensemble key selector"
+t = "Totally random and unpredictable tweak"
+m = "This is a secret message"
+msk = "lkjasdf;lkjas;dlkfa;slkdf;laskdjf"
+s = "Super secret table value"
+
+
+class KeyCacheTests(TestCase):
+    """
+    Tests for per-ensemble key material and the key cache.
+    """
+    def tearDown(self):
+        disableKeyCache()
+
+
+    def testPubkeys(self):
+        """
+        Memoized pubkeys match direct computation for BigInt and long keys.
+        """
+        kw = randomZ(orderGt())
+        for k in [kw, long(kw)]:
+            self.assertEqual(generatorG1()*k, pubkeyG1(k))
+            self.assertEqual(generatorG2()*k, pubkeyG2(k))
+            self.assertEqual(generatorGt()**k, pubkeyGt(k))
+        self.assertTrue(pubkeyG1(kw) is pubkeyG1(kw))
+
+
+    def testKeyMaterial(self):
+        key = KeyMaterial(w, msk, s)
+        self.assertEqual(genKw(w, msk, s), key.kw)
+        self.assertEqual(long(key.kw), key.kwLong)
+        self.assertEqual(str(serializeG2(generatorG2()*key.kw)),
+            key.serializedPubkey(G2Element))
+        self.assertEqual(str(serializeG1(key.pubkeyG1(), False)),
+            key.serializedPubkey(G1Element, False))
+
+
+    def testCached(self):
+        cache = enableKeyCache()
+        self.assertEqual(genKw(w, msk, s), getKw(w, msk, s))
+        self.assertEqual(getKw(w, msk, s), getKw(w, msk, s))
+        self.assertEqual(2, cache.stats()["hits"])
+
+        # Callers get their own copy of the key, but share its pubkeys.
+        self.assertFalse(getKw(w, msk, s) is getKw(w, msk, s))
+        self.assertTrue(pubkeyG1(getKw(w, msk, s)) is
+            pubkeyG1(getKw(w, msk, s)))
+
+        # Different ensembles, states, and master keys are separate.
+        self.assertNotEqual(getKw(w, msk, s), getKw(w, msk, s + "'"))
+        self.assertNotEqual(getKw(w, msk, s), getKw(w, msk + "'", s))
+        self.assertTrue(invalidateKey(w, msk, s))
+        self.assertFalse(invalidateKey(w, msk, s))
+
+
+    def testZeroize(self):
+        """
+        Evicted key material is overwritten when zeroization is enabled, but
+        keys and pubkeys already handed out are not.
+        """
+        enableKeyCache(maxsize=1, zeroize=True)
+        key = getKeyMaterial(w, msk, s)
+        kw, p = key.kw, key.pubkeyG1()
+        expected = genKw(w, msk, s)
+        getKw(w, msk, s + "'")
+
+        self.assertEqual(0, long(key._kw))
+        self.assertEqual(0, key.kwLong)
+        self.assertEqual(expected, kw)
+        self.assertEqual(generatorG1()*expected, p)
+
+
+    def testEvictedKeyInUse(self):
+        """
+        A proof that is in progress when its key is evicted is still valid.
+        """
+        enableKeyCache(maxsize=1, shards=1, zeroize=True)
+        r, x = vpop.blind(m)
+        y,kw,tTilde = vpop.eval(w,t,x,msk,s)
+        pi = vpop.prove(x, tTilde, kw, y)
+        self.assertTrue(vpop.verify(x, t, y, pi))
+
+        vpop.eval(w + "'",t,x,msk,s)
+        self.assertEqual(genKw(w, msk, s), kw)
+        self.assertTrue(vpop.verify(x, t, y, pi))
+        self.assertTrue(vpop.verify(x, t, y, vpop.prove(x, tTilde, kw, y)))
+
+
+    def testProtocols(self):
+        """
+        The PRFs give the same results and valid proofs with the cache.
+        """
+        for prf in [bls, vprf]:
+            expected = prf.eval(w,t,m,msk,s)[0]
+            enableKeyCache()
+            for _ in range(2):
+                y,kw,beta = prf.eval(w,t,m,msk,s)
+                self.assertEqual(expected, y)
+                pi = prf.prove(m, beta if prf is vprf else t, kw, y)
+                self.assertTrue(prf.verify(m, t, y, pi))
+            disableKeyCache()
+
+        enableKeyCache()
+        r, x = vpop.blind(m)
+        for _ in range(2):
+            y,kw,tTilde = vpop.eval(w,t,x,msk,s)
+            pi = vpop.prove(x, tTilde, kw, y)
+            self.assertTrue(vpop.verify(x, t, y, pi))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
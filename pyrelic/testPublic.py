@@ -0,0 +1,84 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest
+from unittest import TestCase
+from public import *
+import public, vprf, vpop
+
+
+class PublicTests(TestCase):
+    """
+    Tests for the variable-time operations on public data.
+    """
+    def tearDown(self):
+        setFastPath(True)
+
+
+    def testMulSimG1(self, n=10):
+        for _ in range(n):
+            P, Q = randomG1(), randomG1()
+            a, b = randomZ(orderG1()), randomZ(orderG1())
+            self.assertEqual(P*a + Q*b, mulSimG1(P, a, Q, b))
+            self.assertEqual(generatorG1()*a + Q*b, 
+                mulSimG1(generatorG1(), a, Q, b))
+
+
+    def testExpSimGt(self, n=5):
+        for _ in range(n):
+            x, y = randomGt(), randomGt()
+            a, b = randomZ(orderGt()), randomZ(orderGt())
+            self.assertEqual(x**a * y**b, expSimGt(x, a, y, b))
+
+
+    def testEdgeCases(self):
+        """
+        Zero, small, large, and negative scalars.
+        """
+        x, y = randomGt(), randomGt()
+        n = long(orderGt())
+        self.assertTrue(expSimGt(x, 0, y, 0).isUnity())
+        self.assertEqual(x, expSimGt(x, 1, y, 0))
+        self.assertEqual(y**5, expSimGt(x, n, y, 5))
+        self.assertEqual(x**(n-3), expSimGt(x, -3, y, 0))
+        self.assertEqual(x**(n-3), expSimGt(x, BigInt(-3), y, 0))
+
+        P, Q = randomG1(), randomG1()
+        self.assertTrue(mulSimG1(P, 0, Q, 0).isIdentity())
+        self.assertEqual(P*(n-1), mulSimG1(P, -1, Q, n))
+
+
+    def testSlidingWindow(self, n=100):
+        for w in [1, 3, 4, 5]:
+            for _ in range(n):
+                e = long(randomZ())
+                digits = public._slidingWindow(e, w)
+                self.assertEqual(e, sum(d << i for i,d in digits.items()))
+                for d in digits.values():
+                    self.assertTrue(d % 2 == 1 and d < 2**w)
+
+
+    def testVerify(self):
+        """
+        Proofs verify the same way with and without the fast path.
+        """
+        _, x = vpop.blind("m")
+        y,kw,tTilde = vpop.eval("w","t",x,"msk","s")
+        pi = vpop.prove(x, tTilde, kw, y)
+        badPi = (pi[0], pi[1], pi[2] + 1)
+
+        for enabled in [True, False]:
+            setFastPath(enabled)
+            self.assertEqual(enabled, isFastPath())
+            self.assertTrue(vpop.verify(x, "t", y, pi))
+            self.assertFalse(vpop.verify(x, "t", y, badPi, errorOnFail=False))
+
+        y,kw,beta = vprf.eval("w","t","m","msk","s")
+        pi = vprf.prove("m", beta, kw, y)
+        for enabled in [True, False]:
+            setFastPath(enabled)
+            self.assertTrue(vprf.verify("m", "t", y, pi))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
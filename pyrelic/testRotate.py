@@ -0,0 +1,123 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from rotate import *
+from engine import ProcessEngine
+from pbc import *
+from prf import getDelta, unwrapGt, update, wrap
+from unittest import TestCase
+import json, os, shutil, tempfile, unittest
+
+
+class _FailingExecutor(object):
+    """
+    Updates values in-process and fails after @batches batches.
+    """
+    def __init__(self, batches):
+        self.batches = batches
+
+
+    def update(self, zs, delta):
+        if self.batches == 0:
+            raise IOError("interrupted")
+        self.batches -= 1
+        return [update(z, delta) for z in zs]
+
+
+class RotateTests(TestCase):
+    """
+    Tests for the streaming key rotation pipeline.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = ProcessEngine(processes=2)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, "input")
+        self.output = os.path.join(self.directory, "output")
+        self.checkpoint = os.path.join(self.directory, "checkpoint")
+
+        self.zs = [pair(randomG1(), randomG2()) for _ in range(23)]
+        with open(self.input, "w") as f:
+            f.write("".join(wrap(z) + "\n" for z in self.zs))
+        self.delta, _ = getDelta(("w", randomstr(), randomstr()),
+            ("w", randomstr(), randomstr()))
+        self.expected = [update(z, self.delta) for z in self.zs]
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def outputs(self):
+        with open(self.output) as f:
+            return [unwrapGt(line.strip()) for line in f]
+
+
+    def testRotateFile(self):
+        reports = []
+        progress = rotate(self.input, self.output, self.delta, self.engine,
+            batchSize=5, report=reports.append)
+        self.assertEqual(self.outputs(), self.expected)
+        self.assertEqual([p.records for p in reports], [5, 10, 15, 20, 23])
+        self.assertEqual(progress.records, 23)
+
+
+    def testRotateIterable(self):
+        rotate((wrap(z) for z in self.zs), self.output, self.delta,
+            self.engine, batchSize=7)
+        self.assertEqual(self.outputs(), self.expected)
+
+
+    def testResume(self):
+        """
+        An interrupted rotation resumes after its last completed batch,
+        discarding any partial output.
+        """
+        for source in [self.input, [wrap(z) for z in self.zs]]:
+            self.assertRaises(IOError, rotate, source, self.output,
+                self.delta, _FailingExecutor(2), 4, self.checkpoint)
+            with open(self.checkpoint) as f:
+                self.assertEqual(json.load(f)["records"], 8)
+            with open(self.output, "a") as f:
+                f.write("partial")
+
+            progress = rotate(source, self.output, self.delta, self.engine,
+                4, self.checkpoint)
+            self.assertEqual(progress.records, 23)
+            self.assertEqual(self.outputs(), self.expected)
+
+            # A completed rotation is not repeated.
+            rotate(source, self.output, self.delta, _FailingExecutor(0), 4,
+                self.checkpoint)
+            self.assertEqual(self.outputs(), self.expected)
+            os.remove(self.checkpoint)
+
+
+    def testResumeMismatch(self):
+        """
+        A checkpoint is not resumed with a different delta or source, or
+        without its output.
+        """
+        self.assertRaises(IOError, rotate, self.input, self.output,
+            self.delta, _FailingExecutor(1), 4, self.checkpoint)
+        self.assertRaises(ValueError, rotate, self.input, self.output,
+            self.delta + 1, self.engine, 4, self.checkpoint)
+        self.assertRaises(ValueError, rotate, self.output, self.output,
+            self.delta, self.engine, 4, self.checkpoint)
+
+        os.remove(self.output)
+        self.assertRaises(ValueError, rotate, self.input, self.output,
+            self.delta, self.engine, 4, self.checkpoint)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from rpc import *
+from rpc import _Connection, _call, _encodeRequest, _operations
+from prf import getDelta, update
+from threading import Thread
+from unittest import TestCase
+import unittest, vpop
+
+
+class RpcTests(TestCase):
+    """
+    Tests for the remote worker protocol on localhost.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.msk, cls.s = randomstr(), randomstr()
+        cls.workers = [RpcWorker(("127.0.0.1", 0), cls.msk, cls.s)
+            for _ in range(2)]
+        for worker in cls.workers:
+            worker.start()
+        cls.executor = RpcExecutor([w.address for w in cls.workers],
+            connections=2, chunkSize=2)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.close()
+        for worker in cls.workers:
+            worker.close()
+
+
+    def setUp(self):
+        self.w, self.t = "ensemble", "tweak"
+        self.xs = [vpop.blind(randomstr())[1] for _ in range(9)]
+
+
+    def testEvalAndProveVerify(self):
+        ys = self.executor.eval(self.w, self.t, self.xs)
+        self.assertEqual(ys, [vpop.eval(self.w, self.t, x, self.msk,
+            self.s)[0] for x in self.xs])
+
+        results = self.executor.evalAndProve(self.w, self.t, self.xs)
+        self.assertEqual([y for y,_ in results], ys)
+        responses = [(x, y, pi) for x, (y, pi) in zip(self.xs, results)]
+        self.assertEqual(self.executor.verify(self.t, responses), [True]*9)
+        self.assertEqual(self.executor.verify("other", responses[:1]),
+            [False])
+        self.assertEqual(self.executor.eval(self.w, self.t, []), [])
+
+
+    def testGroupOperations(self):
+        pairs = [(randomG1(), randomG2()) for _ in range(5)]
+        zs = self.executor.pair(pairs)
+        self.assertEqual(zs, [pair(P, Q) for P,Q in pairs])
+
+        items = [(z, randomZ()) for z in zs]
+        self.assertEqual(self.executor.exp(items), [z**a for z,a in items])
+
+        items = [(P, randomZ()) for P,_ in pairs]
+        self.assertEqual(self.executor.mul(items), [P*a for P,a in items])
+        items = [(Q, randomZ()) for _,Q in pairs]
+        self.assertEqual(self.executor.mul(items), [Q*a for Q,a in items])
+
+        # Negative scalars are reduced modulo the group order.
+        P, z = pairs[0][0], zs[0]
+        self.assertEqual(self.executor.mul([(P, -5)]), [P*(orderGt() - 5)])
+        self.assertEqual(self.executor.exp([(z, -3)]), [z**(orderGt() - 3)])
+
+        delta, _ = getDelta(("w", self.msk, self.s),
+            ("w", randomstr(), randomstr()))
+        self.assertEqual(self.executor.update(zs, delta),
+            [update(z, delta) for z in zs])
+
+
+    def testErrors(self):
+        # A worker without a key refuses PRF requests but serves the rest.
+        with RpcWorker(("127.0.0.1", 0)) as worker:
+            with RpcExecutor([worker.address]) as executor:
+                self.assertRaises(Exception, executor.eval, self.w, self.t,
+                    self.xs)
+                P = randomG1()
+                self.assertEqual(executor.mul([(P, 3)]), [P*3])
+
+        # PRF inputs that are not group members are refused.
+        b = bytearray(serializeG1(self.xs[0], False))
+        b[-1] ^= 1
+        bad = deserializeG1(str(b), False)
+        self.assertRaises(Exception, self.executor.eval, self.w, self.t,
+            self.xs[:1] + [bad])
+        self.assertRaises(Exception, self.executor.evalAndProve, self.w,
+            self.t, [bad])
+
+        # Unknown operations are reported without closing the connection.
+        connection = _Connection(self.workers[0].address)
+        try:
+            connection.send(_call.pack(7, 3) + "foo" + "\0" + "\0"*4)
+            callId, status = _call.unpack_from(connection.receive())
+            self.assertEqual((callId, status), (7, ERROR))
+
+            # So are truncated frames.
+            body = _encodeRequest(8, "mulG1", (), _operations["mulG1"],
+                [(randomG1(), 3)])
+            for frame in [body[:-10], body[:2]]:
+                connection.send(frame)
+                callId, status = _call.unpack_from(connection.receive())
+                self.assertEqual(status, ERROR)
+            self.assertEqual(len(self.executor.pair([(randomG1(),
+                randomG2())])), 1)
+        finally:
+            connection.close()
+
+
+    def testLargeBatch(self, n=60000):
+        """
+        A batch larger than the socket buffers completes: responses are read
+        while the requests are still being sent.
+        """
+        results = []
+        def run():
+            with RpcExecutor([self.workers[0].address], connections=1,
+                    chunkSize=CHUNK_SIZE) as executor:
+                results.append(executor.pair([(G1Element(),
+                    G2Element())]*n))
+
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(120)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(results[0]), n)
+
+
+    def testConnectionPool(self):
+        """
+        Concurrent batches reuse at most @connections connections per
+        worker.
+        """
+        threads = [Thread(target=self.executor.eval, args=(self.w, self.t,
+            self.xs)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for address in self.executor.addresses:
+            self.assertLessEqual(self.executor._opened[address], 2)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/eval python
+
+from scheduler import *
+from unittest import TestCase
+import unittest
+
+
+class SchedulerTests(TestCase):
+    """
+    Tests for ordering requests by ensemble and tweak.
+    """
+    def setUp(self):
+        self.scheduler = Scheduler(lambda r: r, budget=1.0, quota=3)
+
+
+    def order(self, requests, arrivals=None, now=0):
+        arrivals = arrivals or range(len(requests))
+        return [(w, t, [requests[i] for i in indices]) for w, t, indices in
+            self.scheduler.order(requests, arrivals, now)]
+
+
+    def testGrouping(self):
+        requests = [("a", 1), ("b", 1), ("a", 2), ("a", 1), ("b", 1)]
+        self.assertEqual(self.order(requests), [
+            ("a", 1, [("a", 1), ("a", 1)]),
+            ("a", 2, [("a", 2)]),
+            ("b", 1, [("b", 1), ("b", 1)])])
+
+
+    def testQuota(self):
+        """
+        A hot tenant gets at most 3 requests per turn.
+        """
+        requests = [("hot", 1)]*7 + [("cold", 1)]
+        self.assertEqual([(w, len(r)) for w,_,r in self.order(requests)],
+            [("hot", 3), ("cold", 1), ("hot", 3), ("hot", 1)])
+
+
+    def testBudget(self):
+        """
+        Requests past their budget run first, with the rest of their group.
+        """
+        requests = [("a", 1)]*3 + [("b", 1), ("b", 1)]
+        arrivals = [5, 5, 5, 0, 6]
+        self.assertEqual(self.order(requests, arrivals, now=2),
+            [("b", 1, [("b", 1), ("b", 1)]), ("a", 1, [("a", 1)]*3)])
+
+        # Within the budget, the oldest group still comes first.
+        self.assertEqual(self.order(requests, arrivals, now=0.5)[0][0], "b")
+
+
+    def testEmpty(self):
+        self.assertEqual(self.order([]), [])
+        self.assertRaises(ValueError, Scheduler, lambda r: r, quota=0)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
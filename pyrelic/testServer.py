@@ -0,0 +1,162 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from server import *
+from scheduler import Scheduler
+from timeit import default_timer
+from threading import Lock, Thread
+import os, shutil, tempfile, time, unittest, vpop
+from unittest import TestCase
+
+
+class MicroBatcherTests(TestCase):
+    """
+    Tests for collecting concurrent requests into batches.
+    """
+    def testBatching(self):
+        """
+        Items queued while the only worker is busy are batched.
+        """
+        sizes = []
+        def process(items):
+            sizes.append(len(items))
+            time.sleep(0.02)
+            return [x*2 for x in items]
+
+        batcher = MicroBatcher(process, maxBatch=8, maxDelay=0.05, workers=1)
+        results, lock = [], Lock()
+        def done(result):
+            with lock:
+                results.append(result)
+
+        for i in range(20):
+            batcher.submit(i, done)
+        batcher.close()
+
+        self.assertEqual(sorted(results), range(0, 40, 2))
+        self.assertLess(len(sizes), 20)
+        self.assertLessEqual(max(sizes), 8)
+        self.assertEqual(batcher.stats()["items"], 20)
+
+
+    def testErrors(self):
+        def process(items):
+            raise ValueError("failed")
+
+        batcher = MicroBatcher(process, workers=1)
+        results = []
+        batcher.submit(1, results.append)
+        batcher.close()
+        self.assertIsInstance(results[0], ValueError)
+
+
+    def testFairness(self, budget=0.1):
+        """
+        Requests from a hot tenant queued ahead of another tenant's request
+        do not delay it past the latency budget.
+        """
+        def process(items):
+            time.sleep(0.005*len(items))
+            return items
+
+        batcher = MicroBatcher(process, maxBatch=4, workers=1,
+            scheduler=Scheduler(lambda r: r[:2], budget, quota=2))
+        latencies, order = {}, []
+        def done(request):
+            latencies[request] = default_timer() - submitted[request]
+            order.append(request)
+
+        requests = [("hot", "t", i) for i in range(60)] + [("cold", "t", 0)]
+        submitted = {}
+        for request in requests:
+            submitted[request] = default_timer()
+            batcher.submit(request, done)
+        batcher.close()
+
+        self.assertEqual(sorted(order), sorted(requests))
+        self.assertLess(latencies[("cold", "t", 0)], budget)
+        self.assertLess(order.index(("cold", "t", 0)), 10)
+        self.assertGreater(latencies[("hot", "t", 59)], budget)
+
+
+class PrfServerTests(TestCase):
+    """
+    Tests for the PRF server and client on localhost.
+    """
+    def setUp(self):
+        self.msk, self.s = randomstr(), randomstr()
+        self.server = PrfServer(("127.0.0.1", 0), self.msk, self.s)
+        self.server.start()
+        self.client = PrfClient(self.server.address)
+
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+
+    def testQuery(self):
+        for name, prf in sorted(PRFS.items()):
+            rInv, x = prf.blind("message")
+            y, pi = self.client.query(name, "w", "t", x)
+            self.assertTrue(prf.verify(x, "t", y, pi))
+            self.assertEqual(y, prf.eval("w", "t", x, self.msk, self.s)[0])
+
+
+    def testPipelined(self):
+        xs = [vpop.blind(str(i))[1] for i in range(20)]
+        results = self.client.queryMany("vpop", "w", "t", xs)
+        for x, (y, pi) in zip(xs, results):
+            self.assertTrue(vpop.verify(x, "t", y, pi))
+        self.assertEqual(self.client.stats()["items"], len(xs))
+
+
+    def testConcurrentClients(self):
+        errors = []
+        def run():
+            try:
+                with PrfClient(self.server.address) as client:
+                    x = vpop.blind("m")[1]
+                    for y, pi in client.queryMany("vpop", "w", "t", [x]*5):
+                        vpop.verify(x, "t", y, pi)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+
+    def testErrors(self):
+        # An invalid blinded message.
+        self.assertRaises(Exception, self.client.query, "vpop", "w", "t",
+            "not an element")
+        self.assertRaises(Exception, self.client.query, "unknown", "w", "t",
+            "x")
+
+        # The connection is still usable.
+        x = vpop.blind("m")[1]
+        self.client.query("vpop", "w", "t", x)
+
+
+class UnixServerTests(TestCase):
+    def testQuery(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "prf.sock")
+        try:
+            with PrfServer(path, "msk", "s") as server:
+                with PrfClient(path) as client:
+                    x = vpop.blind("m")[1]
+                    y, pi = client.query("vpop", "w", "t", x)
+                    self.assertTrue(vpop.verify(x, "t", y, pi))
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(directory)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
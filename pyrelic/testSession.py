@@ -0,0 +1,67 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest
+from unittest import TestCase
+from session import *
+from pbc import *
+import bls, vprf, vpop
+
+w = "Some super-secret ensemble key selector"
+t = "Totally random and unpredictable tweak"
+m = "This is a secret message"
+msk = "lkjasdf;lkjas;dlkfa;slkdf;laskdjf"
+s = "Super secret table value"
+
+
+class QuerySessionTests(TestCase):
+    """
+    Tests for client query sessions.
+    """
+    def query(self, prf):
+        """
+        Starts a session for @prf and runs the server side of the protocol.
+        """
+        session = QuerySession(prf, m, t)
+        y,kw,beta = prf.eval(w,t,session.x,msk,s)
+        pi = prf.prove(session.x, {vprf: beta, vpop: beta, bls: t}[prf],
+            kw, y)
+        return session, y, pi
+
+
+    def testProtocols(self):
+        """
+        Sessions give the same output as running the protocol directly.
+        """
+        for prf in [bls, vprf, vpop]:
+            rInv, x = prf.blind(m)
+            y,_,_ = prf.eval(w,t,x,msk,s)
+            expected = prf.deblind(rInv, y)
+
+            session, y, pi = self.query(prf)
+            self.assertEqual(expected, session.finish(y, pi))
+
+
+    def testBeta(self):
+        session = QuerySession(vpop, m, t)
+        self.assertEqual(vpop.prepareVerify(session.x, t), session.beta())
+
+
+    def testBadProof(self):
+        for prf in [bls, vprf, vpop]:
+            session, y, pi = self.query(prf)
+            badY = randomGt() if prf is vpop else randomG1()
+            self.assertEqual(None, session.finish(badY, pi, errorOnFail=False))
+            self.assertRaises(Exception, session.finish, badY, pi)
+
+
+    def testError(self):
+        """
+        Errors on the worker thread are raised by finish().
+        """
+        session = QuerySession(vprf, m, None)
+        self.assertRaises(Exception, session.beta)
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from shard import *
+from unittest import TestCase
+import unittest, vpop
+
+
+class HashRingTests(TestCase):
+    """
+    Tests for consistent hashing.
+    """
+    def testBalance(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        shares = ring.shares()
+        self.assertAlmostEqual(sum(shares.values()), 1.0)
+        for share in shares.values():
+            self.assertTrue(0.1 < share < 0.4)
+
+
+    def testMinimalMovement(self):
+        """
+        Adding a node only moves keys to the new node.
+        """
+        ring = HashRing(["a", "b", "c"])
+        keys = [str(i) for i in range(1000)]
+        before = dict((k, ring.node(k)) for k in keys)
+
+        ring.add("d")
+        moved = [k for k in keys if ring.node(k) != before[k]]
+        self.assertTrue(all(ring.node(k) == "d" for k in moved))
+        self.assertTrue(100 < len(moved) < 400)
+
+        ring.remove("d")
+        self.assertEqual(before, dict((k, ring.node(k)) for k in keys))
+        self.assertNotIn("d", ring)
+        self.assertEqual(len(ring), 3)
+
+
+    def testEmpty(self):
+        self.assertRaises(LookupError, HashRing().node, "w")
+
+
+class ShardSupervisorTests(TestCase):
+    """
+    Tests for running shards in child processes.
+    """
+    def setUp(self):
+        self.msk, self.s = randomstr(), randomstr()
+        self.supervisor = ShardSupervisor(self.msk, self.s, shards=2,
+            workers=1)
+        self.client = self.supervisor.client()
+
+
+    def tearDown(self):
+        self.client.close()
+        self.supervisor.close()
+
+
+    def query(self, w):
+        x = vpop.blind("message")[1]
+        y, pi = self.client.query("vpop", w, "t", x)
+        self.assertTrue(vpop.verify(x, "t", y, pi))
+        self.assertEqual(y, vpop.eval(w, "t", x, self.msk, self.s)[0])
+
+
+    def testRouting(self):
+        ensembles = ["w{}".format(i) for i in range(8)]
+        for w in ensembles*2:
+            self.query(w)
+
+        # Each shard served exactly the ensembles it owns.
+        stats = self.supervisor.stats()
+        for name in self.supervisor.shards():
+            owned = [w for w in ensembles
+                if self.supervisor.ring.node(w) == name]
+            self.assertEqual(stats[name]["items"], 2*len(owned))
+        self.assertAlmostEqual(sum(s["share"] for s in stats.values()), 1.0)
+
+
+    def testRebalance(self):
+        name = self.supervisor.addShard()
+        self.assertEqual(len(self.supervisor.shards()), 3)
+        for i in range(6):
+            self.query("w{}".format(i))
+
+        self.supervisor.removeShard(name)
+        self.supervisor.removeShard(self.supervisor.shards()[0])
+        for i in range(6):
+            self.query("w{}".format(i))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
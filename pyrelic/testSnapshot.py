@@ -0,0 +1,78 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from snapshot import *
+from engine import ProcessEngine
+from pbc import *
+from unittest import TestCase
+import json, os, shutil, struct, tempfile, unittest
+
+
+class SnapshotTests(TestCase):
+    """
+    Tests for snapshots of precomputed values.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "snapshot")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testRoundTrip(self):
+        P = randomG2()
+        writeSnapshot(self.path, {"pubkey": P})
+
+        cached = [f.cached for f in [generatorG1, generatorG2, generatorGt,
+            orderGt]]
+        try:
+            elements = loadSnapshot(self.path)
+            self.assertIsNot(generatorGt.cached, cached[2])
+            self.assertEqual(generatorGt(), cached[2])
+            self.assertEqual(generatorG2(), cached[1])
+            self.assertEqual(orderGt(), cached[3])
+            self.assertIsNotNone(generatorG2()._table)
+
+            a = randomZ()
+            self.assertEqual(generatorG2()*a, cached[1].mul_basic(a))
+            self.assertEqual(elements["pubkey"], P)
+            self.assertEqual(elements["pubkey"]*a, P.mul_basic(a))
+        finally:
+            for f, value in zip([generatorG1, generatorG2, generatorGt,
+                    orderGt], cached):
+                f.cached = value
+
+
+    def testIncompatible(self):
+        writeSnapshot(self.path)
+        with open(self.path, "r+b") as f:
+            data = f.read()
+            size, = struct.unpack_from(">I", data, 12)
+            index = json.loads(data[16:16+size])
+
+            # A build with a different BN_SIZE.
+            f.seek(16)
+            f.write(data[16:16+size].replace('"bnSize": {}'.format(
+                index["layout"]["bnSize"]), '"bnSize": {}'.format(
+                    index["layout"]["bnSize"] + 1)))
+        self.assertRaises(ValueError, loadSnapshot, self.path, False)
+
+        with open(self.path, "r+b") as f:
+            f.write("PYRSNAP0")
+        self.assertRaises(ValueError, loadSnapshot, self.path, False)
+
+
+    def testEngine(self):
+        writeSnapshot(self.path)
+        with ProcessEngine(processes=2, snapshot=self.path) as engine:
+            items = [(randomG2(), randomZ()) for _ in range(4)]
+            self.assertEqual(engine.mul(items), [P*a for P,a in items])
+            pairs = [(randomG1(), generatorG2())]
+            self.assertEqual(engine.pair(pairs), [pair(*pairs[0])])
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/eval python
+
+from testcommon import *
+from store import *
+from pbc import *
+from prf import getDelta, update
+from unittest import TestCase
+import os, shutil, tempfile, unittest
+
+
+class RecordStoreTests(TestCase):
+    """
+    Tests for the memory-mapped PRF output store.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "outputs")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testPutGet(self):
+        zs = dict(("user{}".format(i), pair(randomG1(), randomG2()))
+            for i in range(20))
+        with RecordStore(self.path, capacity=4) as store:
+            store.append(zs.items())
+            self.assertEqual(len(store), 20)
+            self.assertGreaterEqual(store.capacity, 20)
+
+            z = pair(randomG1(), randomG2())
+            store.put("user3", z)
+            zs["user3"] = z
+            self.assertEqual(len(store), 20)
+            self.assertIsNone(store.get("nobody"))
+            self.assertFalse("nobody" in store)
+
+        # Records persist.
+        with RecordStore(self.path) as store:
+            for key, z in zs.items():
+                self.assertTrue(key in store)
+                self.assertEqual(store.get(key), z)
+
+
+    def testGroups(self):
+        with RecordStore(self.path, G1Element) as store:
+            P = randomG1()
+            store.put("user", P)
+            store.put("identity", G1Element())
+            self.assertEqual(store.get("user"), P)
+            self.assertTrue(store.get("identity").isIdentity())
+            self.assertRaises(TypeError, store.put, "other", randomG2())
+
+        self.assertRaises(ValueError, RecordStore, self.path, GtElement)
+
+
+    def testRotate(self):
+        zs = [pair(randomG1(), randomG2()) for _ in range(7)]
+        delta, _ = getDelta(("w", randomstr(), randomstr()),
+            ("w", randomstr(), randomstr()))
+        with RecordStore(self.path) as store:
+            store.append(("user{}".format(i), z) for i, z in enumerate(zs))
+            store.rotate(delta, batchSize=3)
+            self.assertEqual([z for batch in store.scan(3) for z in batch],
+                [update(z, delta) for z in zs])
+            self.assertEqual(store.get("user4"), update(zs[4], delta))
+
+
+    def testResumeRotate(self):
+        """
+        An interrupted rotation resumes where it stopped, and updates each
+        element exactly once.
+        """
+        zs = [pair(randomG1(), randomG2()) for _ in range(7)]
+        delta, _ = getDelta(("w", randomstr(), randomstr()),
+            ("w", randomstr(), randomstr()))
+        expected = [update(z, delta) for z in zs]
+        with RecordStore(self.path) as store:
+            store.append(("user{}".format(i), z) for i, z in enumerate(zs))
+
+        # Fail computing the second batch.
+        class Executor(object):
+            calls = 0
+            def update(self, zs, delta):
+                Executor.calls += 1
+                if Executor.calls == 2:
+                    raise RuntimeError("interrupted")
+                return [update(z, delta) for z in zs]
+
+        with RecordStore(self.path) as store:
+            self.assertRaises(RuntimeError, store.rotate, delta, Executor(),
+                3)
+        with RecordStore(self.path) as store:
+            self.assertRaises(ValueError, store.put, "user", zs[0])
+            self.assertRaises(ValueError, store.rotate, delta + 1)
+            store.rotate(delta, batchSize=3)
+            self.assertEqual(store.get("user6"), expected[6])
+            self.assertEqual([z for batch in store.scan() for z in batch],
+                expected)
+
+
+    def testResumeJournaled(self):
+        """
+        A batch that was journaled but not recorded as written is rewritten
+        from the journal rather than updated again.
+        """
+        zs = [pair(randomG1(), randomG2()) for _ in range(5)]
+        delta, _ = getDelta(("w", randomstr(), randomstr()),
+            ("w", randomstr(), randomstr()))
+        with RecordStore(self.path) as store:
+            store.append(("user{}".format(i), z) for i, z in enumerate(zs))
+
+            # Write the first batch but crash before recording it.
+            apply = store._apply
+            def crash(start, stop, buf):
+                store._map[store._offset(start):store._offset(stop)] = \
+                    str(buf)
+                raise RuntimeError("crashed")
+            store._apply = crash
+            self.assertRaises(RuntimeError, store.rotate, delta, None, 2)
+            store._apply = apply
+
+        with RecordStore(self.path) as store:
+            store.rotate(delta, batchSize=2)
+            self.assertEqual([z for batch in store.scan() for z in batch],
+                [update(z, delta) for z in zs])
+            self.assertFalse(os.path.exists(self.path + ".journal"))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
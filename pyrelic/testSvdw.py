@@ -0,0 +1,82 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest, random, binascii
+from unittest import TestCase
+from svdw import *
+import pbc
+
+
+class SvdwTests(TestCase):
+    """
+    Tests for the field arithmetic and the Shallue-van de Woestijne map.
+    """
+    def setUp(self):
+        self.p = pbc._fieldPrime()
+
+
+    def testExpandMessageXmd(self):
+        """
+        Checks expand_message_xmd against the test vectors in RFC 9380.
+        """
+        dst = "QUUX-V01-CS02-with-expander-SHA256-128"
+        vectors = [
+            ("", 0x20, "68a985b87eb6b46952128911f2a4412b"
+                "bc302a9d759667f87f7a21d803f07235"),
+            ("abc", 0x20, "d8ccab23b5985ccea865c6c97b6e5b83"
+                "50e794e603b4b97902f53a8a0d605615"),
+        ]
+        for msg, length, expected in vectors:
+            self.assertEqual(expected, 
+                binascii.hexlify(expandMessageXmd(msg, dst, length)))
+
+
+    def testSqrt(self, n=100):
+        """
+        Square roots in Fp and Fp2 square back to the original value.
+        """
+        for F in [PrimeField(self.p), QuadraticField(self.p)]:
+            for _ in range(n):
+                b = F.fromCoefficients([random.randrange(self.p) 
+                    for _ in range(F.degree)])
+                a = F.sqr(b)
+                self.assertTrue(F.isSquare(a))
+                self.assertEqual(a, F.sqr(F.sqrt(a)))
+
+        # -1 is not a square in Fp when p = 3 mod 4
+        F = PrimeField(self.p)
+        self.assertFalse(F.isSquare(F.neg(F.one)))
+
+
+    def testRelicArithmetic(self, n=20):
+        """
+        RELIC's exponentiation and inversion match Python's.
+        """
+        p = self.p
+        for _ in range(n):
+            a = random.randrange(p)
+            self.assertEqual(pow(a, p-2, p), pbc._relicInvmod(a, p))
+            self.assertEqual(pow(a, (p+1)//4, p), 
+                pbc._relicPowmod(a, (p+1)//4, p))
+
+
+    def testMapOnCurve(self, n=20):
+        """
+        Mapped points satisfy the curve equation, including the exceptional
+        inputs 0, 1, and -1.
+        """
+        for elementType in [pbc.G1Element, pbc.G2Element]:
+            mapper,_ = pbc._svdwMap(elementType)
+            F = mapper.field
+            inputs = [F.zero, F.one, F.neg(F.one)] + [F.fromCoefficients(
+                [random.randrange(self.p) for _ in range(F.degree)]) 
+                    for _ in range(n)]
+
+            for u in inputs:
+                x,y = mapper.map(u)
+                self.assertEqual(F.sqr(y), mapper.g(x))
+                self.assertEqual(F.sgn0(u), F.sgn0(y))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/eval python
+from testcommon import *
+import unittest
+from unittest import TestCase
+from transcript import *
+import vprf, vpop
+
+
+class TranscriptTests(TestCase):
+    """
+    Tests for Fiat-Shamir transcripts and the legacy challenge encoding.
+    """
+    def tearDown(self):
+        setLegacy(False)
+
+
+    def testDeterministic(self):
+        """
+        Absorbing the same values gives the same challenge.
+        """
+        P, r = randomG1(), randomZ()
+        c1 = Transcript("label").absorb(P, r, "text").challenge()
+        c2 = Transcript("label").absorb(P, r, "text").challenge()
+        self.assertEqual(c1, c2)
+
+
+    def testIncremental(self):
+        """
+        Absorbing values one at a time matches absorbing them all at once.
+        """
+        P, Q, y = randomG1(), randomG2(), randomGt()
+        t = Transcript("label")
+        t.absorb(P)
+        t.absorb(Q)
+        t.absorb(y)
+        self.assertEqual(t.challenge(),
+            Transcript("label").absorb(P, Q, y).challenge())
+
+
+    def testNormalization(self):
+        """
+        Equal elements give the same challenge regardless of normalization.
+        """
+        P = randomG1()*randomZ()
+        Q = deserializeG1(serializeG1(P))
+        self.assertEqual(Transcript().absorb(P).challenge(),
+            Transcript().absorb(Q).challenge())
+
+
+    def testDomainSeparation(self):
+        """
+        Changing the label, order, type, or boundaries of absorbed values
+        changes the challenge.
+        """
+        P, Q = randomG1(), randomG1()
+        challenge = lambda label, *values: \
+            Transcript(label).absorb(*values).challenge()
+
+        self.assertNotEqual(challenge("a", P, Q), challenge("b", P, Q))
+        self.assertNotEqual(challenge("a", P, Q), challenge("a", Q, P))
+        self.assertNotEqual(challenge("a", "1"), challenge("a", 1))
+        self.assertNotEqual(challenge("a", 1), challenge("a", -1))
+        self.assertNotEqual(challenge("a", "ab", "c"), challenge("a", "a", "bc"))
+        self.assertNotEqual(challenge("a", P),
+            challenge("a", str(serializeG1(P))))
+
+
+    def testScalarTypes(self):
+        """
+        BigInt and Python integers with the same value are absorbed
+        identically.
+        """
+        for x in [0, 1, 255, 256, randomZ()]:
+            self.assertEqual(Transcript().absorb(BigInt(long(x))).challenge(),
+                Transcript().absorb(long(x)).challenge())
+
+
+    def testLegacy(self):
+        """
+        Legacy mode reproduces bi.hashZ.
+        """
+        P, r = randomG1(), randomZ()
+        setLegacy()
+        self.assertTrue(isLegacy())
+        self.assertEqual(hashChallenge("label", P, r), hashZ(P, r))
+
+
+    def testLegacyProofs(self):
+        """
+        Proofs generated and verified in the same mode pass; proofs generated
+        in legacy mode fail under the transcript encoding.
+        """
+        kw = randomZ()
+        x = randomG1()
+        t = randomstr()
+        tTilde = hashG2(t)
+        y = pair(x*kw, tTilde)
+
+        setLegacy()
+        pi = vpop.prove(x, tTilde, kw, y)
+        self.assertTrue(vpop.verify(x, t, y, pi, errorOnFail=False))
+
+        setLegacy(False)
+        self.assertFalse(vpop.verify(x, t, y, pi, errorOnFail=False))
+
+
+    def testVprfLegacyProofs(self):
+        """
+        Legacy mode applies to the vprf proofs.
+        """
+        kw = randomZ()
+        m, t = randomstr(), randomstr()
+        beta = hashG1(t, m)
+        y = beta*kw
+
+        setLegacy()
+        pi = vprf.prove(None, beta, kw, y)
+        self.assertTrue(vprf.verify(m, t, y, pi, errorOnFail=False))
+
+        setLegacy(False)
+        self.assertFalse(vprf.verify(m, t, y, pi, errorOnFail=False))
+
+
+# Run!
+if __name__ == '__main__':
+    unittest.main()
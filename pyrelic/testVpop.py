@@ -4,6 +4,7 @@ from testcommon import *
 import unittest
 from unittest import TestCase
 from vpop import *
+import vpop
 
 # Global values for test cases
 w = "Some super-secret ensemble key selector"
@@ -187,6 +188,89 @@ def simpleProto(w,t,msk,s,m):
     return deblind(r, y)
 
 
+class EvalAndProveTests(TestCase):
+    """
+    Tests for the fused evalAndProve.
+    """
+    def tearDown(self):
+        vpop._gtExpPowers = True
+
+
+    def testEvalAndProve(self):
+        """
+        Both ways of computing powers of beta give the same y as eval, and
+        proofs that verify.
+        """
+        r, x = blind(m)
+        expected,_,_ = eval(w,t,x,msk,s)
+
+        for gtCheaper in [True, False]:
+            vpop._gtExpPowers = gtCheaper
+            y, pi = evalAndProve(w,t,x,msk,s)
+            self.assertEqual(expected, y)
+            self.assertTrue(verify(x, t, y, pi))
+
+
+    def testCalibrate(self):
+        self.assertEqual(vpop.calibrate(1), vpop._gtExpPowers)
+
+
+class TweakCacheTests(TestCase):
+    """
+    Tests for caching hashed tweaks.
+    """
+    def setUp(self):
+        self.cache = enableTweakCache(maxsize=4)
+
+
+    def tearDown(self):
+        disableTweakCache()
+        setHashAlgorithm(g2=HASH_RELIC)
+
+
+    def testCached(self):
+        """
+        Repeated tweaks are hashed once and match hashG2.
+        """
+        self.assertEqual(hashG2(t), hashTweak(t))
+        self.assertTrue(hashTweak(t) is hashTweak(t))
+        self.assertEqual(2, self.cache.stats()["hits"])
+
+
+    def testProtocol(self):
+        """
+        The protocol gives the same results with and without the cache.
+        """
+        r, x = blind(m)
+        y1,kw,tTilde = eval(w,t,x,msk,s)
+        y2,_,_ = eval(w,t,x,msk,s)
+        pi = prove(x, tTilde, kw, y2)
+        self.assertTrue(verify(x, t, y2, pi))
+
+        disableTweakCache()
+        y3,_,_ = eval(w,t,x,msk,s)
+        self.assertEqual(y1, y2)
+        self.assertEqual(y1, y3)
+        self.assertTrue(verify(x, t, y3, pi))
+
+
+    def testHashSettings(self):
+        """
+        Changing the hash algorithm does not return stale entries.
+        """
+        P = hashTweak(t)
+        setHashAlgorithm(g2=HASH_SVDW)
+        self.assertNotEqual(P, hashTweak(t))
+        self.assertEqual(hashG2(t), hashTweak(t))
+
+
+    def testInvalidate(self):
+        hashTweak(t)
+        self.assertTrue(invalidateTweak(t))
+        self.assertFalse(invalidateTweak(t))
+        self.assertEqual(0, len(self.cache))
+
+
 # Run!
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -110,6 +110,17 @@ class VprfTests(TestCase):
         self.assertTrue( verify(m, t, y, pi, errorOnFail=False) )
 
 
+    def testEvalAndProve(self):
+        """
+        evalAndProve matches eval and produces a valid proof.
+        """
+        w,t,m,msk,s = "w","t","m","msk","s"
+        expected,_,_ = eval(w,t,m,msk,s)
+        y, pi = evalAndProve(w,t,m,msk,s)
+        self.assertEqual(expected, y)
+        self.assertTrue(verify(m, t, y, pi))
+
+
 # Run!
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
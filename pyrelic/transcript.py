@@ -0,0 +1,66 @@
+"""
+Fiat-Shamir transcripts for the zero-knowledge proofs used by the Pythia PRFs.
+A transcript absorbs the canonical binary serialization of each group element
+and scalar into an incremental hash and derives the challenge from the digest.
+"""
+from pbc import *
+from common import *
+import hashlib
+
+# Version string absorbed at the start of every transcript. Changing the
+# encoding (see pbc.Hasher) requires a new version so challenges never collide.
+TRANSCRIPT_V1 = "PYRELIC_TRANSCRIPT_V1"
+
+# When set, challenges are computed with the pyrelic 1.0 string encoding
+# (bi.hashZ) for compatibility with proofs from older clients and servers.
+_legacy = False
+
+
+class Transcript(Hasher):
+    """
+    Incrementally hashes a sequence of group elements, scalars, and strings
+    (see pbc.Hasher for the encoding) and derives a challenge from it.
+    """
+    def __init__(self, label="", version=TRANSCRIPT_V1, alg=hashlib.sha256):
+        """
+        Starts a new transcript bound to @version and a domain-separation
+        @label (e.g. the name of the proof system).
+        """
+        Hasher.__init__(self, version, alg)
+        self.absorb(label)
+
+
+    def challenge(self):
+        """
+        Derives the challenge from everything absorbed so far. The transcript
+        is not modified and can continue to absorb values.
+        @returns a BigInt
+        """
+        return BigInt(longFromString(self.digest()))
+
+
+def hashChallenge(label, *values):
+    """
+    Computes the Fiat-Shamir challenge for @values under the domain-separation
+    @label. Uses the legacy string encoding when enabled by setLegacy().
+    @returns a BigInt
+    """
+    if _legacy:
+        return hashZ(*values)
+    return Transcript(label).absorb(*values).challenge()
+
+
+def isLegacy():
+    """
+    Determines if challenges are computed using the legacy string encoding.
+    """
+    return _legacy
+
+
+def setLegacy(enabled=True):
+    """
+    Switches challenge computation to (or back from) the pyrelic 1.0 string
+    encoding. Both parties to a proof must use the same setting.
+    """
+    global _legacy
+    _legacy = bool(enabled)
@@ -6,6 +6,27 @@ transmitted.
 """
 from pbc import *
 from prf import *
+from transcript import *
+from public import expSimGt, mulSimG1
+from cache import LruCache
+from pool import BlindingPool, THREAD
+from timeit import default_timer
+import pbc
+
+# Domain-separation label for the proof's Fiat-Shamir transcript.
+VPOP_PROOF = "PYTHIA_VPOP_PROOF"
+
+# Optional cache of hashed tweaks: t -> tTilde (see enableTweakCache).
+_tweakCache = None
+
+# Optional pool of precomputed blinding factors (see enableBlindingPool).
+_blindingPool = None
+
+# Whether evalAndProve computes powers of beta by exponentiation in Gt
+# (rather than a scalar multiplication in G1 and a pairing). The two cost
+# about the same on BN-254 and exponentiation was faster in benchmarks; see
+# calibrate().
+_gtExpPowers = True
 
 def eval(w,t,x,msk,s):
     """
@@ -14,18 +35,18 @@ def eval(w,t,x,msk,s):
     @t: tweak (e.g. user ID)
     @x: blinded message (element of G1)
     @msk: Pythia server's master secret key
-    @s: state value from Pythia server's key table
+    @s: state value from Pythia server's key table (or the keytable.KeyTable)
     @returns: (y, kw, tTile)
      where: y: intermediate result
             kw: secret key bound to w (needed for proof)
             tTilde: hashed tweak (needed for proof)
     """
     # Construct the key
-    kw = genKw(w,msk,s)
+    kw = getKw(w,msk,s)
 
     # Multiply x by kw (it's fastest this way), hash the tweak, and compute
     # the pairing.
-    tTilde = hashG2(t)
+    tTilde = hashTweak(t)
     y = pair(x*kw, tTilde)
     return y,kw,tTilde
 
@@ -46,23 +67,59 @@ def prove(x,tTilde,kw,y):
 
     # Compute the proof.
     beta = pair(x,tTilde)
-    Q = generatorG1()
-    p = Q*kw
-    v = randomZ(orderGt())
-    t1 = Q*v
-    t2 = beta**v
+    return _prove(beta, kw, y, lambda v: beta**v)
 
-    t1.normalize()
 
-    c = hashZ(Q,p,beta,y,t1,t2)
+def evalAndProve(w,t,x,msk,s):
+    """
+    Computes eval() and prove() together, reusing intermediate values: both
+    y and the proof's t2 are powers of beta = e(x,tTilde), so the pairing is
+    computed once. Each power is computed by an exponentiation in Gt or by
+    a scalar multiplication in G1 followed by a pairing (see calibrate()).
+    Parameters are the same as eval().
+    @returns: (y, pi)
+    """
+    kw = getKw(w,msk,s)
+    tTilde = hashTweak(t)
+    beta = pair(x,tTilde)
+
+    if _gtExpPowers:
+        power = lambda e: beta**e
+    else:
+        power = lambda e: pair(x*e, tTilde)
+
+    y = power(kw)
+    return y, _prove(beta, kw, y, power)
+
+
+def _prove(beta,kw,y,power):
+    """
+    Generates the proof for beta = e(x,tTilde) where @power(v) computes
+    beta**v.
+    """
+    Q = generatorG1()
+    p = pubkeyG1(kw)
+    v,t1 = nonce(G1Element)
+    t2 = power(v)
+
+    c = hashChallenge(VPOP_PROOF, Q,p,beta,y,t1,t2)
     u = (v-(c*kw)) % orderGt()
     return (p,c,u)
 
 
-def verify(x, t, y, pi, errorOnFail=True):
+def prepareVerify(x, t):
+    """
+    Computes beta, the part of verification that doesn't depend on the
+    server's response. Can run while the request is in flight.
+    """
+    return pair(x,hashTweak(t))
+
+
+def verify(x, t, y, pi, errorOnFail=True, beta=None):
     """
     Verifies a zero-knowledge proof where p \in G1.
     @errorOnFail: Raise an exception if the proof does not hold.
+    @beta: result of prepareVerify(@x, @t), if already computed.
     """
     # Unpack the proof
     p,c,u = pi
@@ -74,17 +131,18 @@ def verify(x, t, y, pi, errorOnFail=True):
     assertScalarType(c)
     assertScalarType(u)
 
-    # TODO: beta can be pre-computed while waiting for a server response.
+    # beta may have been computed while waiting for the server's response.
     Q = generatorG1()
-    beta = pair(x,hashG2(t))
+    if beta is None:
+        beta = prepareVerify(x, t)
 
     # Recompute c'
-    t1 = Q*u + p*c 
-    t2 = beta**u * y**c
+    t1 = mulSimG1(Q,u,p,c)
+    t2 = expSimGt(beta,u,y,c)
 
     t1.normalize()
 
-    cPrime = hashZ(Q,p,beta,y,t1,t2)
+    cPrime = hashChallenge(VPOP_PROOF, Q,p,beta,y,t1,t2)
 
     # Check computed @c' against server's value @c
     if cPrime == c:
@@ -102,13 +160,74 @@ def blind(m, hashfunc=hashG1):
     that can be used to deblind. Computes: x = H(x)^r
     @returns (1/r,x)
     """
+    r, rInv = blindingFactor()
+    return rInv, hashfunc(m) * r
+
+
+def blindingFactor():
+    """
+    Selects a random blinding factor r and its inverse in Gt. Takes a
+    precomputed pair from the blinding pool if one is enabled; each pair is
+    used at most once.
+    @returns (r, 1/r)
+    """
+    pool = _blindingPool
+    if pool is not None:
+        return pool.take()
+
     # Find r with a suitable inverse in Gt
     rInv = None
     while not rInv:
         r = randomZ()
         rInv = inverse(r, orderGt())
+    return r, rInv
 
-    return rInv, hashfunc(m) * r
+
+def enableBlindingPool(size=64, mode=THREAD):
+    """
+    Starts a pool of @size precomputed blinding factors, refilled by a
+    background thread or process (@mode is pool.THREAD or pool.PROCESS), for
+    use by blind(). Replaces any existing pool.
+    @returns the pool.BlindingPool (for metrics)
+    """
+    global _blindingPool
+    disableBlindingPool()
+    _blindingPool = BlindingPool(size, mode)
+    return _blindingPool
+
+
+def disableBlindingPool():
+    """
+    Stops the blinding pool.
+    """
+    global _blindingPool
+    pool, _blindingPool = _blindingPool, None
+    if pool is not None:
+        pool.stop()
+
+
+def calibrate(trials=3):
+    """
+    Chooses how evalAndProve computes powers of beta by timing an
+    exponentiation in Gt against a scalar multiplication in G1 followed by
+    a pairing, on this platform. Call it once at startup (or not at all:
+    exponentiation is used by default), never on the request path.
+    @returns True if exponentiation in Gt was chosen
+    """
+    global _gtExpPowers
+    x, tTilde, e = randomG1(), hashG2(""), randomZ(orderGt())
+    tTilde.normalize()
+    beta = pair(x, tTilde)
+    gt = min(_elapsed(lambda: beta**e) for _ in range(trials))
+    g1 = min(_elapsed(lambda: pair(x*e, tTilde)) for _ in range(trials))
+    _gtExpPowers = gt <= g1
+    return _gtExpPowers
+
+
+def _elapsed(func):
+    start = default_timer()
+    func()
+    return default_timer() - start
 
 
 def deblind(rInv,y):
@@ -122,8 +241,74 @@ def deblind(rInv,y):
     return y ** rInv
 
 
-# Decode/deserialize elements by name
-unwrapX = unwrapG1
+def hashTweak(t):
+    """
+    Hashes the tweak @t onto G2, using the tweak cache if it is enabled.
+    Cached elements are shared: callers must not modify the result.
+    @returns tTilde \in G2
+    """
+    cache = _tweakCache
+    if cache is None:
+        return hashG2(t)
+    return cache.getOrCompute(_tweakKey(t), lambda: _prepareTweak(t))
+
+
+def _prepareTweak(t):
+    """
+    Hashes @t and converts the result to affine coordinates, the form the
+    pairing uses for its G2 argument.
+    """
+    tTilde = hashG2(t)
+    tTilde.normalize()
+    return tTilde
+
+
+def _tweakKey(t):
+    """
+    The cache key for tweak @t: the hash also depends on the global hash
+    settings.
+    """
+    return (t, pbc._hashAlgorithmG2, pbc._legacyHash)
+
+
+def enableTweakCache(maxsize=1024, shards=8):
+    """
+    Caches up to @maxsize hashed tweaks so that eval and verify skip the
+    hash onto G2 for repeated tweaks. Replaces any existing cache.
+    @returns the cache.LruCache (for metrics and invalidation)
+    """
+    global _tweakCache
+    _tweakCache = LruCache(maxsize, shards)
+    return _tweakCache
+
+
+def disableTweakCache():
+    """
+    Stops caching hashed tweaks and discards the cache.
+    """
+    global _tweakCache
+    _tweakCache = None
+
+
+def invalidateTweak(t):
+    """
+    Removes the cached hash of tweak @t.
+    @returns True if @t was cached.
+    """
+    cache = _tweakCache
+    return cache is not None and cache.invalidate(_tweakKey(t))
+
+
+def tweakCache():
+    """
+    Retrieves the tweak cache, or None if caching is disabled.
+    """
+    return _tweakCache
+
+
+# Decode/deserialize elements by name. Blinded messages come from clients, so
+# they are validated unless the caller selects a policy with pbc.validation.
+unwrapX = lambda x: unwrapG1(x, validationPolicy(VALIDATE_ELEMENT))
 unwrapY = unwrapGt
 unwrapP = unwrapG1
 unwrapC = unwrapLong
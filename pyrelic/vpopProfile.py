@@ -5,6 +5,7 @@ Also includes serialization and encoding routines for elements that are commonly
 transmitted.
 """
 from pbc import *
+from prf import nonce
 
 def eval(w,t,x,msk,s):
     """
@@ -63,8 +64,7 @@ def proveGt(x,tTilde,kw,y):
     beta = pair(x,tTilde)
     g = generatorGt()
     p = g**kw
-    v = randomZ(orderGt())
-    t1 = g**v
+    v,t1 = nonce(GtElement)
     t2 = beta**v
 
     c = hashZ(g,p,beta,y,t1,t2)
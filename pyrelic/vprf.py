@@ -7,6 +7,11 @@ also suffice.
 from pbc import *
 from common import *
 from prf import *
+from transcript import *
+from public import mulSimG1
+
+# Domain-separation label for the proof's Fiat-Shamir transcript.
+VPRF_PROOF = "PYTHIA_VPRF_PROOF"
 
 def eval(w,t,x,msk,s):
     """
@@ -15,7 +20,7 @@ def eval(w,t,x,msk,s):
     @t: tweak (any string, e.g. user ID)
     @x: message (any string)
     @msk: Pythia server's master secret key
-    @s: state value from Pythia server's key table
+    @s: state value from Pythia server's key table (or the keytable.KeyTable)
     @returns: (y, kw, dummy=None)
      where: y: intermediate result
             kw: secret key bound to w (needed for proof)
@@ -27,7 +32,7 @@ def eval(w,t,x,msk,s):
     assertType(x, (str, int, long))
 
     # Construct the key
-    kw = genKw(w,msk,s)
+    kw = getKw(w,msk,s)
 
     # Compute y
     beta = hashG1(t, x)
@@ -47,23 +52,40 @@ def prove(x,beta,kw,y):
 
     # Compute the proof.
     Q = generatorG1()
-    p = Q*kw
-    v = randomZ(orderG1())
-    t1 = Q*v
+    p = pubkeyG1(kw)
+    v,t1 = nonce(G1Element)
     t2 = beta*v
 
-    t1.normalize()
     t2.normalize()
 
-    c = hashZ(Q,p,beta,y,t1,t2)
+    c = hashChallenge(VPRF_PROOF, Q,p,beta,y,t1,t2)
     u = (v-(c*kw)) % orderG1()
     return (p,c,u)
 
 
-def verify(x, t, y, pi, errorOnFail=True):
+def evalAndProve(w,t,x,msk,s):
+    """
+    Computes eval() and prove() together, sharing beta = H(t,x) and the
+    derived key. Parameters are the same as eval().
+    @returns: (y, pi)
+    """
+    y,kw,beta = eval(w,t,x,msk,s)
+    return y, prove(x,beta,kw,y)
+
+
+def prepareVerify(x, t):
+    """
+    Computes beta, the part of verification that doesn't depend on the
+    server's response. Can run while the request is in flight.
+    """
+    return hashG1(t, x)
+
+
+def verify(x, t, y, pi, errorOnFail=True, beta=None):
     """
     Verifies a zero-knowledge proof.
     @errorOnFail: Raise an exception if the proof does not hold.
+    @beta: result of prepareVerify(@x, @t), if already computed.
     """
     # Unpack the proof
     p,c,u = pi
@@ -76,18 +98,19 @@ def verify(x, t, y, pi, errorOnFail=True):
     assertScalarType(c)
     assertScalarType(u)
 
-    # TODO: beta can be pre-computed while waiting for a server response.
+    # beta may have been computed while waiting for the server's response.
     Q = generatorG1()
-    beta = hashG1(t, x)
+    if beta is None:
+        beta = prepareVerify(x, t)
 
     # Recompute c'
-    t1 = Q*u + p*c 
-    t2 = beta*u + y*c
+    t1 = mulSimG1(Q,u,p,c)
+    t2 = mulSimG1(beta,u,y,c)
 
     t1.normalize()
     t2.normalize()
 
-    cPrime = hashZ(Q,p,beta,y,t1,t2)
+    cPrime = hashChallenge(VPRF_PROOF, Q,p,beta,y,t1,t2)
 
     # Check computed @c' against server's value @c
     if cPrime == c:
@@ -37,6 +37,7 @@ setup(name='pythia-pyrelic',
       license='MIT',
       keywords='encryption, elliptic curve cryptography, pairing based cryptography, oblvious pseudorandom function, partially oblivious pseudorandom function',
       package_data= { 'pyrelic': ['lib/*'] },
+      extras_require={ 'cffi': ['cffi'] },
       packages=['pyrelic'],
       zip_safe=False, 
     )